@@ -0,0 +1,106 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class _DocumentAnswers:
+    """Answers cached for one document: a matrix of unit question vectors plus parallel payloads."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.payloads: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+
+
+class SemanticAnswerCache:
+    """
+    Per-document cache of /ask/ results keyed by question embedding. A new question whose
+    embedding is within `threshold` cosine similarity of a cached one reuses its answer.
+    Bounded per document (LRU slot reuse) and across documents (LRU), with a TTL.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_per_document: int, max_documents: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_per_document = max(1, max_per_document)
+        self.max_documents = max(1, max_documents)
+        self._docs: "OrderedDict[str, _DocumentAnswers]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def lookup(self, document_id: str, question_vector: List[float]) -> Optional[Dict[str, Any]]:
+        """Returns the cached payload for the most similar live question, or None."""
+        q = self._unit(question_vector)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._docs.get(document_id)
+            if entry is not None and entry.size:
+                sims = entry.vectors[:entry.size] @ q
+                if self.ttl_seconds > 0:
+                    sims[now - entry.created[:entry.size] > self.ttl_seconds] = -1.0
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._hits += 1
+                    entry.last_used[best] = now
+                    self._docs.move_to_end(document_id)
+                    return {**entry.payloads[best], "similarity": round(float(sims[best]), 4)}
+            self._misses += 1
+            return None
+
+    def store(self, document_id: str, question_vector: List[float], payload: Dict[str, Any]) -> None:
+        q = self._unit(question_vector)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._docs.get(document_id)
+            if entry is None or entry.vectors.shape[1] != q.shape[0]:
+                entry = _DocumentAnswers(q.shape[0], self.max_per_document)
+                self._docs[document_id] = entry
+            self._docs.move_to_end(document_id)
+            if entry.size < self.max_per_document:
+                slot = entry.size
+                entry.size += 1
+            else:
+                # Reuse an expired slot if there is one, otherwise the least recently used
+                expired = np.nonzero(now - entry.created > self.ttl_seconds)[0] if self.ttl_seconds > 0 else []
+                slot = int(expired[0]) if len(expired) else int(np.argmin(entry.last_used))
+            entry.vectors[slot] = q
+            entry.payloads[slot] = payload
+            entry.created[slot] = now
+            entry.last_used[slot] = now
+            while len(self._docs) > self.max_documents:
+                self._docs.popitem(last=False)
+
+    def invalidate(self, document_id: str) -> None:
+        """Drops every cached answer for a document (call when it is re-indexed or evicted)."""
+        with self._lock:
+            if self._docs.pop(document_id, None) is not None:
+                self._invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "documents": len(self._docs),
+                "entries": sum(e.size for e in self._docs.values()),
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "invalidations": self._invalidations,
+            }
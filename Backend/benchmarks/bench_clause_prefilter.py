@@ -0,0 +1,91 @@
+"""
+Clause pre-classifier benchmark: prompt-token reduction and recall lost versus sending the
+full text to the LLM, plus recall of the purely local mode.
+
+    python benchmarks/bench_clause_prefilter.py --docs 20 --pages 40 --out clause_prefilter.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clause_classifier import ClausePreClassifier # noqa: E402
+from llm_gateway import estimate_tokens # noqa: E402
+from fixtures import synthetic_contract, split_passages, load_embeddings # noqa: E402
+
+# Mirrors main.CLAUSE_LIBRARY descriptions (kept local so the benchmark does not import the app)
+CLAUSE_LIBRARY = {
+    "Termination": {"en": "Specifies how and when the agreement can be ended by either party.", "hi": "निर्दिष्ट करता है कि समझौता किसी भी पक्ष द्वारा कैसे और कब समाप्त किया जा सकता है।"},
+    "Liability": {"en": "Defines the responsibilities and extent of legal obligations if something goes wrong.", "hi": "कुछ गलत होने पर जिम्मेदारियों और कानूनी दायित्वों की सीमा को परिभाषित करता है।"},
+    "Governing Law": {"en": "Specifies which jurisdiction's laws will be used to interpret the agreement.", "hi": "निर्दिष्ट करता है कि समझौते की व्याख्या के लिए किस क्षेत्राधिकार के कानूनों का उपयोग किया जाएगा।"},
+    "Confidentiality": {"en": "Outlines obligations regarding the non-disclosure of sensitive information.", "hi": "संवेदनशील जानकारी का खुलासा न करने संबंधी दायित्वों की रूपरेखा बताता है।"},
+    "Payment Terms": {"en": "Details the amount, timing, and method of payments.", "hi": "भुगतान की राशि, समय और तरीके का विवरण देता है।"},
+    "Force Majeure": {"en": "Addresses unforeseeable circumstances that prevent someone from fulfilling a contract.", "hi": "अप्रत्याशित परिस्थितियों को संबोधित करता है जो किसी को अनुबंध पूरा करने से रोकती हैं।"},
+    "Indemnification": {"en": "One party agrees to pay for potential losses or damages caused by another party.", "hi": "एक पक्ष दूसरे पक्ष के कारण होने वाले संभावित नुकसान या क्षति के लिए भुगतान करने पर सहमत होता है।"},
+    "Dispute Resolution": {"en": "Specifies how disagreements related to the contract will be handled (e.g., arbitration, court).", "hi": "निर्दिष्ट करता है कि अनुबंध से संबंधित असहमतियों को कैसे संभाला जाएगा (जैसे, मध्यस्थता, अदालत)।"},
+}
+
+
+def run(args) -> dict:
+    classifier = ClausePreClassifier(load_embeddings(args.embeddings), CLAUSE_LIBRARY, keyword_weight=args.keyword_weight)
+    full_tokens, kept_tokens, latencies = [], [], []
+    prefilter_hits = local_hits = total = 0
+
+    for seed in range(args.docs):
+        doc = synthetic_contract(args.pages, seed=seed)
+        full_text = "\n\n".join(doc["pages"])
+        passages = split_passages(full_text)
+
+        started = time.perf_counter()
+        scores = classifier.score(passages)
+        candidates = classifier.select_candidates(scores, args.top_k, args.min_score)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        keep = sorted({i for picks in candidates.values() for i, _ in picks})
+        full_tokens.append(estimate_tokens(full_text))
+        kept_tokens.append(sum(estimate_tokens(passages[i]) for i in keep))
+
+        for clause_type, (_, sentence) in doc["gold"].items():
+            total += 1
+            # The full-text prompt always contains the gold sentence; prefilter only if a kept passage does
+            if any(sentence in passages[i] for i in keep):
+                prefilter_hits += 1
+            picks = candidates.get(clause_type)
+            if picks:
+                best = classifier.best_sentence(passages[picks[0][0]], clause_type)
+                if best and (best in sentence or sentence in best):
+                    local_hits += 1
+
+    prefilter_recall = prefilter_hits / total if total else 0.0
+    return {
+        "benchmark": "clause_prefilter",
+        "config": vars(args),
+        "prompt_tokens_full_mean": statistics.mean(full_tokens),
+        "prompt_tokens_prefilter_mean": statistics.mean(kept_tokens),
+        "token_reduction_factor": round(sum(full_tokens) / max(1, sum(kept_tokens)), 2),
+        "prefilter_candidate_recall": round(prefilter_recall, 4),
+        "recall_lost_vs_full_text": round(1.0 - prefilter_recall, 4),
+        "local_mode_recall": round(local_hits / total, 4) if total else 0.0,
+        "classify_ms_p50": round(statistics.median(latencies), 2),
+        "classify_ms_max": round(max(latencies), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--min-score", type=float, default=0.35)
+    parser.add_argument("--keyword-weight", type=float, default=0.6)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    report = run(parser.parse_args())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["config"].get("out"):
+        with open(report["config"]["out"], "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
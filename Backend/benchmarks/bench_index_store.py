@@ -0,0 +1,163 @@
+"""
+Persistent index benchmark: commits N documents to an INDEX_DIR-style store, then measures a cold
+start in fresh processes (as after a restart or in each uvicorn worker): opening the catalog, and the
+first request for a document (memory-mapped snapshot open, page/BM25 index rebuild, one query)
+against rebuilding that document from scratch (embedding every chunk again).
+
+    python benchmarks/bench_index_store.py --documents 1000 --workers 4 --out index_store.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import List, Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document # noqa: E402
+from quantized_store import QuantizedVectorStore # noqa: E402
+from index_store import PersistentIndexStore # noqa: E402
+from hybrid_retrieval import BM25Index # noqa: E402
+from page_index import PageIndex # noqa: E402
+import chunk_diff # noqa: E402
+from fixtures import QUESTIONS, synthetic_contract, split_passages, load_embeddings # noqa: E402
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {"p50_ms": _percentile(samples, 0.50), "p95_ms": _percentile(samples, 0.95), "mean_ms": round(sum(samples) / len(samples), 3)}
+
+
+def _document(seed: int, pages: int) -> Dict[str, Any]:
+    doc = synthetic_contract(pages, seed=seed)
+    page_records = [{"page_content": text, "metadata": {"page_number": i + 1}} for i, text in enumerate(doc["pages"])]
+    chunks: List[Document] = []
+    for page_no, page in enumerate(doc["pages"]):
+        for start, text in zip(range(0, len(page), 650), split_passages(page)):
+            chunks.append(Document(page_content=text, metadata={
+                "chunk_id": len(chunks), "page_number": page_no + 1, "start_index": start, "end_index": start + len(text),
+            }))
+    return {"pages": page_records, "chunks": chunks}
+
+
+def populate(root: str, args) -> Dict[str, Any]:
+    """Commits `--documents` synthetic contracts, as main._persist_document does after an upload."""
+    embeddings = load_embeddings(args.embeddings)
+    store = PersistentIndexStore(root, embeddings)
+    commit_ms, chunks_total = [], 0
+    for seed in range(args.documents):
+        doc = _document(seed, args.pages)
+        chunks = doc["chunks"]
+        vectors = embeddings.embed_documents([c.page_content for c in chunks])
+        point_ids = [str(uuid.uuid4()) for _ in chunks]
+        vectorstore = QuantizedVectorStore.from_vectors(point_ids, chunks, vectors, embeddings, dtype=args.dtype)
+        meta = {"version": 1, "parent_id": None, "chunk_points": chunk_diff.chunk_points(
+            [chunk_diff.chunk_key(c.page_content) for c in chunks], point_ids, [c.metadata for c in chunks])}
+        started = time.perf_counter()
+        store.commit(f"doc{seed:05d}", f"contract_{seed}.pdf", f"hash{seed}", vectorstore, doc["pages"], meta)
+        commit_ms.append((time.perf_counter() - started) * 1000)
+        chunks_total += len(chunks)
+    disk_bytes = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+    return {"documents": args.documents, "chunks": chunks_total, "disk_bytes": disk_bytes, "commit": _summary(commit_ms)}
+
+
+def cold_open(root: str, args) -> Dict[str, Any]:
+    """Runs in a fresh process: catalog open, then first use of a sample of documents (what main._restore_document does)."""
+    embeddings = load_embeddings(args.embeddings)
+    started = time.perf_counter()
+    store = PersistentIndexStore(root, embeddings)
+    catalog_ms = (time.perf_counter() - started) * 1000
+    questions = [q[lang] for q in QUESTIONS.values() for lang in ("en", "hi")]
+    query_vector = embeddings.embed_query(questions[0])
+    sample = sorted(store.refresh())
+    random.Random(args.seed).shuffle(sample)
+    open_ms, first_query_ms, rebuild_ms = [], [], []
+    for i, document_id in enumerate(sample[:args.sample]):
+        started = time.perf_counter()
+        stored = store.open(document_id)
+        chunks = sorted(stored["vectorstore"].documents(), key=lambda c: c.metadata["chunk_id"])
+        page_index = PageIndex([(p["metadata"]["page_number"], p["page_content"]) for p in stored["pages"]])
+        for c in chunks:
+            page_index.add_chunk(c.metadata["chunk_id"], c.metadata["page_number"], c.metadata["start_index"], c.metadata["end_index"])
+        lexical_index = BM25Index(chunks)
+        opened = time.perf_counter()
+        stored["vectorstore"].similarity_search_by_vector(query_vector, k=20)
+        lexical_index.search(questions[0], 20)
+        done = time.perf_counter()
+        open_ms.append((opened - started) * 1000)
+        first_query_ms.append((done - started) * 1000)
+        if i < args.rebuild_sample:
+            # Baseline without persistence: the document has to be embedded and indexed again
+            started = time.perf_counter()
+            vectors = embeddings.embed_documents([c.page_content for c in chunks])
+            QuantizedVectorStore.from_vectors([str(uuid.uuid4()) for _ in chunks], chunks, vectors, embeddings, dtype=args.dtype)
+            BM25Index(chunks)
+            rebuild_ms.append((time.perf_counter() - started) * 1000)
+    return {
+        "catalog_open_ms": round(catalog_ms, 3),
+        "documents_in_catalog": len(sample),
+        "sampled": len(open_ms),
+        "open": _summary(open_ms),
+        "first_query": _summary(first_query_ms),
+        "rebuild_from_scratch": _summary(rebuild_ms) if rebuild_ms else None,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    root = args.root or tempfile.mkdtemp(prefix="bench_index_store_")
+    try:
+        populated = populate(root, args)
+        command = [sys.executable, os.path.abspath(__file__), "--cold-open", root,
+                   "--sample", str(args.sample), "--rebuild-sample", str(args.rebuild_sample),
+                   "--embeddings", args.embeddings, "--dtype", args.dtype]
+        # Fresh processes, started together like uvicorn workers sharing one INDEX_DIR
+        started = time.perf_counter()
+        procs = [subprocess.Popen(command + ["--seed", str(w)], stdout=subprocess.PIPE, text=True) for w in range(args.workers)]
+        workers = [json.loads(proc.communicate()[0]) for proc in procs]
+        wall_ms = (time.perf_counter() - started) * 1000
+        return {
+            "embeddings": args.embeddings,
+            "dtype": args.dtype,
+            "pages_per_document": args.pages,
+            "populate": populated,
+            "workers": args.workers,
+            "workers_wall_ms": round(wall_ms, 2),
+            "cold_open": workers,
+        }
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=4, help="Pages per synthetic document")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent cold-start processes")
+    parser.add_argument("--sample", type=int, default=200, help="Documents each process opens")
+    parser.add_argument("--rebuild-sample", type=int, default=20, help="Documents each process also rebuilds from scratch")
+    parser.add_argument("--dtype", choices=["int8", "float16", "float32"], default="int8", help="VECTOR_QUANTIZATION")
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--root", help="Store directory to populate and keep (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold-open", metavar="ROOT", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+    if args.cold_open:
+        print(json.dumps(cold_open(args.cold_open, args)))
+        sys.exit(0)
+    report = run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,302 @@
+"""
+End-to-end pipeline benchmark: drives /upload/, /ask/ and /compare/ through the ASGI app in-process
+(stub LLM, offline hashing embeddings, throwaway caches) over synthetic Hindi/English legal PDFs
+(digital, scanned image-only and mixed), reporting per-stage throughput, p50/p95/p99 latency,
+peak RSS, concurrency scaling and the cost of re-indexing a lightly edited draft against its parent.
+No network or GPU is needed; scanned/mixed kinds need tesseract.
+
+    python benchmarks/bench_pipeline.py --pages 1,10,100,500 --kinds digital,mixed --out pipeline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import statistics
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fixtures import QUESTIONS, load_embeddings # noqa: E402
+from synthetic_pdf import synthetic_pdf # noqa: E402
+
+
+def _configure_env(workdir: str) -> None:
+    """Must run before `import main`: offline LLM, no warm-up, caches in a throwaway directory."""
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+    os.environ.setdefault("NLTK_AUTO_DOWNLOAD", "0")
+    # Rate limits would measure the token buckets, not the pipeline
+    os.environ.setdefault("LLM_RPM", "0")
+    os.environ.setdefault("LLM_TPM", "0")
+    os.environ["DOC_CACHE_DIR"] = os.path.join(workdir, "doc_cache")
+    os.environ["EMBED_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(samples)
+    pct = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2) if ordered else None
+    return {"n": len(ordered), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1], 2) if ordered else None}
+
+
+class RssSampler:
+    """Samples this process's resident set size in a background thread to find the peak within a scenario."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError: # Not Linux: lifetime peak is the best available
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if platform.system() == "Darwin" else 1024)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def _stage_totals() -> Dict[str, Dict[str, float]]:
+    """Cumulative {stage: {"count", "seconds"}} from the app's stage_duration_seconds histogram."""
+    from metrics import stage_seconds
+    totals: Dict[str, Dict[str, float]] = {}
+    for suffix, labels, value in stage_seconds.samples():
+        if suffix in ("_sum", "_count"):
+            totals.setdefault(labels["stage"], {"count": 0.0, "seconds": 0.0})["seconds" if suffix == "_sum" else "count"] = value
+    return totals
+
+
+def _stage_delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]],
+                 items: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+    """Per-stage calls, time and mean latency over a scenario; items/sec for stages given an item count."""
+    out = {}
+    for stage, total in sorted(after.items()):
+        prior = before.get(stage, {"count": 0.0, "seconds": 0.0})
+        calls, seconds = total["count"] - prior["count"], total["seconds"] - prior["seconds"]
+        if calls <= 0:
+            continue
+        entry = {"calls": int(calls), "seconds": round(seconds, 4), "mean_ms": round(seconds / calls * 1000, 2)}
+        if stage in items and seconds > 0:
+            entry["items_per_second"] = round(items[stage] / seconds, 2)
+        out[stage] = entry
+    return out
+
+
+class PipelineBench:
+    def __init__(self, args):
+        self.args = args
+        import httpx
+        import main
+        self.main = main
+        if args.embeddings == "hash":
+            # Swap the sentence-transformer for the offline stand-in behind the app's embedding cache
+            main.embeddings._base = load_embeddings("hash")
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=None)
+        self._seed = 0
+
+    def _next_seed(self) -> int:
+        # Every upload gets fresh bytes so the content-addressed caches never short-circuit the pipeline
+        self._seed += 1
+        return self._seed
+
+    async def _timed(self, call: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        response = await call()
+        return {"ms": (time.perf_counter() - started) * 1000, "status": response.status_code, "body": response.json()}
+
+    async def upload(self, pdf: bytes, name: str, parent_id: Optional[str] = None) -> Dict[str, Any]:
+        params = {"parent_id": parent_id} if parent_id else {}
+        return await self._timed(lambda: self.client.post("/upload/", params=params, files={"file": (name, pdf, "application/pdf")}))
+
+    async def ask(self, document_id: str, question: str) -> Dict[str, Any]:
+        return await self._timed(lambda: self.client.post("/ask/", json={"document_id": document_id, "question": question}))
+
+    async def compare(self, pdf1: bytes, pdf2: bytes) -> Dict[str, Any]:
+        return await self._timed(lambda: self.client.post("/compare/", files={
+            "file1": ("v1.pdf", pdf1, "application/pdf"), "file2": ("v2.pdf", pdf2, "application/pdf"),
+        }))
+
+    def _questions(self) -> List[str]:
+        questions = [q[lang] for q in QUESTIONS.values() for lang in ("en", "hi")]
+        return (questions * (self.args.questions // len(questions) + 1))[:self.args.questions]
+
+    async def size_scenario(self, kind: str, pages: int) -> Dict[str, Any]:
+        """Uploads, questions and a comparison for one document kind and size."""
+        args = self.args
+        docs = [synthetic_pdf(pages, kind, seed=self._next_seed(), font_path=args.font) for _ in range(args.repeat)]
+        before = _stage_totals()
+        uploads, asks, compares, errors = [], [], [], []
+        chunks = clauses_found = 0
+        with RssSampler() as rss:
+            for i, doc in enumerate(docs):
+                result = await self.upload(doc["pdf"], f"{kind}_{pages}p_{i}.pdf")
+                if result["status"] != 200:
+                    errors.append({"op": "upload", "status": result["status"], "detail": result["body"].get("detail")})
+                    continue
+                uploads.append(result["ms"])
+                chunks += result["body"]["chunks_added"]
+                clauses = result["body"].get("identified_clauses") or []
+                clauses_found += len(clauses)
+                if result["body"].get("clauses_status") != "done" or not clauses:
+                    # Every synthetic contract carries gold clause sentences the stub LLM finds; a broken clause
+                    # stage still returns 200, so without this check it would only look fast
+                    errors.append({"op": "clauses", "status": result["body"].get("clauses_status"), "found": len(clauses)})
+                document_id = result["body"]["document_id"]
+                for question in self._questions():
+                    answered = await self.ask(document_id, question)
+                    (asks if answered["status"] == 200 else errors).append(
+                        answered["ms"] if answered["status"] == 200 else {"op": "ask", "status": answered["status"]})
+            for _ in range(args.compare_repeat):
+                seed = self._next_seed()
+                v1 = synthetic_pdf(pages, kind, seed=seed, font_path=args.font)
+                v2 = synthetic_pdf(pages, kind, seed=seed, font_path=args.font, edits=max(1, pages // 10))
+                result = await self.compare(v1["pdf"], v2["pdf"])
+                (compares if result["status"] == 200 else errors).append(
+                    result["ms"] if result["status"] == 200 else {"op": "compare", "status": result["status"]})
+        after = _stage_totals()
+        upload_seconds = sum(uploads) / 1000
+        return {
+            "kind": kind,
+            "pages": pages,
+            "pdf_bytes_mean": int(statistics.mean(len(d["pdf"]) for d in docs)),
+            "upload": {**_percentiles(uploads),
+                       "pages_per_second": round(pages * len(uploads) / upload_seconds, 2) if upload_seconds else None,
+                       "chunks_per_second": round(chunks / upload_seconds, 2) if upload_seconds else None},
+            "clauses_found": clauses_found,
+            "ask": _percentiles(asks),
+            "compare": _percentiles(compares),
+            "stages": _stage_delta(before, after, {
+                "extract": pages * len(docs) + 2 * pages * args.compare_repeat,
+                "extract.text_layer": pages * len(docs) + 2 * pages * args.compare_repeat,
+                "upload.embed": chunks,
+            }),
+            "peak_rss_mb": round(rss.peak / 2**20, 1),
+            "errors": errors,
+        }
+
+    async def versions(self) -> Dict[str, Any]:
+        """A full upload of a large draft, then a revised draft (a few edited pages) re-indexed against it."""
+        args = self.args
+        seed = self._next_seed()
+        original = synthetic_pdf(args.version_pages, "digital", seed=seed)
+        revised = synthetic_pdf(args.version_pages, "digital", seed=seed, edits=args.version_edits)
+        full = await self.upload(original["pdf"], "draft_v1.pdf")
+        if full["status"] != 200:
+            return {"error": full["body"].get("detail")}
+        before = _stage_totals()
+        incremental = await self.upload(revised["pdf"], "draft_v2.pdf", parent_id=full["body"]["document_id"])
+        return {
+            "pages": args.version_pages,
+            "edits": args.version_edits,
+            "full_upload_ms": round(full["ms"], 2),
+            "incremental_upload_ms": round(incremental["ms"], 2),
+            "speedup": round(full["ms"] / incremental["ms"], 2) if incremental["ms"] else None,
+            "status": incremental["status"],
+            "reindex": incremental["body"].get("reindex"),
+            "stages": _stage_delta(before, _stage_totals(), {}),
+        }
+
+    async def _concurrent(self, level: int, make: Callable[[int], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with RssSampler() as rss:
+            results = await asyncio.gather(*(make(i) for i in range(level)))
+        wall = time.perf_counter() - started
+        ok = [r["ms"] for r in results if r["status"] == 200]
+        return {"concurrency": level, "ok": len(ok), "failed": level - len(ok),
+                "throughput_per_second": round(len(ok) / wall, 2) if wall else None,
+                "wall_ms": round(wall * 1000, 2), **_percentiles(ok), "peak_rss_mb": round(rss.peak / 2**20, 1)}
+
+    async def scaling(self) -> Dict[str, Any]:
+        """Throughput and latency of N simultaneous uploads and N simultaneous questions per level."""
+        args = self.args
+        uploads, asks = [], []
+        seeded = await self.upload(synthetic_pdf(args.scaling_pages, "digital", seed=self._next_seed())["pdf"], "scaling.pdf")
+        document_id = seeded["body"].get("document_id")
+        questions = self._questions()
+        for level in args.concurrency:
+            docs = [synthetic_pdf(args.scaling_pages, "digital", seed=self._next_seed())["pdf"] for _ in range(level)]
+            uploads.append(await self._concurrent(level, lambda i: self.upload(docs[i], f"scaling_{level}_{i}.pdf")))
+            if document_id:
+                # Distinct phrasing per request so the semantic answer cache does not absorb the load
+                asks.append(await self._concurrent(level, lambda i: self.ask(document_id, f"{questions[i % len(questions)]} ({level}.{i})")))
+        return {"pages": args.scaling_pages, "upload": uploads, "ask": asks}
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        kinds = list(args.kinds)
+        skipped = []
+        if shutil.which("tesseract") is None:
+            skipped = [k for k in kinds if k != "digital"]
+            kinds = [k for k in kinds if k == "digital"]
+        try:
+            scenarios = [await self.size_scenario(kind, pages) for kind in kinds for pages in args.pages]
+            scaling = await self.scaling() if args.concurrency else None
+            versions = await self.versions() if args.version_pages else None
+        finally:
+            await self.client.aclose()
+            self.main._shutdown_workers()
+        return {
+            "benchmark": "pipeline",
+            "config": vars(args),
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                            "llm_backend": os.environ.get("LLM_BACKEND")},
+            "skipped_kinds": {k: "tesseract not installed" for k in skipped},
+            "scenarios": scenarios,
+            "scaling": scaling,
+            "versions": versions,
+            "peak_rss_mb_lifetime": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=_int_list, default=[1, 10, 100], help="Document sizes, e.g. 1,10,100,500")
+    parser.add_argument("--kinds", type=lambda s: s.split(","), default=["digital", "scanned", "mixed"])
+    parser.add_argument("--repeat", type=int, default=3, help="Uploads per kind and size")
+    parser.add_argument("--questions", type=int, default=8, help="/ask/ calls per uploaded document")
+    parser.add_argument("--compare-repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 2, 4, 8], help="Scaling levels; empty to skip")
+    parser.add_argument("--scaling-pages", type=int, default=20)
+    parser.add_argument("--version-pages", type=int, default=300, help="Draft size for the incremental re-index scenario; 0 to skip")
+    parser.add_argument("--version-edits", type=int, default=3)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--font", help="TTF used to render scanned pages (use a Devanagari font for Hindi OCR)")
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="nyay_bench_") as workdir:
+        _configure_env(workdir)
+        report = asyncio.run(PipelineBench(args).run())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,140 @@
+"""
+Retrieval benchmark: recall@k and latency of dense-only, BM25-only and hybrid (RRF) retrieval,
+plus prompt tokens of the assembled (overlap-merged, deduplicated, budget-packed) hybrid context
+versus a fixed top-10 dense context.
+
+    python benchmarks/bench_retrieval.py --docs 10 --pages 40 --out retrieval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document # noqa: E402
+from hybrid_retrieval import BM25Index, HybridRetriever # noqa: E402
+from llm_gateway import estimate_tokens # noqa: E402
+from fixtures import QUESTIONS, synthetic_contract, split_passages, load_embeddings # noqa: E402
+
+KS = (1, 3, 5, 10)
+
+
+class MatrixStore:
+    """Brute-force cosine search over a numpy matrix; stands in for the per-document Qdrant collection."""
+
+    def __init__(self, embeddings, documents, vectors):
+        self.embeddings = embeddings
+        self.documents = documents
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def similarity_search_by_vector(self, vector, k=4):
+        scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [self.documents[i] for i in top]
+
+    def similarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3) if ordered else None
+
+
+def run(args) -> dict:
+    embeddings = load_embeddings(args.embeddings)
+    modes = ("dense", "bm25", "hybrid")
+    hits = {m: {k: 0 for k in KS} for m in modes}
+    latency = {m: [] for m in modes}
+    packed_hits, packed_tokens, fixed_tokens, packed_chunks = 0, [], [], []
+    raw_tokens, spans, duplicates = [], [], 0
+    queries = 0
+    same_language = {m: [0, 0] for m in modes} # [hits@5, queries] where question and clause share a language
+
+    for seed in range(args.docs):
+        doc = synthetic_contract(args.pages, seed=seed)
+        chunks = []
+        for page_no, page in enumerate(doc["pages"]):
+            for start, text in zip(range(0, len(page), 650), split_passages(page)):
+                chunks.append(Document(page_content=text, metadata={"chunk_id": len(chunks), "page_number": page_no + 1, "start_index": start}))
+        store = MatrixStore(embeddings, chunks, embeddings.embed_documents([c.page_content for c in chunks]))
+        lexical = BM25Index(chunks)
+        ranked = HybridRetriever(vectorstore=store, lexical_index=lexical, token_budget=10 ** 9, max_chunks=max(KS), estimate_tokens=estimate_tokens)
+        packer = HybridRetriever(vectorstore=store, lexical_index=lexical, token_budget=args.budget, max_chunks=args.max_chunks, estimate_tokens=estimate_tokens)
+
+        for clause_type, (_, sentence) in doc["gold"].items():
+            gold_lang = "hi" if any("ऀ" <= ch <= "ॿ" for ch in sentence) else "en"
+            probe = sentence[len(sentence) // 4:len(sentence) // 4 + 40]
+            relevant = {c.metadata["chunk_id"] for c in chunks if probe in c.page_content}
+            for lang in ("en", "hi"):
+                question = QUESTIONS[clause_type][lang]
+                queries += 1
+                t = time.perf_counter()
+                qvec = embeddings.embed_query(question)
+                embed_ms = (time.perf_counter() - t) * 1000
+
+                t = time.perf_counter()
+                dense = store.similarity_search_by_vector(qvec, k=max(KS))
+                latency["dense"].append(embed_ms + (time.perf_counter() - t) * 1000)
+                t = time.perf_counter()
+                sparse = [chunks[i] for i, _ in lexical.search(question, max(KS))]
+                latency["bm25"].append((time.perf_counter() - t) * 1000)
+                t = time.perf_counter()
+                hybrid, _ = ranked.retrieve(question, qvec)
+                latency["hybrid"].append(embed_ms + (time.perf_counter() - t) * 1000)
+
+                for mode, docs in (("dense", dense), ("bm25", sparse), ("hybrid", hybrid)):
+                    ids = [d.metadata["chunk_id"] for d in docs]
+                    for k in KS:
+                        hits[mode][k] += bool(relevant.intersection(ids[:k]))
+                    if lang == gold_lang:
+                        same_language[mode][0] += bool(relevant.intersection(ids[:5]))
+                        same_language[mode][1] += 1
+
+                packed, info = packer.retrieve(question, qvec)
+                packed_hits += bool(relevant.intersection(d.metadata["chunk_id"] for d in packed))
+                packed_tokens.append(info["context_tokens"])
+                packed_chunks.append(info["chunks"])
+                raw_tokens.append(info["raw_tokens"])
+                spans.append(info["spans"])
+                duplicates += info["near_duplicates"]
+                fixed_tokens.append(sum(estimate_tokens(d.page_content) for d in dense[:10]))
+
+    return {
+        "config": vars(args),
+        "queries": queries,
+        "recall_at_k": {m: {str(k): round(hits[m][k] / queries, 4) for k in KS} for m in modes},
+        "same_language_recall_at_5": {m: round(h / max(1, n), 4) for m, (h, n) in same_language.items()},
+        "latency_ms": {m: {"p50": _percentile(latency[m], 0.5), "p95": _percentile(latency[m], 0.95)} for m in modes},
+        "packed_context": {
+            "recall": round(packed_hits / queries, 4),
+            "mean_tokens": round(statistics.mean(packed_tokens), 1),
+            "mean_chunks": round(statistics.mean(packed_chunks), 2),
+            "mean_spans_after_merge": round(statistics.mean(spans), 2),
+            "mean_tokens_before_assembly": round(statistics.mean(raw_tokens), 1),
+            "near_duplicates_dropped": duplicates,
+            "fixed_top10_dense_tokens": round(statistics.mean(fixed_tokens), 1),
+            "dense_top10_recall": round(hits["dense"][10] / queries, 4),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1500, help="Context token budget (CONTEXT_TOKEN_BUDGET)")
+    parser.add_argument("--max-chunks", type=int, default=10)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    report = run(parser.parse_args())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["config"].get("out"):
+        with open(report["config"]["out"], "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,126 @@
+"""
+Startup benchmark: import-time profile of main.py, time until uvicorn accepts connections,
+and time until /ready reports the models loaded.
+
+    python benchmarks/bench_startup.py --runs 3 --out startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "stub")
+    return env
+
+
+def import_profile(top: int) -> dict:
+    """Runs `python -X importtime -c 'import main'` and returns the total plus main's slowest direct imports."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    main_ms, children, pending = None, [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2 # one space, then two per nesting level
+        ms = int(cumulative_us) / 1000
+        if depth == 1:
+            pending.append((name.strip(), ms))
+        elif depth == 0:
+            # importtime prints children before their parent, so `pending` holds this module's direct imports
+            if name.strip() == "main":
+                main_ms, children = ms, pending
+            pending = []
+    children.sort(key=lambda m: m[1], reverse=True)
+    return {
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "process_wall_ms": round(wall_ms, 1),
+        "import_main_ms": round(main_ms, 1) if main_ms is not None else None,
+        "slowest_imports_of_main": [{"module": n, "ms": round(ms, 1)} for n, ms in children[:top]],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_timings(ready_timeout: float) -> dict:
+    """Starts uvicorn and measures time to a listening socket and to a 200 from /ready."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+                            cwd=BACKEND_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening_ms = ready_ms = None
+    try:
+        deadline = started + ready_timeout
+        while time.perf_counter() < deadline and proc.poll() is None:
+            if listening_ms is None:
+                try:
+                    with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                        listening_ms = (time.perf_counter() - started) * 1000
+                except OSError:
+                    time.sleep(0.01)
+                    continue
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as resp:
+                    if resp.status == 200:
+                        ready_ms = (time.perf_counter() - started) * 1000
+                        break
+            except urllib.error.HTTPError:
+                pass # 503 while warming up
+            except OSError:
+                pass
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {
+        "listening_ms": round(listening_ms, 1) if listening_ms is not None else None,
+        "ready_ms": round(ready_ms, 1) if ready_ms is not None else None,
+    }
+
+
+def run(args) -> dict:
+    profile = import_profile(args.top)
+    serves = [serve_timings(args.ready_timeout) for _ in range(args.runs)]
+    listening = [s["listening_ms"] for s in serves if s["listening_ms"] is not None]
+    ready = [s["ready_ms"] for s in serves if s["ready_ms"] is not None]
+    return {
+        "config": vars(args),
+        "import": profile,
+        "runs": serves,
+        "listening_ms_median": round(statistics.median(listening), 1) if listening else None,
+        "ready_ms_median": round(statistics.median(ready), 1) if ready else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports of main to list")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    report = run(parser.parse_args())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["config"].get("out"):
+        with open(report["config"]["out"], "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,177 @@
+"""
+Vector store benchmark: memory per 10k chunks, build time, top-k query latency and recall@k against
+exact float32 search, for the in-memory Qdrant collection and the quantized in-process store
+(int8 / float16, with and without float32 re-scoring), plus cold-opening a memory-mapped snapshot.
+
+    python benchmarks/bench_vector_store.py --chunks 10000 --queries 200 --out vector_store.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from typing import List, Dict, Any, Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document # noqa: E402
+from quantized_store import QuantizedVectorStore # noqa: E402
+from fixtures import QUESTIONS, synthetic_contract, split_passages, load_embeddings # noqa: E402
+
+
+def _corpus(n_chunks: int) -> List[Document]:
+    chunks: List[Document] = []
+    seed = 0
+    while len(chunks) < n_chunks:
+        doc = synthetic_contract(40, seed=seed)
+        for page_no, page in enumerate(doc["pages"]):
+            for start, text in zip(range(0, len(page), 650), split_passages(page)):
+                chunks.append(Document(page_content=text, metadata={"chunk_id": len(chunks), "page_number": page_no + 1, "start_index": start}))
+        seed += 1
+    return chunks[:n_chunks]
+
+
+def _qdrant_store(embeddings, chunks: List[Document], vectors: List[List[float]], point_ids: List[str]):
+    """Same construction as main._build_vectorstore's Qdrant path."""
+    from langchain_community.vectorstores import Qdrant
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models as qdrant_models
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        collection_name="bench",
+        vectors_config=qdrant_models.VectorParams(size=len(vectors[0]), distance=qdrant_models.Distance.COSINE),
+    )
+    points = [
+        qdrant_models.PointStruct(id=pid, vector=v, payload={"page_content": c.page_content, "metadata": c.metadata})
+        for pid, c, v in zip(point_ids, chunks, vectors)
+    ]
+    for start in range(0, len(points), 256):
+        client.upsert(collection_name="bench", points=points[start:start + 256])
+    return Qdrant(client=client, collection_name="bench", embeddings=embeddings)
+
+
+def _traced(build: Callable[[], Any]) -> Dict[str, Any]:
+    """Builds once untraced (timing) and once under tracemalloc (bytes still allocated afterwards)."""
+    started = time.perf_counter()
+    build()
+    build_ms = (time.perf_counter() - started) * 1000
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    store = build()
+    allocated = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return {"store": store, "build_ms": build_ms, "bytes": allocated}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+def _measure(store, query_vectors: List[List[float]], exact: List[set], k: int) -> Dict[str, Any]:
+    latency, hits = [], 0
+    for qv, truth in zip(query_vectors, exact):
+        started = time.perf_counter()
+        docs = store.similarity_search_by_vector(qv, k=k)
+        latency.append((time.perf_counter() - started) * 1000)
+        hits += len(truth & {d.metadata["chunk_id"] for d in docs})
+    return {
+        "p50_ms": _percentile(latency, 0.50),
+        "p95_ms": _percentile(latency, 0.95),
+        "mean_ms": round(sum(latency) / len(latency), 3),
+        f"recall@{k}": round(hits / (k * len(query_vectors)), 4),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    embeddings = load_embeddings(args.embeddings)
+    chunks = _corpus(args.chunks)
+    started = time.perf_counter()
+    vectors = embeddings.embed_documents([c.page_content for c in chunks])
+    embed_ms = (time.perf_counter() - started) * 1000
+    point_ids = [str(uuid.uuid4()) for _ in chunks]
+    per_10k = 10000 / len(chunks)
+
+    questions = [q[lang] for q in QUESTIONS.values() for lang in ("en", "hi")]
+    query_vectors = [embeddings.embed_query(questions[i % len(questions)] + ("" if i < len(questions) else f" {i}"))
+                     for i in range(args.queries)]
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    exact = [set(np.argsort(-(matrix @ np.asarray(qv, dtype=np.float32)))[:args.k].tolist()) for qv in query_vectors]
+
+    builders: Dict[str, Callable[[], Any]] = {
+        "qdrant": lambda: _qdrant_store(embeddings, chunks, vectors, point_ids),
+    }
+    for dtype in ("float32", "float16", "int8"):
+        builders[f"quantized_{dtype}"] = lambda dtype=dtype: QuantizedVectorStore.from_vectors(point_ids, chunks, vectors, embeddings, dtype=dtype)
+    builders["quantized_int8_rescore"] = lambda: QuantizedVectorStore.from_vectors(
+        point_ids, chunks, vectors, embeddings, dtype="int8", rescore_oversample=args.oversample)
+
+    results: Dict[str, Any] = {}
+    for name, build in builders.items():
+        try:
+            built = _traced(build)
+        except ImportError as e:
+            results[name] = {"skipped": f"{e.name or e} not installed"}
+            continue
+        store = built["store"]
+        results[name] = {
+            "bytes_per_10k_chunks": int(built["bytes"] * per_10k),
+            "vector_bytes_per_10k_chunks": int(store.nbytes() * per_10k) if isinstance(store, QuantizedVectorStore) else None,
+            "build_ms": round(built["build_ms"], 2),
+            **_measure(store, query_vectors, exact, args.k),
+        }
+
+    # Cold open of an int8 + float32 snapshot: payload is parsed, arrays are mapped and paged in on demand
+    # (re-scoring only touches the float32 rows of each query's candidates)
+    workdir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        path = os.path.join(workdir, "snapshot")
+        QuantizedVectorStore.from_vectors(point_ids, chunks, vectors, embeddings, dtype="int8",
+                                          rescore_oversample=args.oversample).save(path)
+        tracemalloc.start()
+        started = time.perf_counter()
+        mapped = QuantizedVectorStore.load(path, embeddings, mmap=True)
+        open_ms = (time.perf_counter() - started) * 1000
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results["quantized_int8_rescore_mmap_snapshot"] = {
+            "snapshot_bytes": sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)),
+            "open_ms": round(open_ms, 2),
+            "heap_bytes_per_10k_chunks": int(allocated * per_10k), # Payload only; vectors stay in the page cache
+            **_measure(mapped, query_vectors, exact, args.k),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "chunks": len(chunks),
+        "dim": len(vectors[0]),
+        "queries": len(query_vectors),
+        "k": args.k,
+        "embeddings": args.embeddings,
+        "embed_ms": round(embed_ms, 2),
+        "stores": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20, help="Dense candidates per query (RETRIEVAL_DENSE_K)")
+    parser.add_argument("--oversample", type=int, default=4, help="Re-scoring oversample (VECTOR_RESCORE_OVERSAMPLE)")
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--out", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+    report = run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
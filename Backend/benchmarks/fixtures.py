@@ -0,0 +1,132 @@
+"""Synthetic Hindi/English legal text used by the offline benchmarks (no network, deterministic)."""
+import random
+import hashlib
+from typing import List, Dict, Any
+
+import numpy as np
+
+# One gold sentence per clause type and language; the benchmarks check these are recovered
+CLAUSE_SENTENCES: Dict[str, Dict[str, str]] = {
+    "Termination": {
+        "en": "Either party may terminate this Agreement by giving thirty days written notice to the other party.",
+        "hi": "कोई भी पक्ष दूसरे पक्ष को तीस दिन का लिखित नोटिस देकर इस अनुबंध को समाप्त कर सकता है।",
+    },
+    "Liability": {
+        "en": "The total liability of the Service Provider shall not exceed the fees paid in the preceding twelve months.",
+        "hi": "सेवा प्रदाता का कुल दायित्व पिछले बारह महीनों में भुगतान किए गए शुल्क से अधिक नहीं होगा।",
+    },
+    "Governing Law": {
+        "en": "This Agreement shall be governed by and construed in accordance with the laws of India.",
+        "hi": "यह अनुबंध भारत के कानूनों के अनुसार शासित और व्याख्यायित होगा।",
+    },
+    "Confidentiality": {
+        "en": "The Receiving Party shall keep all Confidential Information strictly confidential and shall not disclose it to any third party.",
+        "hi": "प्राप्तकर्ता पक्ष सभी गोपनीय जानकारी को पूर्णतः गोपनीय रखेगा और किसी तीसरे पक्ष को प्रकट नहीं करेगा।",
+    },
+    "Payment Terms": {
+        "en": "The Tenant shall pay a monthly rent of Rs. 25,000 on or before the fifth day of each month.",
+        "hi": "किरायेदार प्रत्येक माह की पाँच तारीख तक 25,000 रुपये का मासिक किराया भुगतान करेगा।",
+    },
+    "Force Majeure": {
+        "en": "Neither party shall be liable for delay caused by force majeure events such as an act of God, war or epidemic.",
+        "hi": "कोई भी पक्ष दैवीय आपदा, युद्ध या महामारी जैसी अप्रत्याशित घटनाओं के कारण हुई देरी के लिए उत्तरदायी नहीं होगा।",
+    },
+    "Indemnification": {
+        "en": "The Contractor shall indemnify and hold harmless the Company against all claims arising from its negligence.",
+        "hi": "ठेकेदार अपनी लापरवाही से उत्पन्न सभी दावों के विरुद्ध कंपनी की क्षतिपूर्ति करेगा।",
+    },
+    "Dispute Resolution": {
+        "en": "Any dispute arising under this Agreement shall be referred to arbitration under the Arbitration and Conciliation Act, 1996.",
+        "hi": "इस अनुबंध से उत्पन्न किसी भी विवाद को मध्यस्थता एवं सुलह अधिनियम, 1996 के तहत मध्यस्थता के लिए भेजा जाएगा।",
+    },
+}
+
+# Paraphrased user questions per clause type (they avoid copying the gold sentence wording)
+QUESTIONS: Dict[str, Dict[str, str]] = {
+    "Termination": {"en": "How can the contract be ended and how much notice is needed?", "hi": "अनुबंध कैसे समाप्त किया जा सकता है और कितने दिन का नोटिस चाहिए?"},
+    "Liability": {"en": "What is the maximum liability of the service provider?", "hi": "सेवा प्रदाता का अधिकतम दायित्व कितना है?"},
+    "Governing Law": {"en": "Which country's laws govern this contract?", "hi": "यह अनुबंध किस देश के कानूनों से शासित है?"},
+    "Confidentiality": {"en": "Can confidential information be shared with a third party?", "hi": "क्या गोपनीय जानकारी किसी तीसरे पक्ष को बताई जा सकती है?"},
+    "Payment Terms": {"en": "How much is the monthly rent and when is it due?", "hi": "मासिक किराया कितना है और कब देना है?"},
+    "Force Majeure": {"en": "Who is responsible for delays caused by war or an epidemic?", "hi": "युद्ध या महामारी से हुई देरी के लिए कौन उत्तरदायी है?"},
+    "Indemnification": {"en": "Who must indemnify the company for negligence claims?", "hi": "लापरवाही के दावों पर कंपनी की क्षतिपूर्ति कौन करेगा?"},
+    "Dispute Resolution": {"en": "How will disputes under the agreement be resolved?", "hi": "अनुबंध से जुड़े विवाद कैसे सुलझाए जाएंगे?"},
+}
+
+FILLER_EN = [
+    "The parties have read and understood the terms set out in this document.",
+    "The premises shall be used for residential purposes only.",
+    "All notices shall be delivered to the addresses mentioned above.",
+    "The schedule annexed hereto forms an integral part of this document.",
+    "The headings are for convenience only and do not affect interpretation.",
+    "The Company was incorporated under the Companies Act, 2013.",
+    "The Employee shall report to the Managing Director.",
+    "Words importing the singular include the plural and vice versa.",
+    "The office hours shall be from ten in the morning to six in the evening.",
+    "The inventory of fixtures is listed in Annexure B.",
+]
+FILLER_HI = [
+    "दोनों पक्षों ने इस दस्तावेज़ की शर्तों को पढ़ और समझ लिया है।",
+    "परिसर का उपयोग केवल आवासीय प्रयोजनों के लिए किया जाएगा।",
+    "सभी सूचनाएँ ऊपर उल्लिखित पतों पर भेजी जाएँगी।",
+    "संलग्न अनुसूची इस दस्तावेज़ का अभिन्न अंग है।",
+    "शीर्षक केवल सुविधा के लिए हैं और व्याख्या को प्रभावित नहीं करते।",
+    "कर्मचारी प्रबंध निदेशक को रिपोर्ट करेगा।",
+    "कार्यालय का समय सुबह दस बजे से शाम छह बजे तक होगा।",
+    "फिक्स्चर की सूची अनुलग्नक बी में दी गई है।",
+]
+
+
+def synthetic_contract(n_pages: int, seed: int = 0, sentences_per_page: int = 12, language: str = "mixed") -> Dict[str, Any]:
+    """
+    Builds a contract of n_pages pages of filler text with each clause's gold sentence
+    placed once at a random position. Returns {"pages": [str], "gold": {type: (page_index, sentence)}}.
+    """
+    rng = random.Random(seed)
+    pages: List[List[str]] = []
+    for _ in range(n_pages):
+        pool = FILLER_EN + FILLER_HI if language == "mixed" else (FILLER_HI if language == "hi" else FILLER_EN)
+        pages.append([rng.choice(pool) for _ in range(sentences_per_page)])
+    gold = {}
+    for clause_type, variants in CLAUSE_SENTENCES.items():
+        lang = rng.choice(["en", "hi"]) if language == "mixed" else language
+        page_idx = rng.randrange(n_pages)
+        pages[page_idx].insert(rng.randrange(len(pages[page_idx]) + 1), variants[lang])
+        gold[clause_type] = (page_idx, variants[lang])
+    return {"pages": [" ".join(p) for p in pages], "gold": gold}
+
+
+def split_passages(text: str, size: int = 800, overlap: int = 150) -> List[str]:
+    """Fixed-size character windows approximating the app's RecursiveCharacterTextSplitter settings."""
+    step = max(1, size - overlap)
+    return [text[i:i + size] for i in range(0, max(1, len(text) - overlap), step)]
+
+
+class HashingEmbeddings:
+    """Deterministic offline stand-in for the sentence-transformer: hashed character trigrams, unit-normalized."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        t = f"  {text.lower()}  "
+        for i in range(len(t) - 2):
+            h = int.from_bytes(hashlib.blake2b(t[i:i + 3].encode("utf-8"), digest_size=4).digest(), "little")
+            vec[h % self.dim] += 1.0 if h & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def load_embeddings(kind: str):
+    """'hash' (offline, default) or 'hf' (the app's all-MiniLM-L6-v2; needs the model cached locally)."""
+    if kind == "hf":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    return HashingEmbeddings()
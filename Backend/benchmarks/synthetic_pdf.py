@@ -0,0 +1,142 @@
+"""
+Dependency-free writer for synthetic PDFs used by the offline benchmarks.
+
+Digital pages carry a real text layer: text is drawn with a (non-embedded) Type0 font whose
+ToUnicode map covers every character used, so pypdf extracts Hindi and English exactly.
+Scanned pages are a single grayscale image with no text layer (rendered with Pillow; pass a
+Devanagari-capable TTF as `font_path` if the OCR output should be meaningful for Hindi).
+"""
+import zlib
+import random
+import textwrap
+from typing import List, Dict, Any, Optional
+
+from fixtures import synthetic_contract
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792 # US Letter in points
+SCAN_DPI = 100
+LINE_CHARS = 90
+FONT_SIZE = 10
+LEADING = 13
+
+
+def _cmap(cids: Dict[str, int]) -> bytes:
+    """ToUnicode CMap mapping each 2-byte CID back to its character."""
+    lines = [
+        "/CIDInit /ProcSet findresource begin", "12 dict begin", "begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def", "/CMapType 2 def",
+        "1 begincodespacerange", "<0000> <FFFF>", "endcodespacerange",
+    ]
+    items = sorted(cids.items(), key=lambda kv: kv[1])
+    for start in range(0, len(items), 100): # At most 100 entries per bfchar block
+        block = items[start:start + 100]
+        lines.append(f"{len(block)} beginbfchar")
+        lines.extend(f"<{cid:04X}> <{ch.encode('utf-16-be').hex().upper()}>" for ch, cid in block)
+        lines.append("endbfchar")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    return "\n".join(lines).encode("ascii")
+
+
+def _text_content(text: str, cids: Dict[str, int]) -> bytes:
+    ops = []
+    y = PAGE_HEIGHT - 60
+    for line in textwrap.wrap(text, LINE_CHARS):
+        if y < 50:
+            break
+        encoded = "".join(f"{cids[ch]:04X}" for ch in line)
+        ops.append(f"BT /F1 {FONT_SIZE} Tf 50 {y} Td <{encoded}> Tj ET")
+        y -= LEADING
+    return "\n".join(ops).encode("ascii")
+
+
+def _scan_image(text: str, font_path: Optional[str], seed: int) -> Dict[str, Any]:
+    """Renders text onto a grayscale 'scan' with a little noise; returns raw pixel data for an image XObject."""
+    from PIL import Image, ImageDraw, ImageFont
+    width, height = PAGE_WIDTH * SCAN_DPI // 72, PAGE_HEIGHT * SCAN_DPI // 72
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.truetype(font_path, 16) if font_path else ImageFont.load_default()
+    y = 60
+    for line in textwrap.wrap(text, LINE_CHARS):
+        if y > height - 60:
+            break
+        draw.text((60, y), line, fill=0, font=font)
+        y += 20
+    rng = random.Random(seed)
+    for _ in range(width * height // 400): # Sparse speckle so pages are not trivially compressible
+        img.putpixel((rng.randrange(width), rng.randrange(height)), rng.randrange(120, 230))
+    return {"width": width, "height": height, "data": zlib.compress(img.tobytes(), 6)}
+
+
+def build_pdf(pages: List[Dict[str, Any]], font_path: Optional[str] = None) -> bytes:
+    """Writes a PDF from [{"text": str, "scanned": bool}, ...]."""
+    chars = sorted({ch for p in pages if not p.get("scanned") for ch in p["text"]} | {" "})
+    cids = {ch: i + 1 for i, ch in enumerate(chars)} # CID 0 is .notdef
+
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(header: str, data: bytes) -> bytes:
+        return f"<< {header} /Length {len(data)} >>\nstream\n".encode("ascii") + data + b"\nendstream"
+
+    catalog = add(b"") # Filled in once the page tree exists
+    pages_id = add(b"")
+    to_unicode = add(stream("", _cmap(cids)))
+    descriptor = add(b"<< /Type /FontDescriptor /FontName /SyntheticSans /Flags 32 /FontBBox [0 -200 1000 900] "
+                     b"/ItalicAngle 0 /Ascent 900 /Descent -200 /CapHeight 700 /StemV 80 >>")
+    cid_font = add(f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /SyntheticSans "
+                   f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                   f"/FontDescriptor {descriptor} 0 R /DW 500 >>".encode("ascii"))
+    font = add(f"<< /Type /Font /Subtype /Type0 /BaseFont /SyntheticSans /Encoding /Identity-H "
+               f"/DescendantFonts [{cid_font} 0 R] /ToUnicode {to_unicode} 0 R >>".encode("ascii"))
+
+    page_ids = []
+    for number, page in enumerate(pages):
+        if page.get("scanned"):
+            image = _scan_image(page["text"], font_path, seed=number)
+            image_id = add(stream(f"/Type /XObject /Subtype /Image /Width {image['width']} /Height {image['height']} "
+                                  f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode", image["data"]))
+            content = add(stream("", f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im1 Do Q".encode("ascii")))
+            resources = f"<< /XObject << /Im1 {image_id} 0 R >> >>"
+        else:
+            content = add(stream("", _text_content(page["text"], cids)))
+            resources = f"<< /Font << /F1 {font} 0 R >> >>"
+        page_ids.append(add(f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                            f"/Resources {resources} /Contents {content} 0 R >>".encode("ascii")))
+
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode("ascii")
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+
+    out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += b"".join(f"{off:010d} 00000 n \n".encode("ascii") for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def synthetic_pdf(n_pages: int, kind: str = "digital", seed: int = 0, language: str = "mixed",
+                  font_path: Optional[str] = None, edits: int = 0) -> Dict[str, Any]:
+    """
+    A synthetic contract as a PDF. `kind` is "digital" (text layer), "scanned" (image-only) or
+    "mixed" (every third page scanned). `edits` replaces that many filler sentences (a revised draft
+    of the same seed, for /compare/). Returns {"pdf": bytes, "pages": [str], "gold": {...}}.
+    """
+    doc = synthetic_contract(n_pages, seed=seed, language=language)
+    pages = list(doc["pages"])
+    rng = random.Random(seed + 7919)
+    for i in range(edits):
+        idx = rng.randrange(n_pages)
+        pages[idx] = pages[idx] + f" Amendment {i + 1}: this sentence was added in the revised draft."
+    scanned = {"digital": lambda i: False, "scanned": lambda i: True, "mixed": lambda i: i % 3 == 2}[kind]
+    pdf = build_pdf([{"text": text, "scanned": scanned(i)} for i, text in enumerate(pages)], font_path=font_path)
+    return {"pdf": pdf, "pages": pages, "gold": doc["gold"]}
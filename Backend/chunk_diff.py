@@ -0,0 +1,60 @@
+import re
+import hashlib
+from dataclasses import dataclass, field
+from collections import defaultdict, deque
+from typing import List, Dict, Tuple, Deque, Any
+
+_WS_RE = re.compile(r"\s+")
+
+# (content key, vector-store point id, (chunk_id, page_number, start_index)) per chunk, in chunk order
+ChunkPoint = Tuple[str, str, Tuple[Any, ...]]
+
+
+def chunk_key(text: str) -> str:
+    """Content hash of a chunk, insensitive to whitespace differences."""
+    return hashlib.blake2b(_WS_RE.sub(" ", text).strip().encode("utf-8"), digest_size=16).hexdigest()
+
+
+def chunk_signature(metadata: Dict[str, Any]) -> Tuple[Any, ...]:
+    """The positional metadata that must be rewritten when an unchanged chunk moves."""
+    return (metadata.get("chunk_id"), metadata.get("page_number", 1), metadata.get("start_index", 0))
+
+
+def chunk_points(keys: List[str], point_ids: List[str], metadatas: List[Dict[str, Any]]) -> List[ChunkPoint]:
+    """Bookkeeping kept with each live document so a later version can be diffed against it."""
+    return [(k, pid, chunk_signature(m)) for k, pid, m in zip(keys, point_ids, metadatas)]
+
+
+@dataclass
+class ChunkDiff:
+    """How a new version's chunks map onto its parent's stored points."""
+    reused: Dict[int, str] = field(default_factory=dict) # new chunk index -> parent point id (no embedding needed)
+    moved: List[int] = field(default_factory=list) # reused chunks whose position metadata changed
+    added: List[int] = field(default_factory=list) # new chunk indexes to embed and insert
+    removed: List[str] = field(default_factory=list) # parent point ids to delete
+
+    def stats(self) -> Dict[str, int]:
+        return {"reused": len(self.reused), "moved": len(self.moved), "embedded": len(self.added), "deleted": len(self.removed)}
+
+
+def diff_chunks(parent: List[ChunkPoint], keys: List[str], metadatas: List[Dict[str, Any]]) -> ChunkDiff:
+    """
+    Matches a new version's chunks (content keys + metadata, in order) against the parent's by content
+    hash. Repeated chunks pair up in document order, so duplicates are neither lost nor double-counted.
+    """
+    available: Dict[str, Deque[Tuple[str, Tuple[Any, ...]]]] = defaultdict(deque)
+    for key, point_id, signature in parent:
+        available[key].append((point_id, signature))
+
+    diff = ChunkDiff()
+    for i, (key, metadata) in enumerate(zip(keys, metadatas)):
+        candidates = available.get(key)
+        if candidates:
+            point_id, signature = candidates.popleft()
+            diff.reused[i] = point_id
+            if signature != chunk_signature(metadata):
+                diff.moved.append(i)
+        else:
+            diff.added.append(i)
+    diff.removed = [point_id for remaining in available.values() for point_id, _ in remaining]
+    return diff
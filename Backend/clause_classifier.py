@@ -0,0 +1,99 @@
+import re
+import math
+import logging
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn.error")
+
+# Bilingual (English / Hindi) surface patterns per CLAUSE_LIBRARY type
+CLAUSE_KEYWORDS: Dict[str, List[str]] = {
+    "Termination": [r"\bterminat\w*", r"\bcancell?\w*", r"\bnotice period\b", r"\bexpir\w*", r"समाप्त", r"निरस्त", r"रद्द", r"नोटिस अवधि"],
+    "Liability": [r"\bliabilit\w*", r"\bliable\b", r"\bresponsib\w*", r"दायित्व", r"उत्तरदायी", r"जिम्मेदार"],
+    "Governing Law": [r"\bgoverning law\b", r"\bgoverned by\b", r"\blaws of\b", r"\bjurisdiction\b", r"शासी कानून", r"क्षेत्राधिकार", r"कानूनों के अनुसार", r"के कानून"],
+    "Confidentiality": [r"\bconfidential\w*", r"\bnon-disclosure\b", r"\bdisclos\w*", r"\bproprietary\b", r"गोपनीय", r"प्रकट नहीं", r"खुलासा"],
+    "Payment Terms": [r"\bpayment\w*", r"\bpayable\b", r"\binvoice\w*", r"\bfees?\b", r"\brent\b", r"(\brs\.?|\binr\b|₹)", r"भुगतान", r"किराया", r"शुल्क", r"रुपये"],
+    "Force Majeure": [r"\bforce majeure\b", r"\bact of god\b", r"\bbeyond (its |their |the )?(reasonable )?control\b", r"अप्रत्याशित", r"दैवीय", r"अपरिहार्य"],
+    "Indemnification": [r"\bindemnif\w*", r"\bhold harmless\b", r"\bindemnit\w*", r"क्षतिपूर्ति", r"हानि की भरपाई"],
+    "Dispute Resolution": [r"\bdisputes?\b", r"\barbitrat\w*", r"\bmediat\w*", r"\bconciliat\w*", r"विवाद", r"मध्यस्थ", r"पंचाट"],
+}
+
+_SENTENCE_RE = re.compile(r"[^.!?।]+[.!?।]?")
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class ClausePreClassifier:
+    """
+    Local first pass for clause identification. Scores passages against each clause type by
+    combining bilingual keyword hits with embedding similarity to the CLAUSE_LIBRARY descriptions,
+    so only the strongest candidate passages need to go to the LLM (or none, in local mode).
+    """
+
+    def __init__(self, embeddings: Any, clause_library: Dict[str, Dict[str, str]], keyword_weight: float = 0.6):
+        self.embeddings = embeddings
+        self.clause_types = list(clause_library.keys())
+        self.clause_library = clause_library
+        self.keyword_weight = keyword_weight
+        self._patterns = {
+            t: [re.compile(p, re.IGNORECASE) for p in CLAUSE_KEYWORDS.get(t, [re.escape(t)])]
+            for t in self.clause_types
+        }
+        self._desc_vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _description_vectors(self) -> np.ndarray:
+        """One unit vector per (clause type, language) description, shaped [types, 2, dim]."""
+        with self._lock:
+            if self._desc_vectors is None:
+                texts = []
+                for t in self.clause_types:
+                    info = self.clause_library[t]
+                    texts.extend([f"{t}: {info.get('en', '')}", f"{t}: {info.get('hi', '')}"])
+                vectors = _unit_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+                self._desc_vectors = vectors.reshape(len(self.clause_types), 2, -1)
+            return self._desc_vectors
+
+    def keyword_hits(self, text: str, clause_type: str) -> int:
+        return sum(len(p.findall(text)) for p in self._patterns[clause_type])
+
+    def score(self, passages: List[str], passage_vectors: Optional[List[List[float]]] = None) -> np.ndarray:
+        """Returns a [passages, clause_types] matrix of combined scores in [0, 1]."""
+        if not passages:
+            return np.zeros((0, len(self.clause_types)), dtype=np.float32)
+        keyword = np.array(
+            [[1.0 - math.exp(-self.keyword_hits(p, t)) for t in self.clause_types] for p in passages],
+            dtype=np.float32,
+        )
+        if self.keyword_weight >= 1.0:
+            return keyword
+        if passage_vectors is None:
+            passage_vectors = self.embeddings.embed_documents(passages)
+        vectors = _unit_rows(np.asarray(passage_vectors, dtype=np.float32))
+        # Best of the English / Hindi description similarities for each clause type
+        similarity = np.einsum("pd,tld->ptl", vectors, self._description_vectors()).max(axis=2)
+        return self.keyword_weight * keyword + (1.0 - self.keyword_weight) * np.clip(similarity, 0.0, 1.0)
+
+    def select_candidates(self, scores: np.ndarray, top_k: int, min_score: float) -> Dict[str, List[Tuple[int, float]]]:
+        """Top-k passage indices (with scores) per clause type, ignoring those below min_score."""
+        candidates: Dict[str, List[Tuple[int, float]]] = {}
+        for col, clause_type in enumerate(self.clause_types):
+            column = scores[:, col]
+            order = np.argsort(-column)[:top_k]
+            picked = [(int(i), float(column[i])) for i in order if column[i] >= min_score]
+            if picked:
+                candidates[clause_type] = picked
+        return candidates
+
+    def best_sentence(self, passage: str, clause_type: str) -> str:
+        """The sentence in a passage with the most keyword hits for the clause type (whole passage if none)."""
+        sentences = [s.strip() for s in _SENTENCE_RE.findall(passage) if s.strip()]
+        if not sentences:
+            return passage.strip()
+        best = max(sentences, key=lambda s: self.keyword_hits(s, clause_type))
+        return best if self.keyword_hits(best, clause_type) else passage.strip()
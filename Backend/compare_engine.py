@@ -0,0 +1,202 @@
+import re
+import json
+import time
+import bisect
+import hashlib
+import difflib
+from collections import Counter
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+# Sentence / clause boundaries: Latin terminators, semicolons, Hindi danda (।) and double danda (॥), line breaks
+_SEGMENT_SPLIT_RE = re.compile(r"(?<=[.!?;।॥])\s+|\n+")
+_WS_RE = re.compile(r"\s+")
+HISTOGRAM_MAX_OCCURRENCES = 64 # Above this, a block without unique anchors is reported as a plain change
+WORD_DIFF_MAX_CELLS = 4_000_000 # Word-level diff only inside changed blocks of bounded size
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def segment(text: str) -> List[str]:
+    """Splits text into sentence/clause segments (Hindi danda aware), dropping empty ones."""
+    return [s.strip() for s in _SEGMENT_SPLIT_RE.split(text) if s and s.strip()]
+
+
+def _segment_key(seg: str) -> bytes:
+    return hashlib.blake2b(_WS_RE.sub(" ", seg).casefold().encode("utf-8"), digest_size=8).digest()
+
+
+def _unique_anchors(a: List[bytes], b: List[bytes], alo: int, ahi: int, blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """Patience step: keys occurring exactly once on each side, reduced to their longest increasing run."""
+    count_a = Counter(a[alo:ahi])
+    count_b = Counter(b[blo:bhi])
+    b_pos = {b[j]: j for j in range(blo, bhi) if count_b[b[j]] == 1}
+    pairs = [(i, b_pos[a[i]]) for i in range(alo, ahi) if count_a[a[i]] == 1 and a[i] in b_pos]
+    if not pairs:
+        return []
+    # Longest increasing subsequence on the b positions (patience sorting)
+    tails: List[int] = []
+    tail_idx: List[int] = []
+    prev = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_idx.append(k)
+        else:
+            tails[pos] = j
+            tail_idx[pos] = k
+        prev[k] = tail_idx[pos - 1] if pos else -1
+    run, k = [], tail_idx[-1]
+    while k != -1:
+        run.append(pairs[k])
+        k = prev[k]
+    return run[::-1]
+
+
+def _histogram_anchor(a: List[bytes], b: List[bytes], alo: int, ahi: int, blo: int, bhi: int) -> Optional[Tuple[int, int]]:
+    """Histogram step: the rarest key common to both ranges (if rare enough) becomes a single anchor."""
+    count_a = Counter(a[alo:ahi])
+    count_b = Counter(b[blo:bhi])
+    common = [k for k in count_a if k in count_b]
+    if not common:
+        return None
+    best = min(common, key=lambda k: count_a[k] + count_b[k])
+    if count_a[best] + count_b[best] > HISTOGRAM_MAX_OCCURRENCES:
+        return None
+    return a.index(best, alo, ahi), b.index(best, blo, bhi)
+
+
+def _matched_pairs(a: List[bytes], b: List[bytes]) -> List[Tuple[int, int]]:
+    """All matched (i, j) segment pairs, found by iterative patience diff with a histogram fallback."""
+    pairs: List[Tuple[int, int]] = []
+    work = [(0, len(a), 0, len(b))]
+    while work:
+        alo, ahi, blo, bhi = work.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            pairs.append((alo, blo))
+            alo, blo = alo + 1, blo + 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi, bhi = ahi - 1, bhi - 1
+            pairs.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if not anchors:
+            anchor = _histogram_anchor(a, b, alo, ahi, blo, bhi)
+            anchors = [anchor] if anchor else []
+        prev_i, prev_j = alo, blo
+        for i, j in anchors:
+            work.append((prev_i, i, prev_j, j))
+            pairs.append((i, j))
+            prev_i, prev_j = i + 1, j + 1
+        if anchors:
+            work.append((prev_i, ahi, prev_j, bhi))
+    pairs.sort()
+    return pairs
+
+
+def diff_opcodes(a_segments: List[str], b_segments: List[str]) -> List[Opcode]:
+    """difflib-style opcodes ('equal', 'delete', 'insert', 'replace', i1, i2, j1, j2) over segments."""
+    a = [_segment_key(s) for s in a_segments]
+    b = [_segment_key(s) for s in b_segments]
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for mi, mj in _matched_pairs(a, b) + [(len(a), len(b))]:
+        if i < mi and j < mj:
+            opcodes.append(("replace", i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(("delete", i, mi, j, j))
+        elif j < mj:
+            opcodes.append(("insert", i, i, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == "equal" and opcodes[-1][2] == mi:
+                tag, i1, _, j1, _ = opcodes[-1]
+                opcodes[-1] = ("equal", i1, mi + 1, j1, mj + 1)
+            else:
+                opcodes.append(("equal", mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+def word_diff(a_text: str, b_text: str) -> Optional[List[Dict[str, str]]]:
+    """Word-level diff of one changed block, or None if the block is too large to diff finely."""
+    aw, bw = a_text.split(), b_text.split()
+    if len(aw) * len(bw) > WORD_DIFF_MAX_CELLS:
+        return None
+    out: List[Dict[str, str]] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, aw, bw, autojunk=False).get_opcodes():
+        if tag == "equal":
+            out.append({"op": "equal", "text": " ".join(aw[i1:i2])})
+            continue
+        if i2 > i1:
+            out.append({"op": "delete", "text": " ".join(aw[i1:i2])})
+        if j2 > j1:
+            out.append({"op": "insert", "text": " ".join(bw[j1:j2])})
+    return out
+
+
+def iter_compare(a_segments: List[str], b_segments: List[str], opcodes: List[Opcode], fromfile: str = "", tofile: str = "") -> Iterator[Dict[str, Any]]:
+    """Structured comparison records: a header, one record per block (word diffs inside replacements), a summary."""
+    started = time.perf_counter()
+    totals = Counter()
+    yield {"type": "header", "from": fromfile, "to": tofile, "segments_a": len(a_segments), "segments_b": len(b_segments)}
+    for tag, i1, i2, j1, j2 in opcodes:
+        totals[tag] += max(i2 - i1, j2 - j1)
+        record: Dict[str, Any] = {"type": tag, "a": [i1, i2], "b": [j1, j2]}
+        if tag == "delete":
+            record["text"] = a_segments[i1:i2]
+        elif tag == "insert":
+            record["text"] = b_segments[j1:j2]
+        elif tag == "replace":
+            record["a_text"] = a_segments[i1:i2]
+            record["b_text"] = b_segments[j1:j2]
+            record["words"] = word_diff(" ".join(record["a_text"]), " ".join(record["b_text"]))
+        yield record
+    yield {"type": "summary", **{k: totals.get(k, 0) for k in ("equal", "delete", "insert", "replace")},
+           "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def iter_ndjson(records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def unified_lines(a_segments: List[str], b_segments: List[str], opcodes: List[Opcode], fromfile: str = "", tofile: str = "", n: int = 3) -> Iterator[str]:
+    """Unified-diff lines (one segment per line), same shape as difflib.unified_diff output."""
+    if all(op[0] == "equal" for op in opcodes):
+        return
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    codes = list(opcodes)
+    # Trim leading/trailing context and split long equal runs, as difflib.get_grouped_opcodes does
+    if codes[0][0] == "equal":
+        _, i1, i2, j1, j2 = codes[0]
+        codes[0] = ("equal", max(i1, i2 - n), i2, max(j1, j2 - n), j2)
+    if codes[-1][0] == "equal":
+        _, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = ("equal", i1, min(i2, i1 + n), j1, min(j2, j1 + n))
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * n:
+            group.append(("equal", i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+
+    yield f"--- {fromfile}\n"
+    yield f"+++ {tofile}\n"
+    for grp in groups:
+        a_start, a_end = grp[0][1], grp[-1][2]
+        b_start, b_end = grp[0][3], grp[-1][4]
+        yield f"@@ -{a_start + 1},{a_end - a_start} +{b_start + 1},{b_end - b_start} @@\n"
+        for tag, i1, i2, j1, j2 in grp:
+            if tag == "equal":
+                for seg in a_segments[i1:i2]:
+                    yield f" {seg}\n"
+                continue
+            for seg in a_segments[i1:i2]:
+                yield f"-{seg}\n"
+            for seg in b_segments[j1:j2]:
+                yield f"+{seg}\n"
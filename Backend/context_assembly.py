@@ -0,0 +1,119 @@
+import re
+import copy
+from typing import List, Dict, Any, Tuple, Callable
+
+from langchain_core.documents import Document
+
+NEAR_DUPLICATE_JACCARD = 0.85 # Word-trigram overlap above which two passages count as the same text
+ADJACENT_GAP_CHARS = 2 # Chunks this close on a page (stripped whitespace) are joined into one span
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> frozenset:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 3:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class _Span:
+    """A contiguous [start, end) stretch of one page built from one or more retrieved chunks."""
+
+    __slots__ = ("page", "start", "end", "text", "chunk_ids", "metadata", "shingles")
+
+    def __init__(self, doc: Document):
+        meta = doc.metadata or {}
+        self.page = meta.get("page_number", 1)
+        self.start = meta.get("start_index")
+        self.end = meta.get("end_index", (self.start or 0) + len(doc.page_content))
+        self.text = doc.page_content
+        self.chunk_ids = [meta["chunk_id"]] if "chunk_id" in meta else []
+        self.metadata = meta
+        self.shingles = _shingles(doc.page_content)
+
+    def joinable(self, other: "_Span") -> bool:
+        if self.start is None or other.start is None or self.page != other.page:
+            return False
+        return other.start <= self.end + ADJACENT_GAP_CHARS and self.start <= other.end + ADJACENT_GAP_CHARS
+
+    def joined_text(self, other: "_Span") -> str:
+        """Text of the union of both spans, taken from whichever side covers each stretch."""
+        first, second = (self, other) if self.start <= other.start else (other, self)
+        if second.end <= first.end:
+            return first.text
+        if second.start >= first.end:
+            return first.text + " " + second.text
+        return first.text + second.text[first.end - second.start:]
+
+    def merged(self, other: "_Span") -> "_Span":
+        span = copy.copy(self)
+        span.text = self.joined_text(other)
+        span.start, span.end = min(self.start, other.start), max(self.end, other.end)
+        span.chunk_ids = sorted(set(self.chunk_ids) | set(other.chunk_ids))
+        span.shingles = _shingles(span.text)
+        return span
+
+    def to_document(self) -> Document:
+        metadata = {**self.metadata, "page_number": self.page, "chunk_ids": self.chunk_ids}
+        if self.start is not None:
+            metadata.update({"start_index": self.start, "end_index": self.end})
+        if self.chunk_ids:
+            metadata["chunk_id"] = self.chunk_ids[0]
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def assemble_context(ranked: List[Document], token_budget: int, max_chunks: int,
+                     estimate: Callable[[str], int]) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Builds the prompt context from ranked chunks: overlapping or adjacent chunks of the same page are
+    merged back into one span (so the overlap is sent once), near-duplicate passages are dropped, and
+    the result is packed to the token budget in rank order, then returned in document order.
+    """
+    spans: List[_Span] = []
+    used = raw_tokens = chunks_used = merged = duplicates = 0
+    for doc in ranked:
+        if chunks_used >= max_chunks:
+            break
+        candidate = _Span(doc)
+        cost = estimate(candidate.text)
+        touching = [s for s in spans if s.joinable(candidate)]
+        if touching:
+            # Merge into every span the chunk touches (it may bridge two of them)
+            new_span = candidate
+            for span in touching:
+                new_span = span.merged(new_span)
+            delta = estimate(new_span.text) - sum(estimate(s.text) for s in touching)
+            if used + delta > token_budget:
+                continue
+            for span in touching:
+                spans.remove(span)
+            spans.append(new_span)
+            used += delta
+            merged += 1
+        else:
+            if any(_jaccard(candidate.shingles, s.shingles) >= NEAR_DUPLICATE_JACCARD for s in spans):
+                duplicates += 1
+                raw_tokens += cost
+                chunks_used += 1
+                continue
+            if spans and used + cost > token_budget:
+                continue # A shorter, lower-ranked chunk may still fit
+            spans.append(candidate)
+            used += cost
+        raw_tokens += cost
+        chunks_used += 1
+
+    spans.sort(key=lambda s: (s.page, s.start if s.start is not None else 0))
+    return [s.to_document() for s in spans], {
+        "chunks": chunks_used,
+        "spans": len(spans),
+        "merged_chunks": merged,
+        "near_duplicates": duplicates,
+        "raw_tokens": raw_tokens,
+        "context_tokens": used,
+        "tokens_saved": raw_tokens - used,
+    }
@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Optional, List, Dict, Any, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+DOCS_FILE = "docs.json"
+CLAUSES_FILE = "clauses.json"
+
+
+def _variant_suffix(variant: str) -> str:
+    """Short stable tag so chunk/vector artifacts are keyed by splitter + model settings."""
+    return hashlib.sha256(variant.encode("utf-8")).hexdigest()[:12]
+
+
+class DocumentCache:
+    """
+    Content-addressed on-disk cache of per-upload processing results, keyed by the
+    SHA-256 of the uploaded bytes. Each entry is a directory holding:
+      - docs.json                 cleaned extracted pages
+      - chunks_<variant>.json     split chunks (page_content + metadata)
+      - vectors_<variant>.f32     chunk embeddings as raw float32, row-major
+      - clauses.json              clause identification results
+    Entries are evicted least-recently-used once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes = sum(self._entry_size(name) for name in os.listdir(self.root))
+
+    # --- internal helpers ---
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash)
+
+    def _entry_size(self, content_hash: str) -> int:
+        path = self._entry_dir(content_hash)
+        if not os.path.isdir(path):
+            return 0
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+    def _touch(self, content_hash: str) -> None:
+        try:
+            os.utime(self._entry_dir(content_hash))
+        except OSError:
+            pass
+
+    def _write_atomic(self, content_hash: str, filename: str, data: bytes) -> None:
+        entry_dir = self._entry_dir(content_hash)
+        os.makedirs(entry_dir, exist_ok=True)
+        target = os.path.join(entry_dir, filename)
+        tmp = f"{target}.tmp{os.getpid()}_{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            previous = os.path.getsize(target) if os.path.exists(target) else 0
+            os.replace(tmp, target)
+            self._total_bytes += len(data) - previous
+            self._evict_locked(keep=content_hash)
+
+    def _read(self, content_hash: str, filename: str) -> Optional[bytes]:
+        path = os.path.join(self._entry_dir(content_hash), filename)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Document cache read failed for {path}: {e}")
+            return None
+        self._touch(content_hash)
+        return data
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit: self._hits += 1
+            else: self._misses += 1
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        if self.max_bytes <= 0 or self._total_bytes <= self.max_bytes:
+            return
+        entries: List[Tuple[float, str]] = []
+        for name in os.listdir(self.root):
+            path = self._entry_dir(name)
+            if name != keep and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), name))
+        for _, name in sorted(entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            size = self._entry_size(name)
+            shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+            self._total_bytes -= size
+            logger.info(f"Evicted document cache entry {name} (~{size} bytes)")
+
+    # --- extracted pages ---
+    def get_docs(self, content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        data = self._read(content_hash, DOCS_FILE)
+        self._record(data is not None)
+        return json.loads(data) if data is not None else None
+
+    def put_docs(self, content_hash: str, docs: List[Dict[str, Any]]) -> None:
+        self._write_atomic(content_hash, DOCS_FILE, json.dumps(docs, ensure_ascii=False).encode("utf-8"))
+
+    # --- chunks + embeddings ---
+    def get_index(self, content_hash: str, variant: str) -> Optional[Tuple[List[Dict[str, Any]], List[List[float]]]]:
+        suffix = _variant_suffix(variant)
+        chunk_data = self._read(content_hash, f"chunks_{suffix}.json")
+        vector_data = self._read(content_hash, f"vectors_{suffix}.f32") if chunk_data is not None else None
+        self._record(vector_data is not None)
+        if chunk_data is None or vector_data is None:
+            return None
+        chunks = json.loads(chunk_data)
+        flat = array("f")
+        flat.frombytes(vector_data)
+        if not chunks or len(flat) % len(chunks) != 0:
+            logger.warning(f"Document cache entry {content_hash} has inconsistent vectors; ignoring.")
+            return None
+        dim = len(flat) // len(chunks)
+        vectors = [flat[i * dim:(i + 1) * dim].tolist() for i in range(len(chunks))]
+        return chunks, vectors
+
+    def put_index(self, content_hash: str, variant: str, chunks: List[Dict[str, Any]], vectors: List[List[float]]) -> None:
+        suffix = _variant_suffix(variant)
+        flat = array("f")
+        for v in vectors:
+            flat.extend(v)
+        # Vectors first so a reader never sees chunks without their embeddings
+        self._write_atomic(content_hash, f"vectors_{suffix}.f32", flat.tobytes())
+        self._write_atomic(content_hash, f"chunks_{suffix}.json", json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+
+    # --- clause results ---
+    def get_clauses(self, content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        data = self._read(content_hash, CLAUSES_FILE)
+        self._record(data is not None)
+        return json.loads(data) if data is not None else None
+
+    def put_clauses(self, content_hash: str, clauses: List[Dict[str, Any]]) -> None:
+        self._write_atomic(content_hash, CLAUSES_FILE, json.dumps(clauses, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Optional, List, Dict, Any, Union, Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("uvicorn.error")
+
+_KEY_BYTES = 16
+_INDEX_RECORD = struct.Struct(f"<{_KEY_BYTES}sQ") # (text key, row number)
+
+
+def normalize_text(text: str) -> str:
+    """Normalization used for cache keys: Unicode NFC and collapsed whitespace."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingStore:
+    """
+    Append-only persistent store of embeddings for one model:
+      - vectors.f32  row-major float32 matrix, read through a memory map
+      - index.bin    fixed-size (text-hash, row) records
+      - meta.json    model name and dimension
+    Appends are serialized with an flock so several processes may share the directory.
+    """
+
+    def __init__(self, root: str, model_name: str, max_rows: int):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = os.path.join(root, slug)
+        self.model_name = model_name
+        self.max_rows = max_rows
+        os.makedirs(self.dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.dir, "vectors.f32")
+        self._index_path = os.path.join(self.dir, "index.bin")
+        self._meta_path = os.path.join(self.dir, "meta.json")
+        self._lock_path = os.path.join(self.dir, ".lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._index_offset = 0
+        self._mmap: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self._dim = int(json.load(f)["dim"])
+        self._load_index()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).digest()[:_KEY_BYTES]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _load_index(self) -> None:
+        """Reads index records appended since the last load (including by other processes)."""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        usable = len(data) - len(data) % _INDEX_RECORD.size
+        for key, row in _INDEX_RECORD.iter_unpack(data[:usable]):
+            self._rows[key] = row
+        self._index_offset += usable
+
+    def _matrix(self, min_rows: int) -> Optional[np.memmap]:
+        if self._dim is None or not os.path.exists(self._vectors_path):
+            return None
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            rows = os.path.getsize(self._vectors_path) // (self._dim * 4)
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim)) if rows else None
+        return self._mmap
+
+    def lookup(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Returns cached vectors for whichever keys are present."""
+        with self._lock:
+            found = {k: self._rows[k] for k in keys if k in self._rows}
+            if len(found) < len(keys):
+                self._load_index()
+                found.update({k: self._rows[k] for k in keys if k in self._rows and k not in found})
+            if not found:
+                return {}
+            matrix = self._matrix(max(found.values()) + 1)
+            if matrix is None:
+                return {}
+            return {k: matrix[row].tolist() for k, row in found.items() if row < matrix.shape[0]}
+
+    def append(self, keys: List[bytes], vectors: List[List[float]]) -> None:
+        """Persists new vectors; silently stops growing once max_rows is reached."""
+        if not keys:
+            return
+        arr = np.asarray(vectors, dtype=np.float32)
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._dim is None:
+                    self._dim = arr.shape[1]
+                    with open(self._meta_path, "w") as f:
+                        json.dump({"model": self.model_name, "dim": self._dim}, f)
+                elif arr.shape[1] != self._dim:
+                    logger.warning(f"Embedding dim {arr.shape[1]} does not match cache dim {self._dim}; not caching.")
+                    return
+                start_row = os.path.getsize(self._vectors_path) // (self._dim * 4) if os.path.exists(self._vectors_path) else 0
+                room = self.max_rows - start_row
+                if room <= 0:
+                    return
+                keys, arr = keys[:room], arr[:room]
+                with open(self._vectors_path, "ab") as f:
+                    f.write(arr.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Index records last, so a visible record always points at a complete row
+                with open(self._index_path, "ab") as f:
+                    f.write(b"".join(_INDEX_RECORD.pack(k, start_row + i) for i, k in enumerate(keys)))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._load_index()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with within-batch deduplication, a persistent
+    (model, normalized-text-hash) cache, and batched embedding of cache misses only.
+    """
+
+    def __init__(self, base: Union[Embeddings, Callable[[], Embeddings]], model_name: str, cache_dir: str,
+                 batch_size: int = 64, max_rows: int = 2_000_000):
+        # `base` may be a zero-argument factory so the model is only loaded on first use (or by warm-up)
+        self._base: Optional[Embeddings] = base if isinstance(base, Embeddings) else None
+        self._base_factory = None if isinstance(base, Embeddings) else base
+        self._base_lock = threading.Lock()
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.store = EmbeddingStore(cache_dir, model_name, max_rows)
+        self._stats_lock = threading.Lock()
+        self._requested = 0
+        self._unique = 0
+        self._hits = 0
+        self._embedded = 0
+        self._embed_seconds = 0.0
+
+    @property
+    def base(self) -> Embeddings:
+        if self._base is None:
+            with self._base_lock:
+                if self._base is None:
+                    started = time.perf_counter()
+                    self._base = self._base_factory()
+                    logger.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - started:.2f}s")
+        return self._base
+
+    @property
+    def loaded(self) -> bool:
+        return self._base is not None
+
+    def embed_documents(self, texts: List[str], on_progress: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+        """Embeds texts (cache hits first); `on_progress(done, total)` reports unique texts resolved so far."""
+        keys = [self.store.key(t) for t in texts]
+        # Dedupe identical (normalized) texts within the batch, keeping first occurrence
+        unique: Dict[bytes, str] = {}
+        for k, t in zip(keys, texts):
+            unique.setdefault(k, t)
+
+        cached = self.store.lookup(list(unique))
+        misses = [k for k in unique if k not in cached]
+        if on_progress is not None:
+            on_progress(len(cached), len(unique))
+
+        started = time.perf_counter()
+        fresh: Dict[bytes, List[float]] = {}
+        for i in range(0, len(misses), self.batch_size):
+            batch_keys = misses[i:i + self.batch_size]
+            batch_vectors = self.base.embed_documents([unique[k] for k in batch_keys])
+            fresh.update(zip(batch_keys, batch_vectors))
+            self.store.append(batch_keys, batch_vectors)
+            if on_progress is not None:
+                on_progress(len(cached) + len(fresh), len(unique))
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._requested += len(texts)
+            self._unique += len(unique)
+            self._hits += len(cached)
+            self._embedded += len(misses)
+            self._embed_seconds += elapsed
+        if texts:
+            logger.info(f"Embedded {len(texts)} texts: {len(unique)} unique, {len(cached)} cache hits, {len(misses)} computed in {elapsed:.2f}s")
+
+        vectors = {**cached, **fresh}
+        return [vectors[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one model batch; like `embed_query`, never read from or written to the store."""
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self.base.embed_documents(texts[i:i + self.batch_size]))
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "model_loaded": self.loaded,
+                "batch_size": self.batch_size,
+                "stored_vectors": len(self.store),
+                "texts_requested": self._requested,
+                "unique_texts": self._unique,
+                "cache_hits": self._hits,
+                "hit_rate": round(self._hits / self._unique, 4) if self._unique else 0.0,
+                "chunks_embedded": self._embedded,
+                "embed_chunks_per_sec": round(self._embedded / self._embed_seconds, 2) if self._embed_seconds else 0.0,
+            }
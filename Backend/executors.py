@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class StageOverloaded(Exception):
+    """Raised when a stage's wait queue is full; callers should shed load (HTTP 503)."""
+
+    def __init__(self, stage: str, retry_after: int = 5):
+        super().__init__(f"Stage '{stage}' is at capacity")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageExecutor:
+    """
+    A dedicated worker pool for one blocking pipeline stage (extraction, splitting, embedding, diffing).
+    At most `max_workers` calls run at once; up to `max_queue` more may wait, and anything beyond
+    that is rejected immediately with StageOverloaded instead of piling up on the event loop.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: int = 5):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"stage-{name}")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._active = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn(*args, **kwargs) on this stage's pool, honouring the concurrency and queue limits."""
+        slots = self._semaphore()
+        if slots.locked() and self._waiting >= self.max_queue:
+            self._rejected += 1
+            logger.warning(f"Rejecting work for stage '{self.name}': {self._active} active, {self._waiting} waiting")
+            raise StageOverloaded(self.name, self.retry_after)
+
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        loop = asyncio.get_running_loop()
+
+        def finished(_: Optional[Future] = None) -> None:
+            self._active -= 1
+            self._completed += 1
+            slots.release()
+
+        def finished_threadsafe(future: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(finished, future)
+            except RuntimeError: # Loop already closed (process shutting down)
+                pass
+
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            finished()
+            raise
+        # The slot is freed when the thread is done, not when the caller stops waiting: a cancelled
+        # caller (e.g. a disconnected client) must not let more than max_workers calls run at once
+        future.add_done_callback(finished_threadsafe)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,177 @@
+import re
+import math
+import time
+import logging
+import unicodedata
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple, Callable, Hashable
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from context_assembly import assemble_context
+
+logger = logging.getLogger("uvicorn.error")
+
+# Section numbers ("12.3", "4/2019") kept whole, Latin words, Devanagari words (danda and double danda excluded)
+_TOKEN_RE = re.compile(r"\d+(?:[./:-]\d+)+|[a-z0-9]+|[ऀ-ॣ०-ॿ]+")
+LATIN_PREFIX_CHARS = 6 # Truncation stemming: "terminate" / "termination" / "terminated" -> "termin"
+# Light Hindi stemmer: inflectional suffixes, longest first
+HINDI_SUFFIXES = sorted([
+    "ियों", "ियाँ", "ियां", "ाओं", "ाएं", "ाएँ", "ाने", "ाना", "ाती", "ाता", "ाते",
+    "ों", "ें", "ाँ", "ां", "ीं", "ता", "ती", "ते", "ना", "ने", "नी",
+    "ा", "ी", "े", "ो", "ि", "ु", "ू",
+], key=len, reverse=True)
+STOPWORDS = {
+    # English
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "by", "with", "is", "are", "be", "shall",
+    "this", "that", "any", "all", "as", "at", "it", "its", "from", "what", "which", "who", "how", "when", "will",
+    # Hindi
+    "का", "की", "के", "को", "में", "से", "पर", "और", "या", "है", "हैं", "था", "थे", "यह", "वह", "इस", "उस",
+    "एक", "भी", "तो", "ही", "कि", "जो", "क्या", "कैसे", "कौन", "कब", "होगा", "होगी", "किया", "करेगा", "द्वारा",
+}
+
+
+def _stem(token: str) -> str:
+    if "ऀ" <= token[0] <= "ॿ":
+        for suffix in HINDI_SUFFIXES:
+            if len(token) - len(suffix) >= 2 and token.endswith(suffix):
+                return token[:-len(suffix)]
+        return token
+    if token.isalpha():
+        return token[:LATIN_PREFIX_CHARS]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, lightly stemmed Hindi/English terms with stopwords removed; section numbers stay whole."""
+    text = unicodedata.normalize("NFC", text).lower()
+    return [_stem(t) for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def document_key(doc: Document) -> Hashable:
+    """Identity used to join dense and lexical hits: the chunk_id, else the text itself."""
+    chunk_id = (doc.metadata or {}).get("chunk_id")
+    return chunk_id if chunk_id is not None else doc.page_content
+
+
+class BM25Index:
+    """In-process Okapi BM25 inverted index over a document's chunks (numpy postings per term)."""
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(i)
+                tfs.append(tf)
+        n = len(documents)
+        avg_len = float(lengths.mean()) if n else 0.0
+        # Per-document length normalisation, precomputed once
+        self._norm = k1 * (1.0 - b + b * lengths / avg_len) if avg_len else np.full(n, k1, dtype=np.float32)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {
+            term: (
+                np.asarray(ids, dtype=np.int32),
+                np.asarray(tfs, dtype=np.float32),
+                math.log(1.0 + (n - len(ids) + 0.5) / (len(ids) + 0.5)),
+            )
+            for term, (ids, tfs) in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (position, score) pairs with a positive BM25 score."""
+        if not self.documents:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1.0) / (tfs + self._norm[ids])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def size_bytes(self) -> int:
+        """Approximate resident size of the postings (chunk texts are already counted by the registry)."""
+        return sum(ids.nbytes + tfs.nbytes + len(term) * 4 + 64 for term, (ids, tfs, _) in self._postings.items())
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Merges ranked lists: score(d) = sum over lists of 1 / (k + rank). Highest first."""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (vector store) + lexical (BM25) retrieval merged with reciprocal rank fusion, then assembled
+    (overlaps merged, near-duplicates dropped) and packed to a prompt token budget instead of a fixed k.
+    Drop-in for `vectorstore.as_retriever()`; build one per request.
+    """
+
+    vectorstore: Any
+    lexical_index: Any = None
+    query_vector: Optional[List[float]] = None # Reuse an embedding the caller already computed
+    dense_k: int = 20
+    sparse_k: int = 20
+    rrf_k: int = 60
+    token_budget: int = 3000
+    max_chunks: int = 10
+    estimate_tokens: Callable[[str], int] = lambda text: len(text) // 4 + 1
+
+    def retrieve(self, query: str, query_vector: Optional[List[float]] = None,
+                 dense: Optional[List[Document]] = None) -> Tuple[List[Document], Dict[str, Any]]:
+        """
+        Returns the assembled context documents plus retrieval stats (timings, candidate counts, token savings).
+        `dense` supplies the dense hits directly (e.g. from one batched search for several questions).
+        """
+        started = time.perf_counter()
+        query_vector = query_vector if query_vector is not None else self.query_vector
+        if dense is not None:
+            dense = dense[:self.dense_k]
+        elif query_vector is not None:
+            dense = self.vectorstore.similarity_search_by_vector(query_vector, k=self.dense_k)
+        else:
+            dense = self.vectorstore.similarity_search(query, k=self.dense_k)
+        dense_ms = (time.perf_counter() - started) * 1000
+
+        by_key: Dict[Hashable, Document] = {document_key(d): d for d in dense}
+        rankings = [[document_key(d) for d in dense]]
+        sparse_hits: List[Tuple[int, float]] = []
+        if self.lexical_index is not None and len(self.lexical_index):
+            sparse_hits = self.lexical_index.search(query, self.sparse_k)
+            sparse_docs = [self.lexical_index.documents[i] for i, _ in sparse_hits]
+            for d in sparse_docs:
+                by_key.setdefault(document_key(d), d)
+            rankings.append([document_key(d) for d in sparse_docs])
+        fused = [by_key[key] for key, _ in reciprocal_rank_fusion(rankings, k=self.rrf_k)]
+        context, assembly = assemble_context(fused, self.token_budget, self.max_chunks, self.estimate_tokens)
+        return context, {
+            "dense_hits": len(dense),
+            "sparse_hits": len(sparse_hits),
+            **assembly,
+            "token_budget": self.token_budget,
+            "dense_ms": round(dense_ms, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents, stats = self.retrieve(query)
+        logger.info(f"Hybrid retrieval: {stats}")
+        return documents
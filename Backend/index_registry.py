@@ -0,0 +1,164 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Callable
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rough per-vector cost for all-MiniLM-L6-v2 (384 float32 dims) plus payload/bookkeeping overhead
+DEFAULT_VECTOR_BYTES = 384 * 4
+PER_CHUNK_OVERHEAD_BYTES = 512
+
+
+def estimate_index_bytes(chunk_texts: List[str], vector_bytes: int = DEFAULT_VECTOR_BYTES) -> int:
+    """Approximates the resident size of an in-memory index built from the given chunk texts."""
+    text_bytes = sum(len(t.encode("utf-8")) for t in chunk_texts)
+    return text_bytes + len(chunk_texts) * (vector_bytes + PER_CHUNK_OVERHEAD_BYTES)
+
+
+@dataclass
+class DocumentIndex:
+    """A single uploaded document's vector store (plus page and BM25 indexes) and the bookkeeping the registry needs."""
+    document_id: str
+    source_name: str
+    vectorstore: Any
+    chunk_count: int
+    size_bytes: int
+    content_hash: Optional[str] = None
+    page_index: Any = None
+    lexical_index: Any = None
+    created_at: float = field(default_factory=time.monotonic)
+    last_access: float = field(default_factory=time.monotonic)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class IndexRegistry:
+    """
+    Bounded, thread-safe LRU registry of per-document indexes.
+    Evicts least-recently-used documents when either the document count or the
+    estimated memory budget is exceeded, and drops documents idle longer than the TTL.
+    """
+
+    def __init__(self, max_documents: int, max_bytes: int, idle_ttl_seconds: float,
+                 on_evict: Optional[Callable[[DocumentIndex], None]] = None):
+        self.max_documents = max(1, max_documents)
+        self.on_evict = on_evict # Called (under the registry lock) whenever an index is dropped or replaced
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._entries: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._evictions = {"lru": 0, "ttl": 0, "explicit": 0, "superseded": 0}
+
+    # --- internal helpers (caller holds the lock) ---
+    def _drop(self, document_id: str, reason: str) -> Optional[DocumentIndex]:
+        entry = self._entries.pop(document_id, None)
+        if entry is None:
+            return None
+        self._total_bytes -= entry.size_bytes
+        self._evictions[reason] = self._evictions.get(reason, 0) + 1
+        logger.info(f"Evicted document index {document_id} ({entry.source_name}, reason={reason}, ~{entry.size_bytes} bytes)")
+        self._notify(entry)
+        return entry
+
+    def _notify(self, entry: DocumentIndex) -> None:
+        if self.on_evict is None:
+            return
+        try:
+            self.on_evict(entry)
+        except Exception as e:
+            logger.warning(f"on_evict callback failed for {entry.document_id}: {e}")
+
+    def _expire_idle(self, now: float) -> None:
+        if self.idle_ttl_seconds <= 0:
+            return
+        expired = [doc_id for doc_id, e in self._entries.items() if now - e.last_access > self.idle_ttl_seconds]
+        for doc_id in expired:
+            self._drop(doc_id, "ttl")
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_documents
+            or (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                # Never evict the entry that was just inserted; a single oversized document is still served
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(oldest)
+                continue
+            self._drop(oldest, "lru")
+
+    def _put(self, entry: DocumentIndex) -> None:
+        now = time.monotonic()
+        if entry.document_id in self._entries:
+            replaced = self._entries.pop(entry.document_id)
+            self._total_bytes -= replaced.size_bytes
+            self._notify(replaced)
+        entry.last_access = now
+        self._entries[entry.document_id] = entry
+        self._total_bytes += entry.size_bytes
+        self._expire_idle(now)
+        self._enforce_limits(keep=entry.document_id)
+
+    # --- public API ---
+    def put(self, entry: DocumentIndex) -> None:
+        """Registers (or replaces) a document index and evicts others as needed."""
+        with self._lock:
+            self._put(entry)
+
+    def get(self, document_id: str) -> Optional[DocumentIndex]:
+        """Returns the document index (marking it recently used) or None if unknown/evicted."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire_idle(now)
+            entry = self._entries.get(document_id)
+            if entry is None:
+                return None
+            entry.last_access = now
+            self._entries.move_to_end(document_id)
+            return entry
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[DocumentIndex]:
+        """Returns a live index built from identical upload bytes, if any (marking it recently used)."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire_idle(now)
+            for entry in reversed(self._entries.values()):
+                if entry.content_hash == content_hash:
+                    entry.last_access = now
+                    self._entries.move_to_end(entry.document_id)
+                    return entry
+            return None
+
+    def supersede(self, old_document_id: str, entry: DocumentIndex) -> None:
+        """Registers a new version of a document and drops the version it replaces, atomically."""
+        with self._lock:
+            self._drop(old_document_id, "superseded")
+            self._put(entry)
+
+    def remove(self, document_id: str) -> bool:
+        """Explicitly removes a document index. Returns True if it existed."""
+        with self._lock:
+            return self._drop(document_id, "explicit") is not None
+
+    def sweep(self) -> None:
+        """Drops idle documents; safe to call periodically."""
+        with self._lock:
+            self._expire_idle(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """Aggregate counters for /health and /stats."""
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "chunks": sum(e.chunk_count for e in self._entries.values()),
+                "approx_bytes": self._total_bytes,
+                "max_documents": self.max_documents,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "evictions": dict(self._evictions),
+            }
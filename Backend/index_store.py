@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+
+from langchain_core.embeddings import Embeddings
+
+from quantized_store import QuantizedVectorStore
+
+logger = logging.getLogger("uvicorn.error")
+
+CATALOG_FILE = "catalog.json"
+LOCK_FILE = "writer.lock"
+DOCUMENTS_DIR = "documents"
+STAGING_PREFIX = ".staging-"
+STAGING_MAX_AGE_SECONDS = 60 * 60 # Older staging directories are leftovers of a crashed writer
+
+
+class IndexConflict(Exception):
+    """A commit would replace a document that is no longer in the catalog (deleted or superseded elsewhere)."""
+
+
+def _fsync_tree(path: str) -> None:
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            with open(os.path.join(dirpath, name), "rb") as f:
+                os.fsync(f.fileno())
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp = f"{path}.tmp{os.getpid()}_{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class PersistentIndexStore:
+    """
+    Durable per-document indexes on local disk, shared by every worker process of the server:
+      catalog.json                  document_id -> summary (source, content hash, chunk count, version);
+                                    the one file whose atomic replacement commits or removes a document
+      documents/<document_id>/      immutable snapshot written once, before it enters the catalog:
+          vectors/                  QuantizedVectorStore snapshot (opened read-only via memory maps)
+          pages.json                extracted pages, for rebuilding the page index
+          meta.json                 version bookkeeping (parent id, chunk points)
+          clauses.json              clause results, written when identification finishes
+      writer.lock                   flock serializing writers across processes
+    Readers never lock: they re-read the catalog when its file changes and open snapshots lazily,
+    so a restart only parses the catalog and documents are mapped in on first use.
+    """
+
+    def __init__(self, root: str, embeddings: Embeddings):
+        self.root = root
+        self.embeddings = embeddings
+        self._documents_dir = os.path.join(root, DOCUMENTS_DIR)
+        os.makedirs(self._documents_dir, exist_ok=True)
+        self._catalog_path = os.path.join(root, CATALOG_FILE)
+        self._lock_path = os.path.join(root, LOCK_FILE)
+        self._thread_lock = threading.Lock() # flock is per open file; this orders writers within the process
+        self._catalog: Dict[str, Dict[str, Any]] = {}
+        self._catalog_stat: Optional[Tuple[int, int, int]] = None
+        self._counts = {"opened": 0, "committed": 0, "removed": 0, "reloads": 0}
+        with self._writer():
+            self._collect_garbage()
+        self.refresh()
+
+    # --- internal helpers ---
+    def _document_dir(self, document_id: str) -> str:
+        return os.path.join(self._documents_dir, document_id)
+
+    @contextmanager
+    def _writer(self) -> Iterator[None]:
+        with self._thread_lock, open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_catalog(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._catalog_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_catalog(self, catalog: Dict[str, Dict[str, Any]]) -> None:
+        _write_json_atomic(self._catalog_path, catalog)
+
+    def _collect_garbage(self) -> None:
+        """Removes snapshots missing from the catalog and stale staging directories (caller holds the writer lock)."""
+        catalog = self._read_catalog()
+        now = time.time()
+        for name in os.listdir(self._documents_dir):
+            path = os.path.join(self._documents_dir, name)
+            if name.startswith(STAGING_PREFIX):
+                if now - os.path.getmtime(path) < STAGING_MAX_AGE_SECONDS:
+                    continue # Possibly another worker's snapshot in progress
+            elif name in catalog:
+                continue
+            logger.info(f"Removing orphaned index snapshot {path}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    # --- reads (no locking across processes) ---
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """The current catalog, re-read only when the file was replaced since the last call."""
+        try:
+            st = os.stat(self._catalog_path)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._catalog_stat:
+            catalog = self._read_catalog() if stamp is not None else {}
+            self._catalog, self._catalog_stat = catalog, stamp
+            self._counts["reloads"] += 1
+        return self._catalog
+
+    def contains(self, document_id: str) -> bool:
+        return document_id in self.refresh()
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        """Id of the most recently committed document built from identical upload bytes, if any."""
+        matches = [(e["committed_at"], doc_id) for doc_id, e in self.refresh().items() if e.get("content_hash") == content_hash]
+        return max(matches)[1] if matches else None
+
+    def open(self, document_id: str, mmap: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Loads a committed document: catalog entry, vector store (memory-mapped by default), pages,
+        version bookkeeping and clauses (None if not yet written). None if unknown or removed meanwhile.
+        """
+        entry = self.refresh().get(document_id)
+        if entry is None:
+            return None
+        path = self._document_dir(document_id)
+        try:
+            vectorstore = self.open_vectors(document_id, mmap=mmap)
+            with open(os.path.join(path, "pages.json"), encoding="utf-8") as f:
+                pages = json.load(f)
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"Index snapshot of {document_id} was removed while opening it.")
+            return None
+        try:
+            with open(os.path.join(path, "clauses.json"), encoding="utf-8") as f:
+                clauses = json.load(f)
+        except FileNotFoundError:
+            clauses = None
+        self._counts["opened"] += 1
+        return {"entry": entry, "vectorstore": vectorstore, "pages": pages, "meta": meta, "clauses": clauses}
+
+    def open_vectors(self, document_id: str, mmap: bool = True) -> QuantizedVectorStore:
+        """A committed document's vector store alone (read-only memory maps by default)."""
+        return QuantizedVectorStore.load(os.path.join(self._document_dir(document_id), "vectors"), self.embeddings, mmap=mmap)
+
+    # --- writes (single writer at a time, across processes) ---
+    def commit(self, document_id: str, source_name: str, content_hash: Optional[str], vectorstore: QuantizedVectorStore,
+               pages: List[Dict[str, Any]], meta: Dict[str, Any], clauses: Optional[List[Dict[str, Any]]] = None,
+               replaces: Optional[str] = None) -> None:
+        """
+        Writes a document's snapshot and publishes it by swapping in a new catalog. With `replaces`, the
+        older version leaves the catalog in the same swap; IndexConflict if it is already gone.
+        """
+        staging = tempfile.mkdtemp(dir=self._documents_dir, prefix=STAGING_PREFIX)
+        try:
+            vectorstore.save(os.path.join(staging, "vectors"))
+            _write_json_atomic(os.path.join(staging, "pages.json"), pages)
+            _write_json_atomic(os.path.join(staging, "meta.json"), meta)
+            if clauses is not None:
+                _write_json_atomic(os.path.join(staging, "clauses.json"), clauses)
+            _fsync_tree(staging)
+            with self._writer():
+                catalog = self._read_catalog()
+                if replaces is not None and replaces not in catalog:
+                    raise IndexConflict(f"Document {replaces} is no longer in the index")
+                os.replace(staging, self._document_dir(document_id))
+                catalog.pop(replaces, None)
+                catalog[document_id] = {
+                    "source_name": source_name,
+                    "content_hash": content_hash,
+                    "chunk_count": len(vectorstore),
+                    "version": meta.get("version", 1),
+                    "parent_id": meta.get("parent_id"),
+                    "committed_at": time.time(),
+                }
+                self._write_catalog(catalog)
+                if replaces is not None:
+                    shutil.rmtree(self._document_dir(replaces), ignore_errors=True) # Open memory maps stay valid
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._counts["committed"] += 1
+
+    def put_clauses(self, document_id: str, clauses: List[Dict[str, Any]]) -> None:
+        """Records a document's clause results in its snapshot (no-op if the document is gone)."""
+        with self._writer():
+            if document_id not in self._read_catalog():
+                return
+            _write_json_atomic(os.path.join(self._document_dir(document_id), "clauses.json"), clauses)
+
+    def remove(self, document_id: str) -> bool:
+        """Drops a document from the catalog and deletes its snapshot. Returns True if it existed."""
+        with self._writer():
+            catalog = self._read_catalog()
+            if catalog.pop(document_id, None) is None:
+                return False
+            self._write_catalog(catalog)
+            shutil.rmtree(self._document_dir(document_id), ignore_errors=True)
+        self._counts["removed"] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        catalog = self.refresh()
+        return {
+            "root": self.root,
+            "documents": len(catalog),
+            "chunks": sum(e.get("chunk_count", 0) for e in catalog.values()),
+            **self._counts,
+        }
@@ -0,0 +1,422 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter, deque
+from typing import Optional, List, Dict, Any, Iterator, AsyncIterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from metrics import metrics
+
+logger = logging.getLogger("uvicorn.error")
+
+# ---------------- CONFIG ----------------
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini") # "gemini" or "stub" (deterministic, offline)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-flash-latest")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", 0))
+LLM_STUB_TOKEN_LATENCY_MS = float(os.getenv("LLM_STUB_TOKEN_LATENCY_MS", 0)) # Per streamed token
+# Gateway limits (shared by every LLM call in the process)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 8))
+LLM_RPM = float(os.getenv("LLM_RPM", 300)) # Requests per minute (token bucket); 0 disables
+LLM_BURST = float(os.getenv("LLM_BURST", 0)) or max(1.0, LLM_RPM / 6) # Bucket size; default = 10 s of requests
+LLM_TPM = float(os.getenv("LLM_TPM", 1_000_000)) # Estimated prompt tokens per minute; 0 disables
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", 1.0))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+# Launch a duplicate request when the first is slower than this; <0 = adaptive (recent p95), 0 = never
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", -1))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", 2.0))
+
+
+llm_seconds = metrics.histogram("llm_request_duration_seconds", "Upstream LLM call latency (one attempt; streams until the last token)", ["kind", "outcome"])
+llm_tokens = metrics.counter("llm_tokens", "LLM tokens (provider usage when reported, else estimated)", ["kind", "direction"])
+
+
+def _usage_tokens(message: Any, prompt: str, text: str) -> Dict[str, int]:
+    """Prompt/completion token counts from the provider's usage metadata, falling back to estimates."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "prompt": usage.get("input_tokens") or estimate_tokens(prompt),
+        "completion": usage.get("output_tokens") or estimate_tokens(text),
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token for English; Devanagari is denser, so err high)."""
+    devanagari = len(re.findall(r"[ऀ-ॿ]", text))
+    return (len(text) - devanagari) // 4 + devanagari // 2 + 1
+
+
+# -------------- Stub backend --------------
+_DOC_TEXT_RE = re.compile(r"Document Text:\s*---\s*(.*?)\s*---", re.S)
+_CLAUSE_LIST_RE = re.compile(r"clause types:\s*(.*?)\.\s*\n", re.S)
+_SENTENCE_RE = re.compile(r"[^.!?।]+[.!?।]?")
+_STUB_TOKEN_RE = re.compile(r"\s*\S+")
+_BATCH_QUESTION_RE = re.compile(r"^\s*\[(\d+)\]", re.M)
+
+
+def _stub_clauses(prompt: str) -> str:
+    """Deterministic clause 'extraction': sentences that mention a requested clause type by name."""
+    doc_match = _DOC_TEXT_RE.search(prompt)
+    types_match = _CLAUSE_LIST_RE.search(prompt)
+    if not doc_match or not types_match:
+        return json.dumps({"clauses": []})
+    clause_types = [t.strip() for t in types_match.group(1).split(",") if t.strip()]
+    found = []
+    for clause_type in clause_types:
+        needle = clause_type.lower()[:6] # Stem-ish prefix, so "Termination" matches "terminate"
+        for sentence in _SENTENCE_RE.findall(doc_match.group(1)):
+            if needle in sentence.lower():
+                found.append({"clause_type": clause_type, "extracted_text": sentence.strip()})
+                break
+    return json.dumps({"clauses": found}, ensure_ascii=False)
+
+
+def _stub_answer(prompt: str) -> str:
+    """Deterministic QA 'answer': echoes the first context sentence as a bullet."""
+    context = prompt.split("संदर्भ:", 1)[-1].split("प्रश्न:", 1)[0].strip()
+    first = next((s.strip() for s in _SENTENCE_RE.findall(context) if s.strip()), "")
+    if not first:
+        return "- पर्याप्त जानकारी उपलब्ध नहीं है।"
+    return f"- संदर्भ के अनुसार: {first}"
+
+
+def _stub_batch_answers(prompt: str) -> str:
+    """Deterministic packed multi-question 'answers': the single-question answer, once per numbered question."""
+    head, questions = prompt.split("प्रश्न सूची:", 1)
+    answer = _stub_answer(head)
+    ids = [int(n) for n in _BATCH_QUESTION_RE.findall(questions)]
+    return json.dumps({"answers": [{"id": i, "answer": answer} for i in ids]}, ensure_ascii=False)
+
+
+def stub_respond(prompt: str) -> str:
+    """Routes a rendered prompt to the matching deterministic responder."""
+    if "Document Text:" in prompt:
+        return _stub_clauses(prompt)
+    if "प्रश्न सूची:" in prompt:
+        return _stub_batch_answers(prompt)
+    return _stub_answer(prompt)
+
+
+class StubChatModel(BaseChatModel):
+    """Offline chat model with deterministic output and optional simulated latency, for tests and load tests."""
+
+    latency_ms: float = 0.0 # Before the first token
+    token_latency_ms: float = 0.0 # Between streamed tokens
+
+    @property
+    def _llm_type(self) -> str:
+        return "nyay-stub"
+
+    def _render(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        text = stub_respond(self._render(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        text = stub_respond(self._render(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(_STUB_TOKEN_RE.findall(stub_respond(self._render(messages)))):
+            if i and self.token_latency_ms:
+                time.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(_STUB_TOKEN_RE.findall(stub_respond(self._render(messages)))):
+            if i and self.token_latency_ms:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# -------------- Factory --------------
+def get_chat_model(temperature: float) -> BaseChatModel:
+    """Returns the configured chat model: Gemini in production, the stub when LLM_BACKEND=stub."""
+    if LLM_BACKEND == "stub":
+        return StubChatModel(latency_ms=LLM_STUB_LATENCY_MS, token_latency_ms=LLM_STUB_TOKEN_LATENCY_MS)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        temperature=temperature,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        max_retries=1, # Retries are handled (with jitter and hedging) by the gateway
+    )
+
+
+# -------------- Gateway --------------
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refill up to `capacity`; callers wait for what they take."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, n: float) -> float:
+        """Takes n tokens if available (returns 0), else returns the seconds to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            n = min(n, self.capacity) # An oversized request waits for a full bucket, not forever
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            return (n - self._tokens) / self.rate
+
+    async def acquire(self, n: float = 1.0) -> float:
+        """Waits until n tokens are available; returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self._take(n)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+class CompiledPrompt:
+    """A prompt template (and optional output parser) bound to the gateway once and reused across requests."""
+
+    def __init__(self, gateway: "LLMGateway", prompt: Any, temperature: float, parser: Any = None):
+        self.gateway = gateway
+        self.prompt = prompt
+        self.temperature = temperature
+        self.parser = parser
+
+    def format(self, inputs: Dict[str, Any]) -> str:
+        return self.prompt.format(**inputs)
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> Any:
+        text = await self.gateway.invoke(self.format(inputs), self.temperature)
+        return self.parser.parse(text) if self.parser is not None else text
+
+    def astream(self, inputs: Dict[str, Any]) -> AsyncIterator[str]:
+        return self.gateway.astream(self.format(inputs), self.temperature)
+
+
+class LLMGateway:
+    """
+    Process-wide entry point for LLM calls. Keeps one long-lived client per temperature, admits calls
+    through request and prompt-token buckets plus a max-in-flight limit, retries with jittered
+    exponential backoff, hedges slow calls with a duplicate request, and coalesces identical
+    in-flight prompts into one upstream call.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, rpm: float = LLM_RPM, burst: float = LLM_BURST,
+                 tpm: float = LLM_TPM, retries: int = LLM_RETRIES, backoff_seconds: float = LLM_BACKOFF_SECONDS,
+                 timeout_seconds: float = LLM_TIMEOUT_SECONDS, hedge_after_seconds: float = LLM_HEDGE_AFTER_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self._request_bucket = TokenBucket(rpm / 60.0, burst) if rpm > 0 else None
+        self._token_bucket = TokenBucket(tpm / 60.0, tpm / 6.0) if tpm > 0 else None
+        self._clients: Dict[float, BaseChatModel] = {}
+        self._clients_lock = threading.Lock()
+        self._chains: Dict[str, CompiledPrompt] = {}
+        self._latencies: deque = deque(maxlen=256)
+        self._counts: Counter = Counter()
+        self._rate_wait_seconds = 0.0
+        self._in_flight = 0
+        # asyncio primitives are bound to the loop they were created on
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[bytes, List[Any]] = {} # prompt key -> [task, waiter count]
+
+    # --- clients and chains ---
+    def client(self, temperature: float) -> BaseChatModel:
+        """The pooled chat model for a temperature (created once, reused for every call)."""
+        with self._clients_lock:
+            model = self._clients.get(temperature)
+            if model is None:
+                model = self._clients[temperature] = get_chat_model(temperature)
+            return model
+
+    def compile(self, name: str, prompt: Any, temperature: float, parser: Any = None) -> CompiledPrompt:
+        """Registers (once) and returns a named prompt/parser pair bound to this gateway."""
+        chain = self._chains.get(name)
+        if chain is None:
+            chain = self._chains[name] = CompiledPrompt(self, prompt, temperature, parser)
+        return chain
+
+    # --- admission ---
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._pending = {}
+
+    async def _admit(self, prompt: str) -> None:
+        waited = 0.0
+        if self._request_bucket is not None:
+            waited += await self._request_bucket.acquire(1)
+        if self._token_bucket is not None:
+            waited += await self._token_bucket.acquire(estimate_tokens(prompt))
+        if waited:
+            self._counts["rate_limited"] += 1
+            self._rate_wait_seconds += waited
+
+    # --- single attempt, hedging, retries ---
+    async def _attempt(self, prompt: str, temperature: float) -> str:
+        await self._admit(prompt)
+        async with self._slots:
+            self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                message = await asyncio.wait_for(self.client(temperature).ainvoke(prompt), self.timeout_seconds)
+            except BaseException as e:
+                llm_seconds.observe(time.perf_counter() - started, kind="invoke", outcome="cancelled" if isinstance(e, asyncio.CancelledError) else "error")
+                raise
+            finally:
+                self._in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self._latencies.append(elapsed)
+            self._counts["upstream_calls"] += 1
+            text = message.content if isinstance(message.content, str) else str(message.content)
+            llm_seconds.observe(elapsed, kind="invoke", outcome="ok")
+            for direction, n in _usage_tokens(message, prompt, text).items():
+                llm_tokens.inc(n, kind="invoke", direction=direction)
+            return text
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_after_seconds > 0:
+            return self.hedge_after_seconds
+        if self.hedge_after_seconds == 0 or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(LLM_HEDGE_MIN_SECONDS, ordered[int(0.95 * (len(ordered) - 1))])
+
+    async def _hedged(self, prompt: str, temperature: float) -> str:
+        primary = asyncio.ensure_future(self._attempt(prompt, temperature))
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._counts["hedges"] += 1
+                hedge = asyncio.ensure_future(self._attempt(prompt, temperature))
+                tasks.add(hedge)
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    winner = done.pop()
+                    if winner.exception() is None or not tasks:
+                        if winner is hedge and winner.exception() is None:
+                            self._counts["hedge_wins"] += 1
+                        return winner.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _call(self, prompt: str, temperature: float) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._hedged(prompt, temperature)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    self._counts["failures"] += 1
+                    raise
+                self._counts["retries"] += 1
+                delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+                logger.info(f"LLM call attempt {attempt + 1} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    # --- public API ---
+    async def invoke(self, prompt: str, temperature: float = 0.2) -> str:
+        """Returns the model's text for a prompt. Identical concurrent prompts share one upstream call."""
+        self._bind_loop()
+        self._counts["requests"] += 1
+        key = hashlib.blake2b(f"{temperature}\x00{prompt}".encode("utf-8"), digest_size=16).digest()
+        entry = self._pending.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._call(prompt, temperature))
+            entry = self._pending[key] = [task, 0]
+            task.add_done_callback(lambda _t, k=key: self._pending.pop(k, None))
+        else:
+            self._counts["coalesced"] += 1
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            # Cancel the shared call only when nobody is waiting for it any more
+            entry[1] -= 1
+            if entry[1] == 0:
+                entry[0].cancel()
+            raise
+
+    async def astream(self, prompt: str, temperature: float = 0.2) -> AsyncIterator[str]:
+        """Streams the model's text for a prompt (rate limited and counted in-flight; never hedged or shared)."""
+        self._bind_loop()
+        self._counts["streams"] += 1
+        await self._admit(prompt)
+        async with self._slots:
+            self._in_flight += 1
+            stream = self.client(temperature).astream(prompt)
+            started = time.perf_counter()
+            outcome = "cancelled" # Until the stream is exhausted; also covers consumers that stop early
+            parts: List[str] = []
+            try:
+                async for chunk in stream:
+                    text = chunk.content if isinstance(chunk.content, str) else ""
+                    if text:
+                        parts.append(text)
+                        yield text
+                outcome = "ok"
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                self._in_flight -= 1
+                await stream.aclose()
+                llm_seconds.observe(time.perf_counter() - started, kind="stream", outcome=outcome)
+                llm_tokens.inc(estimate_tokens(prompt), kind="stream", direction="prompt")
+                llm_tokens.inc(estimate_tokens("".join(parts)), kind="stream", direction="completion")
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies)
+        pct = lambda q: round(ordered[int(q * (len(ordered) - 1))] * 1000, 1) if ordered else None
+        return {
+            "backend": LLM_BACKEND,
+            "clients": len(self._clients),
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rate_wait_seconds": round(self._rate_wait_seconds, 3),
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+            "hedge_after_seconds": self._hedge_delay(),
+            **{k: self._counts.get(k, 0) for k in ("requests", "upstream_calls", "coalesced", "retries", "hedges", "hedge_wins", "failures", "rate_limited", "streams")},
+        }
+
+
+# Shared by every route and background task in the process
+gateway = LLMGateway()
@@ -1,65 +1,173 @@
 import os
+import sys
+import time
 import uuid
+import asyncio
 import pathlib
 import logging
 import re
-import difflib # For comparison
-import shutil # For file operations like copyfileobj
-import aiofiles # For async file writing
-from typing import Optional, List, Dict, Any
-
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import json
+import math
+import functools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, Tuple, Deque, Callable
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-import nltk
-
 # Langchain and related imports
-from langchain_unstructured import UnstructuredLoader # Use the newer loader
+# Heavy optional modules (Unstructured / PyPDF / PDFMiner loaders, Qdrant, sentence-transformers,
+# NLTK) are imported where they are used and preloaded by the startup warm-up,
+# so importing this module (and binding the socket) stays fast.
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-# from langchain_community.document_loaders import UnstructuredFileLoader
-# --- Loaders based on requirements.txt ---
-from langchain.document_loaders import PyPDFLoader # requires pypdf
-from langchain.document_loaders import PDFMinerLoader # requires pdfminer.six
-# --- Vector Store and Embeddings ---
-from langchain_community.vectorstores import Qdrant
-from langchain_community.embeddings import HuggingFaceEmbeddings
 # --- LLM and Chains ---
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.schema import Document
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.pydantic_v1 import BaseModel as LangchainBaseModel, Field
-# --- OCR Imports ---
-from pdf2image import convert_from_path # requires pdf2image
-import pytesseract # requires pytesseract
+# --- OCR (parallel, page-windowed; requires pdf2image + pytesseract) ---
+
+from index_registry import IndexRegistry, DocumentIndex, estimate_index_bytes, DEFAULT_VECTOR_BYTES
+from doc_cache import DocumentCache
+from executors import StageExecutor, StageOverloaded
+from embedding_cache import CachedEmbeddings
+from llm_gateway import gateway, estimate_tokens, LLM_BACKEND
+from clause_classifier import ClausePreClassifier
+from page_index import PageIndex, normalize as normalize_text_for_match
+import compare_engine # Segment-level anchor diff for /compare/
+import chunk_diff # Chunk matching between document versions (incremental re-indexing)
+from answer_cache import SemanticAnswerCache
+from hybrid_retrieval import BM25Index, HybridRetriever, document_key
+from quantized_store import QuantizedVectorStore
+from index_store import PersistentIndexStore, IndexConflict
+from startup import Readiness, ensure_nltk_data, preload_modules
+from upload_jobs import UploadJob, JobQueue
+from metrics import metrics, span, cache_lookups, flatten_stats, RequestMetricsMiddleware
+from upload_spool import SpooledUpload, MemoryBudget, UploadTooLarge, MalformedUpload, UploadSizeLimitMiddleware, receive_files
 
 # ---------------- CONFIG ----------------
 load_dotenv()
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE_BYTES", 8 * 1024 * 1024))
 TMP_DIR = "/tmp"  # Spaces-safe temporary directory
 NLTK_DATA_DIR = os.path.join(TMP_DIR, "nltk_data")
 os.makedirs(TMP_DIR, exist_ok=True)
 os.makedirs(NLTK_DATA_DIR, exist_ok=True)
 
-# NLTK setup (Ensure punkt and averaged_perceptron_tagger are downloaded)
-nltk.data.path.append(NLTK_DATA_DIR)
-try:
-    # Attempt to download NLTK data if not present (quiet mode)
-    nltk.download("punkt", download_dir=NLTK_DATA_DIR, quiet=True)
-    nltk.download("averaged_perceptron_tagger", download_dir=NLTK_DATA_DIR, quiet=True)
-except Exception as e:
-    # Log warning if download fails (might work if already present)
-    print(f"NLTK download warning: {e}")
+# Per-document index registry limits (LRU by count and approximate memory, plus idle TTL)
+MAX_INDEXED_DOCUMENTS = int(os.getenv("MAX_INDEXED_DOCUMENTS", 500))
+MAX_INDEX_MEMORY_BYTES = int(os.getenv("MAX_INDEX_MEMORY_BYTES", 2 * 1024 * 1024 * 1024))
+INDEX_IDLE_TTL_SECONDS = float(os.getenv("INDEX_IDLE_TTL_SECONDS", 2 * 60 * 60))
+MIN_TEXT_LAYER_CHARS = int(os.getenv("MIN_TEXT_LAYER_CHARS", 25)) # Below this a PDF page is treated as scanned
+QDRANT_UPSERT_BATCH = int(os.getenv("QDRANT_UPSERT_BATCH", 256))
+# Upload spooling: files up to SPOOL_MEMORY_BYTES stay in memory (while all in-memory uploads together fit
+# SPOOL_MEMORY_TOTAL_BYTES) and larger ones spill to TMP_DIR; bigger than MAX_UPLOAD_BYTES is a 413 (0 = no limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+SPOOL_MEMORY_BYTES = int(os.getenv("SPOOL_MEMORY_BYTES", 8 * 1024 * 1024))
+SPOOL_MEMORY_TOTAL_BYTES = int(os.getenv("SPOOL_MEMORY_TOTAL_BYTES", 256 * 1024 * 1024))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024 # Headers and boundaries around the file parts of a request
+# Durable index: with INDEX_DIR set, every indexed document is committed there as a snapshot that all worker
+# processes open read-only (memory-mapped) on first use, so documents survive restarts and any worker can serve
+# them. Requires the quantized backend, which becomes the default
+INDEX_DIR = os.getenv("INDEX_DIR", "")
+# Per-document vector store: "qdrant" (in-memory Qdrant, float32) or "quantized" (in-process NumPy arrays).
+# Quantized storage is "int8" (~4x smaller) or "float16"; re-scoring ranks k * oversample candidates against
+# float32 copies of the vectors, which it keeps in memory (0 disables it and keeps only the compact codes)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "quantized" if INDEX_DIR else "qdrant")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+VECTOR_RESCORE_OVERSAMPLE = int(os.getenv("VECTOR_RESCORE_OVERSAMPLE", 0))
+
+# Content-addressed cache of extraction/chunk/embedding/clause results, keyed by upload SHA-256
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", os.path.join(TMP_DIR, "doc_cache"))
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Persistent chunk-embedding cache (memory-mapped float32 rows keyed by model + normalized text hash)
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(TMP_DIR, "embedding_cache"))
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", 2_000_000))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+
+# Map-reduce clause identification: window size, overlap for split pages, LLM fan-out per upload and
+# re-asks on unparseable output (transport retries, rate limits and hedging live in llm_gateway)
+CLAUSE_WINDOW_TOKENS = int(os.getenv("CLAUSE_WINDOW_TOKENS", 6000))
+CLAUSE_WINDOW_OVERLAP_CHARS = int(os.getenv("CLAUSE_WINDOW_OVERLAP_CHARS", 400))
+CLAUSE_LLM_CONCURRENCY = int(os.getenv("CLAUSE_LLM_CONCURRENCY", 4))
+CLAUSE_LLM_RETRIES = int(os.getenv("CLAUSE_LLM_RETRIES", 2))
+# Upload pipeline: pages per split+embed batch started while extraction (OCR) is still running,
+# and the longest GET /documents/{id}/clauses?wait= may block
+INDEX_PIPELINE_PAGES = int(os.getenv("INDEX_PIPELINE_PAGES", 8))
+CLAUSE_WAIT_MAX_SECONDS = float(os.getenv("CLAUSE_WAIT_MAX_SECONDS", 60))
+# Local pre-classification: "full" (whole text to LLM), "prefilter" (top candidates to LLM) or "local" (no LLM)
+CLAUSE_MODE = os.getenv("CLAUSE_MODE", "prefilter")
+CLAUSE_CANDIDATES_PER_TYPE = int(os.getenv("CLAUSE_CANDIDATES_PER_TYPE", 3))
+CLAUSE_MIN_SCORE = float(os.getenv("CLAUSE_MIN_SCORE", 0.35))
+CLAUSE_KEYWORD_WEIGHT = float(os.getenv("CLAUSE_KEYWORD_WEIGHT", 0.6))
+
+# Dedicated pools for blocking pipeline stages: (workers, max waiting calls before shedding load)
+_CORES = os.cpu_count() or 1
+STAGE_LIMITS = {
+    "extract": (int(os.getenv("EXTRACT_WORKERS", _CORES)), int(os.getenv("EXTRACT_MAX_QUEUE", 32))),
+    "split": (int(os.getenv("SPLIT_WORKERS", 2)), int(os.getenv("SPLIT_MAX_QUEUE", 64))),
+    "embed": (int(os.getenv("EMBED_WORKERS", 1)), int(os.getenv("EMBED_MAX_QUEUE", 32))),
+    "diff": (int(os.getenv("DIFF_WORKERS", 2)), int(os.getenv("DIFF_MAX_QUEUE", 16))),
+    "query": (int(os.getenv("QUERY_EMBED_WORKERS", 2)), int(os.getenv("QUERY_EMBED_MAX_QUEUE", 64))),
+}
+
+# Semantic /ask/ answer cache: reuse an answer when a new question embeds within this cosine similarity
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 60 * 60))
+ANSWER_CACHE_MAX_PER_DOCUMENT = int(os.getenv("ANSWER_CACHE_MAX_PER_DOCUMENT", 128))
+
+# Hybrid retrieval for /ask/: dense + BM25 candidates fused by reciprocal rank, packed to a token budget
+RETRIEVAL_DENSE_K = int(os.getenv("RETRIEVAL_DENSE_K", 20))
+RETRIEVAL_SPARSE_K = int(os.getenv("RETRIEVAL_SPARSE_K", 20))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", 10))
+# POST /ask/batch: questions per request, generation calls in flight per request, and packing of questions
+# into one multi-answer prompt while their combined context fits the token budget (0 disables packing)
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", 32))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", 4))
+ASK_BATCH_PACK_TOKENS = int(os.getenv("ASK_BATCH_PACK_TOKENS", 3000))
+ASK_BATCH_PACK_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_PACK_MAX_QUESTIONS", 6))
+
+# Background uploads (POST /upload/?wait=false): job workers, waiting jobs before 503, how long results stay pollable
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", 2))
+UPLOAD_JOB_MAX_QUEUE = int(os.getenv("UPLOAD_JOB_MAX_QUEUE", 64))
+UPLOAD_JOB_RETENTION_SECONDS = float(os.getenv("UPLOAD_JOB_RETENTION_SECONDS", 60 * 60))
+
+# Startup: models and heavy modules load in a background warm-up task; /ready reports when it is done
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+# NLTK data (punkt, averaged_perceptron_tagger) is looked up locally first; download only if missing and allowed
+NLTK_AUTO_DOWNLOAD = os.getenv("NLTK_AUTO_DOWNLOAD", "1") == "1"
+PRELOAD_MODULES = ([] if VECTOR_BACKEND == "quantized" else [
+    "qdrant_client",
+    "langchain_community.vectorstores",
+]) + [
+    "langchain_unstructured",
+    "langchain_community.document_loaders",
+    "pypdf",
+    "ocr", # pdf2image + pytesseract
+] + ([] if LLM_BACKEND == "stub" else ["langchain_google_genai"])
 
 # Logging Configuration
 logger = logging.getLogger("uvicorn.error") # Use uvicorn's logger for consistency
 logging.basicConfig(level=logging.INFO)
 
 # -------------- FastAPI App Setup --------------
-app = FastAPI(title="Nyay-Saarthi (Hindi Legal QA)")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    """Kicks off the background warm-up once the server is up; stops the worker pools on shutdown."""
+    _start_warm_up()
+    try:
+        yield
+    finally:
+        _shutdown_workers()
+
+app = FastAPI(title="Nyay-Saarthi (Hindi Legal QA)", lifespan=_lifespan)
 
 # CORS Middleware Configuration (Allow all for development, restrict in production)
 app.add_middleware(
@@ -69,25 +177,112 @@ app.add_middleware(
     allow_methods=["*"], # Allows all standard methods
     allow_headers=["*"], # Allows all headers
 )
+# Request counts, latency and in-flight gauge for /metrics (plus slow-request span dumps)
+app.add_middleware(RequestMetricsMiddleware)
+# Oversized uploads are refused from Content-Length, before the body is received
+if MAX_UPLOAD_BYTES > 0:
+    app.add_middleware(UploadSizeLimitMiddleware, limits={
+        "/upload": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+        "/compare": 2 * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    })
+
+# Blocking CPU work is dispatched to these pools so the event loop (and /health) stays responsive
+stages: Dict[str, StageExecutor] = {
+    name: StageExecutor(name, max_workers=workers, max_queue=max_queue)
+    for name, (workers, max_queue) in STAGE_LIMITS.items()
+}
+
+@app.exception_handler(StageOverloaded)
+async def _stage_overloaded_handler(request: Request, exc: StageOverloaded):
+    """Sheds load with 503 + Retry-After instead of queueing without bound."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.stage}); please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(UploadTooLarge)
+async def _upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"detail": f"File too large (limit {exc.limit} bytes)."})
+
+def _shutdown_workers():
+    """Stops background worker pools so the process exits cleanly."""
+    upload_jobs.shutdown()
+    if "ocr" in sys.modules: # Only imported once a scanned page needed OCR
+        sys.modules["ocr"].shutdown_pool()
+    for stage in stages.values():
+        stage.shutdown()
 
 # -------------- Globals --------------
-vectorstore: Optional[Qdrant] = None # Global variable to hold the vector store
-# Initialize embeddings (using a popular sentence transformer model)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# Cached /ask/ answers per document (invalidated whenever the document's index goes away)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_per_document=ANSWER_CACHE_MAX_PER_DOCUMENT,
+    max_documents=MAX_INDEXED_DOCUMENTS,
+)
+# Registry of per-document vector stores (one in-memory Qdrant collection or quantized store per upload)
+registry = IndexRegistry(
+    max_documents=MAX_INDEXED_DOCUMENTS,
+    max_bytes=MAX_INDEX_MEMORY_BYTES,
+    idle_ttl_seconds=INDEX_IDLE_TTL_SECONDS,
+    on_evict=lambda entry: answer_cache.invalidate(entry.document_id),
+)
+# Background upload jobs, polled via GET /jobs/{id}
+upload_jobs = JobQueue(
+    workers=UPLOAD_JOB_WORKERS,
+    max_queue=UPLOAD_JOB_MAX_QUEUE,
+    retention_seconds=UPLOAD_JOB_RETENTION_SECONDS,
+)
+# Pipeline metrics exposed on /metrics (stage timings go through metrics.span)
+extraction_strategy = metrics.counter("extraction_strategy", "Extracted documents by the strategy that produced their text", ["strategy"])
+extracted_pages = metrics.counter("extracted_pages", "Extracted pages by per-page strategy", ["strategy"])
+reindexed_chunks = metrics.counter("reindexed_chunks", "Chunks of new document versions by outcome (reused/embedded/deleted)", ["outcome"])
+ask_batch_prompts = metrics.counter("ask_batch_prompts", "/ask/batch generation calls by kind (single, packed, fallback)", ["kind"])
+upload_chunks = metrics.histogram("upload_chunks", "Chunks indexed per upload", buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+
+def _load_embedding_model():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+# Initialize embeddings (using a popular sentence transformer model), deduplicated and cached on disk.
+# The model itself is loaded lazily: by the startup warm-up, or by the first request that needs it.
+embeddings = CachedEmbeddings(
+    _load_embedding_model,
+    model_name=EMBEDDING_MODEL_NAME,
+    cache_dir=EMBED_CACHE_DIR,
+    batch_size=EMBED_BATCH_SIZE,
+    max_rows=EMBED_CACHE_MAX_ROWS,
+)
+
+# On-disk snapshots of indexed documents, shared by all workers (None: indexes live only in this process)
+persistent_index: Optional[PersistentIndexStore] = None
+if INDEX_DIR and VECTOR_BACKEND != "quantized":
+    logger.warning(f"INDEX_DIR is set but VECTOR_BACKEND={VECTOR_BACKEND}; only quantized indexes can be persisted, so indexes stay in memory.")
+elif INDEX_DIR:
+    persistent_index = PersistentIndexStore(INDEX_DIR, embeddings)
+    logger.info(f"Persistent index at {INDEX_DIR}: {persistent_index.stats()['documents']} documents available (opened on first use).")
 
 # --- Initialize text splitter (BEST POSSIBLE CHANGE APPLIED HERE) ---
 # Using smaller chunks and more overlap to potentially isolate facts better
-splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
+splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150, add_start_index=True)
 logger.info(f"Initialized splitter with chunk_size={splitter._chunk_size} and chunk_overlap={splitter._chunk_overlap}")
 # --- END SPLITTER CHANGE ---
 
-# Stats for monitoring/debugging
-INDEX_STATS = {"files": 0, "chunks": 0}
+# Cached chunks/embeddings are only valid for the splitter + model that produced them
+INDEX_VARIANT = f"{EMBEDDING_MODEL_NAME}|{splitter._chunk_size}|{splitter._chunk_overlap}|spans"
+doc_cache = DocumentCache(DOC_CACHE_DIR, DOC_CACHE_MAX_BYTES)
 
 # -------------- Pydantic Models --------------
 class Query(BaseModel):
     """Request model for asking questions."""
     question: str
+    document_id: str
+
+class BatchQuery(BaseModel):
+    """Request model for asking several questions about one document."""
+    questions: List[str]
+    document_id: str
 
 # --- Clause Library and Pydantic Models for Clause Identification ---
 CLAUSE_LIBRARY = {
@@ -137,11 +332,37 @@ class ClauseList(LangchainBaseModel):
 # Pydantic model for the final /upload response structure (using standard BaseModel)
 class UploadResponse(BaseModel):
     message: str
+    document_id: Optional[str] = None
     chunks_added: int
     identified_clauses: List[Dict[str, Any]] = [] # Holds final clause info + explanation
+    clauses_status: str = "done" # "pending" while deferred identification is still running, or "failed"
+    clauses_url: Optional[str] = None # GET here for the clauses of an indexed document
+    parent_id: Optional[str] = None # Set for a new version of an earlier upload (?parent_id=)
+    version: int = 1
+    reindex: Optional[Dict[str, int]] = None # Chunks reused / moved / embedded / deleted for a new version
 
 # Output parser for structured clause identification
 clause_parser = PydanticOutputParser(pydantic_object=ClauseList)
+# Local keyword + embedding scorer that narrows what the clause LLM has to read
+clause_classifier = ClausePreClassifier(embeddings, CLAUSE_LIBRARY, keyword_weight=CLAUSE_KEYWORD_WEIGHT)
+
+# -------------- Startup warm-up --------------
+# /ready turns 200 once the embedding model is loaded; /health answers as soon as the socket is bound
+readiness = Readiness(required=["embeddings"] if WARMUP_ON_STARTUP else [])
+_warmup_future: Optional[asyncio.Future] = None
+
+def _warm_up():
+    """Loads models and heavy modules off the event loop so startup never waits on them."""
+    readiness.run("embeddings", lambda: len(embeddings.embed_query("warm-up")))
+    readiness.run("clause_library", lambda: clause_classifier.score(["warm-up"]).shape[1])
+    readiness.run("modules", lambda: preload_modules(PRELOAD_MODULES))
+    readiness.run("llm_clients", lambda: [type(gateway.client(t)).__name__ for t in (0.1, 0.2)])
+    readiness.run("nltk", lambda: ensure_nltk_data(NLTK_DATA_DIR, allow_download=NLTK_AUTO_DOWNLOAD))
+
+def _start_warm_up():
+    global _warmup_future
+    if WARMUP_ON_STARTUP:
+        _warmup_future = asyncio.get_running_loop().run_in_executor(None, _warm_up)
 # --- END Clause Library and Pydantic Models ---
 
 
@@ -165,34 +386,163 @@ def _clean_text(s: str) -> str:
     s = _NON_PRINTABLE_RE.sub(" ", s)
     return re.sub(r"\s+", " ", s).strip()
 
-async def _extract_docs(tmp_path: str, source_name: str) -> List[Document]:
+def _read_text_layer(upload: SpooledUpload) -> List[Dict[str, Any]]:
+    """
+    Reads each PDF page's embedded text layer with pypdf (cheap, no rendering; straight from
+    memory for in-memory uploads) and classifies the page: 'text_layer' if it carries enough
+    readable text, otherwise 'ocr'.
+    """
+    with upload.open() as stream:
+        return _classify_pages(stream)
+
+def _classify_pages(stream: Any) -> List[Dict[str, Any]]:
+    from pypdf import PdfReader # Imported on first use, not at startup
+    reader = PdfReader(stream)
+    pages: List[Dict[str, Any]] = []
+    for i, page in enumerate(reader.pages):
+        started = time.perf_counter()
+        try:
+            raw = page.extract_text() or ""
+        except Exception as e:
+            logger.warning(f"Text layer read failed on page {i + 1}: {e}")
+            raw = ""
+        text = "" if _looks_binary(raw) else _clean_text(raw)
+        pages.append({
+            "page_number": i + 1,
+            "text": text,
+            "strategy": "text_layer" if len(text) >= MIN_TEXT_LAYER_CHARS else "ocr",
+            "extraction_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+    return pages
+
+def _page_document(page: Dict[str, Any], source_name: str) -> Document:
+    return Document(page_content=page["text"], metadata={
+        "source": source_name,
+        "page_number": page["page_number"],
+        "extraction_strategy": page["strategy"],
+        "extraction_ms": page["extraction_ms"],
+    })
+
+async def _extract_pdf_hybrid(upload: SpooledUpload, source_name: str, error_log: List[str], job: Optional[UploadJob] = None,
+                              on_page: Optional[Callable[[Document], None]] = None) -> List[Document]:
+    """
+    Per-page hybrid PDF extraction: pages with a usable text layer are taken as-is,
+    and only the remaining (scanned/image-only) pages are sent to OCR.
+    Each resulting Document records its strategy and timing in metadata.
+    `on_page` receives each non-empty page as soon as its text is known (text layer first, then OCR windows).
+    """
+    try:
+        with span("extract.text_layer"):
+            pages = await stages["extract"].run(_read_text_layer, upload)
+    except StageOverloaded:
+        raise
+    except Exception as e:
+        logger.warning(f"Text layer classification failed for {source_name}: {e}")
+        error_log.append(f"TextLayer: {e}")
+        return []
+
+    ocr_targets = [p["page_number"] for p in pages if p["strategy"] == "ocr"]
+    if job is not None:
+        job.update("extract", pages_total=len(pages), text_layer_pages=len(pages) - len(ocr_targets), ocr_pages_total=len(ocr_targets), ocr_pages_done=0)
+    if on_page is not None:
+        for p in pages:
+            if p["strategy"] == "text_layer":
+                on_page(_page_document(p, source_name))
+    if ocr_targets:
+        logger.info(f"{source_name}: {len(pages) - len(ocr_targets)} pages via text layer, OCR for {len(ocr_targets)} pages")
+        started = time.perf_counter()
+        try:
+            from ocr import ocr_pages # pdf2image/pytesseract load only when a page needs OCR
+            with span("extract.ocr"):
+                # The OCR workers rasterize from a file: in-memory uploads are written out only now
+                pdf_path = await asyncio.get_running_loop().run_in_executor(None, upload.path)
+                ocr_result = await ocr_pages(pdf_path, ocr_targets, source_name, _ocr_window_callback(job, source_name, on_page))
+            error_log.extend(ocr_result["errors"])
+            ocr_text = dict(ocr_result["pages"])
+        except Exception as e:
+            logger.warning(f"OCR of image-only pages failed for {source_name}: {e}")
+            error_log.append(f"OCR General: {e}")
+            ocr_text = {}
+        # Pages are OCR'd in parallel, so attribute the wall time evenly across them
+        per_page_ms = round((time.perf_counter() - started) * 1000 / len(ocr_targets), 2)
+        for p in pages:
+            if p["strategy"] == "ocr":
+                p["text"] = _clean_text(ocr_text.get(p["page_number"], ""))
+                p["extraction_ms"] += per_page_ms
+
+    return [_page_document(p, source_name) for p in pages if p["text"]]
+
+def _ocr_window_callback(job: Optional[UploadJob], source_name: str,
+                         on_page: Optional[Callable[[Document], None]] = None) -> Optional[Callable[[List[Tuple[int, str, Optional[str]]]], None]]:
+    """Per-window OCR callback: advances the job's 'extract' progress and hands finished pages to on_page."""
+    if job is None and on_page is None:
+        return None
+    def on_window(results: List[Tuple[int, str, Optional[str]]]) -> None:
+        if job is not None:
+            job.advance("extract", "ocr_pages_done", len(results))
+        if on_page is not None:
+            for page_number, text, error in results:
+                text = "" if error else _clean_text(text)
+                if text:
+                    on_page(_page_document({"page_number": page_number, "text": text, "strategy": "ocr", "extraction_ms": 0.0}, source_name))
+    return on_window
+
+async def _extract_docs(upload: SpooledUpload, source_name: str, job: Optional[UploadJob] = None,
+                        on_page: Optional[Callable[[Document], None]] = None) -> List[Document]:
     """
     Robustly extracts text from a file using multiple strategies:
+    0. PDFs: per-page hybrid (text layer where present, OCR only for empty pages)
     1. UnstructuredLoader
     2. PyPDFLoader
     3. PDFMinerLoader
-    4. OCR
+    4. OCR of the whole PDF
+    Only the per-page fast path reports pages early through `on_page`.
     """
     docs: List[Document] = []
     error_log = []
+    strategy = None # Which strategy produced the text (for the extraction_strategy metric)
+
+    is_pdf = source_name.lower().endswith(".pdf") or upload.kind == "pdf" # Type was sniffed while receiving
+
+    # 0) Fast path for PDFs
+    if is_pdf:
+        docs = await _extract_pdf_hybrid(upload, source_name, error_log, job, on_page)
+        if docs:
+            strategy = "hybrid"
+            logger.info(f"Extracted content using per-page hybrid extraction for {source_name}")
 
     # 1) Try UnstructuredLoader
-    try:
-        loader = UnstructuredLoader(file_path=tmp_path, languages=["hin", "eng"])
-        docs = await loader.aload()
-        if docs: logger.info(f"Extracted content using UnstructuredLoader for {source_name}")
-    except Exception as e:
-        logger.warning(f"UnstructuredLoader failed for {source_name}: {e}")
-        error_log.append(f"Unstructured: {e}")
-        docs = []
+    if not docs:
+        try:
+            from langchain_unstructured import UnstructuredLoader # Use the newer loader
+            if upload.in_memory: # Partitions straight from the buffer
+                loader = UnstructuredLoader(file=upload.open(), metadata_filename=source_name, languages=["hin", "eng"])
+            else:
+                loader = UnstructuredLoader(file_path=upload.path(), languages=["hin", "eng"])
+            with span("extract.unstructured"):
+                docs = await stages["extract"].run(loader.load)
+            if docs:
+                strategy = "unstructured"
+                logger.info(f"Extracted content using UnstructuredLoader for {source_name}")
+        except StageOverloaded:
+            raise
+        except Exception as e:
+            logger.warning(f"UnstructuredLoader failed for {source_name}: {e}")
+            error_log.append(f"Unstructured: {e}")
+            docs = []
 
     # 2) Fallback to PyPDFLoader
     if not docs:
         try:
-            pdf_loader = PyPDFLoader(tmp_path)
-            if hasattr(pdf_loader, 'aload'): docs = await pdf_loader.aload()
-            else: docs = pdf_loader.load()
-            if docs: logger.info(f"Extracted content using PyPDFLoader for {source_name}")
+            from langchain_community.document_loaders import PyPDFLoader # requires pypdf
+            pdf_loader = PyPDFLoader(await asyncio.get_running_loop().run_in_executor(None, upload.path))
+            with span("extract.pypdf"):
+                docs = await stages["extract"].run(pdf_loader.load)
+            if docs:
+                strategy = "pypdf"
+                logger.info(f"Extracted content using PyPDFLoader for {source_name}")
+        except StageOverloaded:
+            raise
         except Exception as e:
             logger.warning(f"PyPDFLoader failed for {source_name}: {e}")
             error_log.append(f"PyPDF: {e}")
@@ -201,41 +551,37 @@ async def _extract_docs(tmp_path: str, source_name: str) -> List[Document]:
     # 3) Fallback to PDFMinerLoader
     if not docs:
         try:
-            pdfm_loader = PDFMinerLoader(tmp_path)
-            docs = pdfm_loader.load()
-            if docs: logger.info(f"Extracted content using PDFMinerLoader for {source_name}")
+            from langchain_community.document_loaders import PDFMinerLoader # requires pdfminer.six
+            pdfm_loader = PDFMinerLoader(await asyncio.get_running_loop().run_in_executor(None, upload.path))
+            with span("extract.pdfminer"):
+                docs = await stages["extract"].run(pdfm_loader.load)
+            if docs:
+                strategy = "pdfminer"
+                logger.info(f"Extracted content using PDFMinerLoader for {source_name}")
+        except StageOverloaded:
+            raise
         except Exception as e:
             logger.warning(f"PDFMinerLoader failed for {source_name}: {e}")
             error_log.append(f"PDFMiner: {e}")
             docs = []
 
     # 4) Fallback to OCR for PDFs
-    is_pdf = False
-    try:
-        is_pdf = source_name.lower().endswith(".pdf")
-        if not is_pdf:
-             async with aiofiles.open(tmp_path, 'rb') as f:
-                 header = await f.read(5)
-                 if header == b'%PDF-': is_pdf = True
-    except Exception as read_err:
-        logger.warning(f"Could not read header to check if PDF: {read_err}")
-
     if not docs and is_pdf:
         logger.info(f"Attempting OCR for PDF: {source_name}...")
         try:
-            images = convert_from_path(tmp_path)
+            # Page-windowed rasterization fanned out to the OCR process pool (see ocr.py)
+            from ocr import ocr_pdf
+            with span("extract.ocr"):
+                pdf_path = await asyncio.get_running_loop().run_in_executor(None, upload.path)
+                ocr_result = await ocr_pdf(pdf_path, source_name, _ocr_window_callback(job, source_name))
+            error_log.extend(ocr_result["errors"])
             ocr_docs = []
-            for i, img in enumerate(images):
-                try:
-                    text = pytesseract.image_to_string(img, lang="hin+eng")
-                    text = _clean_text(text)
-                    if text: ocr_docs.append(Document(page_content=text, metadata={"source": source_name, "page_number": i + 1}))
-                except pytesseract.TesseractError as ocr_err:
-                     logger.warning(f"Tesseract error on page {i+1} of {source_name}: {ocr_err}")
-                     error_log.append(f"OCR Page {i+1}: {ocr_err}")
-                     continue
+            for page_number, text in ocr_result["pages"]:
+                text = _clean_text(text)
+                if text: ocr_docs.append(Document(page_content=text, metadata={"source": source_name, "page_number": page_number, "extraction_strategy": "ocr"}))
             if ocr_docs:
                 docs = ocr_docs
+                strategy = "ocr"
                 logger.info(f"Extracted content using OCR for {source_name}")
         except Exception as e:
             logger.warning(f"PDF OCR processing failed entirely for {source_name}: {e}")
@@ -243,6 +589,7 @@ async def _extract_docs(tmp_path: str, source_name: str) -> List[Document]:
             docs = []
 
     if not docs:
+        extraction_strategy.inc(strategy="failed")
         logger.error(f"Failed to extract readable text from {source_name}. Errors: {error_log}")
         raise HTTPException(status_code=400, detail=f"No readable text extracted from {source_name}. Extraction attempts failed.")
 
@@ -255,7 +602,10 @@ async def _extract_docs(tmp_path: str, source_name: str) -> List[Document]:
         cleaned_content = _clean_text(txt)
         if cleaned_content:
              metadata = {"source": source_name}
-             if hasattr(d, 'metadata') and d.metadata: metadata["page_number"] = d.metadata.get("page_number", 1)
+             if hasattr(d, 'metadata') and d.metadata:
+                 metadata["page_number"] = d.metadata.get("page_number", 1)
+                 for key in ("extraction_strategy", "extraction_ms"):
+                     if key in d.metadata: metadata[key] = d.metadata[key]
              else: metadata["page_number"] = 1
              cleaned.append(Document(page_content=cleaned_content, metadata=metadata))
              total_len += len(cleaned_content)
@@ -264,29 +614,15 @@ async def _extract_docs(tmp_path: str, source_name: str) -> List[Document]:
         logger.error(f"Content extracted from {source_name} was empty or binary after cleaning. Errors: {error_log}")
         raise HTTPException(status_code=400, detail=f"Extracted content from {source_name} was empty or unreadable after cleaning.")
 
+    extraction_strategy.inc(strategy=strategy)
+    for d in cleaned:
+        extracted_pages.inc(strategy=d.metadata.get("extraction_strategy", strategy))
     logger.info(f"Successfully cleaned {len(cleaned)} document pages/sections, total chars: {total_len} from {source_name}")
     return cleaned
 
 
 # --- Clause Identification Function ---
-async def identify_clauses_llm(documents: List[Document]) -> List[Dict[str, Any]]:
-    """Identifies predefined clauses in the document text using an LLM."""
-    if not documents:
-        return []
-
-    full_text = "\n\n".join([doc.page_content for doc in documents])
-    MAX_TEXT_LENGTH = 100000 # Limit text sent to LLM for clause identification
-    if len(full_text) > MAX_TEXT_LENGTH:
-        logger.warning(f"Document text too long ({len(full_text)} chars), truncating for clause analysis.")
-        full_text = full_text[:MAX_TEXT_LENGTH] + "\n[...TRUNCATED...]"
-
-    if not full_text.strip():
-        logger.info("No text content provided for clause identification.")
-        return []
-
-    target_clauses = list(CLAUSE_LIBRARY.keys())
-
-    prompt_template = """
+CLAUSE_PROMPT_TEMPLATE = """
     Analyze the following legal document text. Identify and extract the exact sentences or short paragraphs corresponding to these specific clause types: {clause_list}.
     Do not identify any other clause types. If a clause type is not found, do not include it in the output.
     Return ONLY a JSON object formatted according to the following instructions, with no preamble or explanation:
@@ -296,317 +632,1604 @@ async def identify_clauses_llm(documents: List[Document]) -> List[Dict[str, Any]
     {document_text}
     ---
     """
-    prompt = PromptTemplate(
-        template=prompt_template,
+# Built once and reused by every upload (Low temp for extraction)
+clause_chain = gateway.compile(
+    "clauses",
+    PromptTemplate(
+        template=CLAUSE_PROMPT_TEMPLATE,
         input_variables=["document_text", "clause_list"],
-        partial_variables={"format_instructions": clause_parser.get_format_instructions()}
-    )
+        partial_variables={"format_instructions": clause_parser.get_format_instructions()},
+    ),
+    temperature=0.1,
+    parser=clause_parser,
+)
 
-    llm = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest",
-            temperature=0.1, # Low temp for extraction
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
+def _clause_windows(documents: List[Document]) -> List[Dict[str, Any]]:
+    """
+    Packs consecutive pages into windows of at most CLAUSE_WINDOW_TOKENS estimated tokens.
+    Pages larger than the budget are cut into overlapping pieces so nothing is truncated.
+    """
+    pieces: List[Document] = []
+    for doc in documents:
+        tokens = estimate_tokens(doc.page_content)
+        if tokens <= CLAUSE_WINDOW_TOKENS:
+            pieces.append(doc)
+            continue
+        n_parts = math.ceil(tokens / CLAUSE_WINDOW_TOKENS)
+        step = math.ceil(len(doc.page_content) / n_parts)
+        for start in range(0, len(doc.page_content), step):
+            end = min(len(doc.page_content), start + step + CLAUSE_WINDOW_OVERLAP_CHARS)
+            pieces.append(Document(page_content=doc.page_content[start:end], metadata=doc.metadata))
+
+    windows: List[Dict[str, Any]] = []
+    current: List[Document] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece.page_content)
+        if current and current_tokens + tokens > CLAUSE_WINDOW_TOKENS:
+            windows.append({"docs": current, "text": "\n\n".join(d.page_content for d in current)})
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        windows.append({"docs": current, "text": "\n\n".join(d.page_content for d in current)})
+    return windows
+
+async def _analyse_clause_window(window: Dict[str, Any], window_no: int, semaphore: asyncio.Semaphore) -> List[Any]:
+    """Runs the clause chain on one window with bounded concurrency, re-asking when the output does not parse."""
+    async with semaphore:
+        for attempt in range(CLAUSE_LLM_RETRIES + 1):
+            try:
+                result: ClauseList = await clause_chain.ainvoke({
+                    "document_text": window["text"],
+                    "clause_list": ", ".join(CLAUSE_LIBRARY.keys()),
+                })
+                return [(clause, window) for clause in (result.clauses if result else [])]
+            except OutputParserException as e:
+                if attempt == CLAUSE_LLM_RETRIES:
+                    logger.warning(f"Clause window {window_no} output unparseable after {attempt + 1} attempts: {e}")
+                    raise
+                logger.info(f"Clause window {window_no} attempt {attempt + 1} returned unparseable output; asking again")
+    return []
+
+def _clause_detail(clause_type: str, text: str, page: int, located: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Final clause record returned by /upload/, with the library explanation attached."""
+    explanation = CLAUSE_LIBRARY.get(clause_type, {"hi": "स्पष्टीकरण उपलब्ध नहीं है।", "en": "Explanation not available."})
+    detail = {
+        "type": clause_type,
+        "text": text,
+        "page": located["page"] if located else page,
+        "explanation_hi": explanation.get("hi"),
+        "explanation_en": explanation.get("en"),
+    }
+    if located:
+        detail.update({"start": located["start"], "end": located["end"], "chunk_ids": located["chunk_ids"]})
+    return detail
+
+def _preclassify_passages(passages: List[Document]) -> Dict[str, List[Tuple[int, float]]]:
+    """Scores passages against every clause type (blocking; run on the embed stage)."""
+    texts = [p.page_content for p in passages]
+    # Passages are the same chunks indexing uses, so these embeddings land in the shared cache
+    vectors = embeddings.embed_documents(texts) if CLAUSE_KEYWORD_WEIGHT < 1.0 else None
+    scores = clause_classifier.score(texts, vectors)
+    return clause_classifier.select_candidates(scores, CLAUSE_CANDIDATES_PER_TYPE, CLAUSE_MIN_SCORE)
+
+async def identify_clauses_llm(documents: List[Document], mode: Optional[str] = None, page_index: Optional[PageIndex] = None,
+                              passages: Optional[List[Document]] = None) -> List[Dict[str, Any]]:
+    """
+    Identifies predefined clauses across the whole document using map-reduce:
+    token-budgeted windows are analysed by concurrent LLM calls, then merged and
+    deduplicated by clause type and text.
+    In "prefilter" mode only the locally top-scoring candidate passages are sent to the
+    LLM; in "local" mode the pre-classifier's best sentences are returned with no LLM call.
+    `passages` are the document's index chunks when the caller already has them.
+    """
+    if not documents or not any(doc.page_content.strip() for doc in documents):
+        logger.info("No text content provided for clause identification.")
+        return []
+
+    if page_index is None:
+        page_index = await stages["split"].run(_build_page_index, documents, [])
+
+    mode = mode or CLAUSE_MODE
+    if mode in ("prefilter", "local"):
+        with span("clauses.preclassify"):
+            if passages is None:
+                passages = await stages["split"].run(_split_chunks, documents)
+            candidates = await stages["embed"].run(_preclassify_passages, passages)
+        if mode == "local":
+            local_clauses = []
+            for clause_type, picks in candidates.items():
+                best = passages[picks[0][0]]
+                text = clause_classifier.best_sentence(best.page_content, clause_type)
+                local_clauses.append(_clause_detail(clause_type, text, best.metadata.get("page_number", 1), page_index.locate(text)))
+            logger.info(f"Local clause classifier identified {len(local_clauses)} clauses (no LLM call).")
+            return local_clauses
+
+        keep = sorted({i for picks in candidates.values() for i, _ in picks})
+        full_tokens = sum(estimate_tokens(d.page_content) for d in documents)
+        documents = [passages[i] for i in keep]
+        kept_tokens = sum(estimate_tokens(d.page_content) for d in documents)
+        logger.info(f"Clause pre-classifier kept {len(keep)}/{len(passages)} passages (~{kept_tokens}/{full_tokens} tokens).")
+        if not documents:
+            return []
+
+    windows = _clause_windows(documents)
+    semaphore = asyncio.Semaphore(CLAUSE_LLM_CONCURRENCY)
+    logger.info(f"Invoking LLM for clause identification over {len(windows)} windows (concurrency {CLAUSE_LLM_CONCURRENCY})...")
+    with span("clauses.llm"):
+        results = await asyncio.gather(
+            *(_analyse_clause_window(w, i, semaphore) for i, w in enumerate(windows)),
+            return_exceptions=True,
         )
+    failed = sum(1 for r in results if isinstance(r, BaseException))
+    if failed == len(results):
+        logger.error("Error during clause identification LLM calls: every window failed.")
+        return [] # Return empty on error, don't fail the upload
+    if failed:
+        logger.warning(f"Clause identification: {failed}/{len(results)} windows failed; returning partial results.")
+
+    # Reduce: drop repeats of the same clause (identical or contained text, e.g. from window overlap)
+    merged: List[Dict[str, Any]] = []
+    seen: Dict[str, List[str]] = {}
+    for window_result in results:
+        if isinstance(window_result, BaseException):
+            continue
+        for clause_info, window in window_result:
+            if clause_info.clause_type not in CLAUSE_LIBRARY:
+                continue
+            norm = normalize_text_for_match(clause_info.extracted_text)
+            if not norm:
+                continue
+            existing = seen.setdefault(clause_info.clause_type, [])
+            if any(norm in prior or prior in norm for prior in existing):
+                continue
+            existing.append(norm)
+
+            # Whitespace/punctuation-tolerant lookup; the window's first page is only a last resort
+            located = page_index.locate(clause_info.extracted_text)
+            page_num = window["docs"][0].metadata.get("page_number", 1)
+            merged.append(_clause_detail(clause_info.clause_type, clause_info.extracted_text, page_num, located))
+
+    if merged: logger.info(f"LLM identified {len(merged)} clauses across {len(windows)} windows.")
+    else: logger.info("LLM did not identify any of the target clauses.")
+    return merged
+# --- END Clause Identification Function ---
+
+
+# --- Upload persistence and content-addressed cache helpers ---
+# In-memory upload bytes across all requests and queued jobs; past this, uploads spill to disk
+spool_budget = MemoryBudget(SPOOL_MEMORY_TOTAL_BYTES)
 
-    chain = prompt | llm | clause_parser
+async def _receive_uploads(request: Request, fields: List[str],
+                           on_file: Optional[Callable[[str, SpooledUpload], None]] = None) -> Dict[str, SpooledUpload]:
+    """
+    Receives the named file fields of a multipart request straight from the body stream, hashing (SHA-256),
+    sniffing and size-checking each file as it arrives. Small uploads stay in memory; larger ones spill to
+    TMP_DIR. Raises UploadTooLarge (413) past MAX_UPLOAD_BYTES, 400 for a malformed body and 422 for a
+    missing field. Uploads already passed to `on_file` are the caller's to discard.
+    """
+    def received(name: str, upload: SpooledUpload) -> None:
+        logger.info(f"Received {upload.filename}: {upload.size} bytes, {upload.kind}, "
+                    f"{'in memory' if upload.in_memory else 'spilled to disk'} (sha256={upload.sha256})")
+        if on_file is not None:
+            on_file(name, upload)
 
-    identified_clauses_details = []
     try:
-        logger.info(f"Invoking LLM for clause identification on text (length {len(full_text)})...")
-        result: ClauseList = await chain.ainvoke({
-            "document_text": full_text,
-            "clause_list": ", ".join(target_clauses)
-        })
+        uploads = await receive_files(request.headers.get("content-type", ""), request.stream(), fields, TMP_DIR,
+                                      SPOOL_MEMORY_BYTES, MAX_UPLOAD_BYTES, spool_budget, on_file=received)
+    except MalformedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    missing = [name for name in fields if name not in uploads]
+    if missing:
+        if on_file is None:
+            for upload in uploads.values():
+                _discard_upload(upload)
+        raise HTTPException(status_code=422, detail=f"Missing file field(s): {', '.join(missing)}.")
+    return uploads
+
+def _docs_to_records(docs: List[Document]) -> List[Dict[str, Any]]:
+    """Serializes Documents for the on-disk cache."""
+    return [{"page_content": d.page_content, "metadata": dict(d.metadata or {})} for d in docs]
+
+def _records_to_docs(records: List[Dict[str, Any]], source_name: str) -> List[Document]:
+    """Rebuilds Documents from cache records, attributing them to the current upload's filename."""
+    return [
+        Document(page_content=r["page_content"], metadata={**r.get("metadata", {}), "source": source_name})
+        for r in records
+    ]
+
+async def _extract_docs_cached(upload: SpooledUpload, source_name: str, content_hash: str, job: Optional[UploadJob] = None,
+                               on_page: Optional[Callable[[Document], None]] = None) -> List[Document]:
+    """_extract_docs with the cleaned pages cached under the upload's content hash."""
+    records = doc_cache.get_docs(content_hash)
+    cache_lookups.inc(cache="extraction", result="hit" if records else "miss")
+    if records:
+        logger.info(f"Using cached extraction for {source_name} (sha256={content_hash[:12]})")
+        if job is not None:
+            job.update("extract", cached=True, pages_total=len(records))
+        return _records_to_docs(records, source_name)
+    with span("extract"):
+        docs = await _extract_docs(upload, source_name, job, on_page)
+    doc_cache.put_docs(content_hash, _docs_to_records(docs))
+    return docs
+
+def _number_chunks(chunks: List[Document]) -> List[Document]:
+    """Tags chunks (in order) with a stable chunk_id and their [start, end) span on the page."""
+    for chunk_id, chunk in enumerate(chunks):
+        start = chunk.metadata.get("start_index", 0)
+        chunk.metadata.update({"chunk_id": chunk_id, "start_index": start, "end_index": start + len(chunk.page_content)})
+    return chunks
+
+def _split_chunks(docs: List[Document]) -> List[Document]:
+    """Splits pages into chunks tagged with a stable chunk_id and their [start, end) span on the page."""
+    return _number_chunks(splitter.split_documents(docs))
+
+def _build_page_index(docs: List[Document], chunks: List[Document]) -> PageIndex:
+    """Builds the per-document offset-to-page index and registers chunk spans in it."""
+    page_index = PageIndex([(d.metadata.get("page_number", 1), d.page_content) for d in docs])
+    for chunk in chunks:
+        meta = chunk.metadata
+        if "chunk_id" in meta:
+            page_index.add_chunk(meta["chunk_id"], meta.get("page_number", 1), meta.get("start_index", 0), meta.get("end_index", 0))
+    return page_index
+
+class _IndexPipeline:
+    """
+    Splits and embeds pages in batches of INDEX_PIPELINE_PAGES while extraction is still producing
+    later ones, so embedding overlaps OCR. Chunks end up in (page, offset) order with the same
+    chunk_ids _split_chunks would assign. If the final extraction differs from what was streamed
+    (a fallback loader took over), the streamed work is dropped and the final pages are used.
+    """
 
-        if result and result.clauses:
-            logger.info(f"LLM identified {len(result.clauses)} potential clauses.")
-            for clause_info in result.clauses:
-                 page_num = 1
-                 for doc in documents:
-                     if clause_info.extracted_text[:50] in doc.page_content:
-                          page_num = doc.metadata.get("page_number", 1)
-                          break
-
-                 explanation = CLAUSE_LIBRARY.get(clause_info.clause_type, {"hi": "स्पष्टीकरण उपलब्ध नहीं है।", "en": "Explanation not available."})
-
-                 identified_clauses_details.append({
-                     "type": clause_info.clause_type,
-                     "text": clause_info.extracted_text,
-                     "page": page_num,
-                     "explanation_hi": explanation.get("hi"),
-                     "explanation_en": explanation.get("en"),
-                 })
-        else:
-             logger.info("LLM did not identify any of the target clauses.")
+    def __init__(self, job: UploadJob, batch_pages: int = INDEX_PIPELINE_PAGES):
+        self.job = job
+        self.batch_pages = max(1, batch_pages)
+        self._streamed: List[Document] = []
+        self._pending: List[Document] = []
+        self._splits: List[asyncio.Future] = []
+        self._embeds: List[asyncio.Future] = []
+        self._order: List[int] = []
+
+    def add_page(self, doc: Document) -> None:
+        """Extraction callback (on the event loop): queues a page and starts a batch when enough are waiting."""
+        self._streamed.append(doc)
+        self._pending.append(doc)
+        if len(self._pending) >= self.batch_pages:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pages, self._pending = self._pending, []
+        split = asyncio.ensure_future(stages["split"].run(splitter.split_documents, pages))
+        self._splits.append(split)
+        self._embeds.append(asyncio.ensure_future(self._embed(split)))
+
+    async def _embed(self, split: asyncio.Future) -> List[List[float]]:
+        chunks = await split
+        self.job.advance("embed", "texts_total", len(chunks))
+        reported = 0
+        def on_progress(done: int, total: int) -> None:
+            nonlocal reported
+            self.job.advance("embed", "texts_done", done - reported)
+            reported = done
+        return await stages["embed"].run(embeddings.embed_documents, [c.page_content for c in chunks], on_progress=on_progress)
+
+    def cancel(self) -> None:
+        for task in self._splits + self._embeds:
+            task.cancel()
+        self._splits, self._embeds = [], []
+
+    async def chunks(self, docs: List[Document]) -> List[Document]:
+        """Numbered chunks of the final extracted pages (splitting whatever was not streamed)."""
+        key = lambda d: (d.metadata.get("page_number", 1), d.page_content)
+        streamed = bool(self._streamed) and sorted(map(key, self._streamed)) == sorted(map(key, docs))
+        if not streamed:
+            if self._streamed:
+                logger.info(f"Extraction result differs from the streamed pages; re-splitting {len(docs)} pages.")
+            self.cancel()
+            self._pending = list(docs)
+        self._flush()
+        chunks = [c for batch in await asyncio.gather(*self._splits) for c in batch]
+        self._order = list(range(len(chunks)))
+        if streamed:
+            # Batches arrive in extraction order (text layer first, then OCR windows): restore page order
+            # and the final page metadata (e.g. OCR timings), exactly as a one-shot split would have it
+            page_meta = {d.metadata.get("page_number", 1): d.metadata for d in docs}
+            self._order.sort(key=lambda i: (chunks[i].metadata.get("page_number", 1), chunks[i].metadata.get("start_index", 0)))
+            chunks = [chunks[i] for i in self._order]
+            for chunk in chunks:
+                chunk.metadata.update(page_meta.get(chunk.metadata.get("page_number", 1), {}))
+        return _number_chunks(chunks)
+
+    async def vectors(self) -> List[List[float]]:
+        """Chunk embeddings aligned with `chunks()`; call after it."""
+        flat = [v for batch in await asyncio.gather(*self._embeds) for v in batch]
+        return [flat[i] for i in self._order]
+
+def _upsert_points(client: Any, collection_name: str, point_ids: List[str], chunks: List[Document], vectors: List[List[float]]) -> None:
+    from qdrant_client.http import models as qdrant_models
+    points = [
+        qdrant_models.PointStruct(
+            id=point_id,
+            vector=vector,
+            payload={"page_content": chunk.page_content, "metadata": chunk.metadata},
+        )
+        for point_id, chunk, vector in zip(point_ids, chunks, vectors)
+    ]
+    for start in range(0, len(points), QDRANT_UPSERT_BATCH):
+        client.upsert(collection_name=collection_name, points=points[start:start + QDRANT_UPSERT_BATCH])
+
+def _create_collection(collection_name: str, size: int) -> Any:
+    """A fresh in-memory Qdrant client holding one empty cosine collection."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models as qdrant_models
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=qdrant_models.VectorParams(size=size, distance=qdrant_models.Distance.COSINE),
+    )
+    return client
+
+def _build_vectorstore(collection_name: str, chunks: List[Document], vectors: List[List[float]], point_ids: List[str]) -> Any:
+    """Builds the document's vector store from precomputed chunk embeddings (in-memory Qdrant or quantized arrays)."""
+    if VECTOR_BACKEND == "quantized":
+        return QuantizedVectorStore.from_vectors(point_ids, chunks, vectors, embeddings,
+                                                 dtype=VECTOR_QUANTIZATION, rescore_oversample=VECTOR_RESCORE_OVERSAMPLE)
+    from langchain_community.vectorstores import Qdrant
+    client = _create_collection(collection_name, len(vectors[0]))
+    _upsert_points(client, collection_name, point_ids, chunks, vectors)
+    return Qdrant(client=client, collection_name=collection_name, embeddings=embeddings)
+
+def _copy_points(vectorstore: Any, client: Any, collection_name: str, point_ids: List[str]) -> Dict[str, List[float]]:
+    """Copies existing points by id, stored vector and payload as-is, into another collection. Returns their vectors by id (blocking)."""
+    from qdrant_client.http import models as qdrant_models
+    vectors: Dict[str, List[float]] = {}
+    for start in range(0, len(point_ids), QDRANT_UPSERT_BATCH):
+        records = vectorstore.client.retrieve(
+            collection_name=vectorstore.collection_name,
+            ids=point_ids[start:start + QDRANT_UPSERT_BATCH],
+            with_vectors=True,
+            with_payload=True,
+        )
+        client.upsert(collection_name=collection_name,
+                      points=[qdrant_models.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records])
+        vectors.update({str(r.id): r.vector for r in records})
+    return vectors
+
+def _version_vectorstore(parent_store: Any, collection_name: str, chunks: List[Document], point_ids: List[str],
+                         diff: chunk_diff.ChunkDiff, added_vectors: List[List[float]],
+                         rename_to: Optional[str] = None) -> Tuple[Any, List[List[float]]]:
+    """
+    A new version's vector store, built without touching the parent's (still live and queried until the
+    switch). The parent's reused points are copied over by id with their stored vectors, never re-embedded;
+    only added chunks are written fresh, moved ones get their position payload rewritten and removed ones
+    are simply not copied. `rename_to` re-points the copies' `source` when the new version was uploaded
+    under another filename. Returns the store and every chunk's vector, in chunk order (blocking).
+    """
+    if isinstance(parent_store, QuantizedVectorStore):
+        # Reused rows are gathered by id as stored codes (not re-quantized) and take the version's own chunk
+        # payloads, which covers moved chunks and a new filename; only the added chunks are quantized
+        reused = sorted(diff.reused)
+        store = parent_store.derive([diff.reused[i] for i in reused], [chunks[i] for i in reused],
+                                    [point_ids[i] for i in diff.added], [chunks[i] for i in diff.added], added_vectors)
+        stored = parent_store.get_vectors(list(diff.reused.values()))
+        added = dict(zip(diff.added, added_vectors))
+        return store, [added[i] if i in added else stored[point_ids[i]] for i in range(len(chunks))]
+    from langchain_community.vectorstores import Qdrant
+    parent_client, parent_collection = parent_store.client, parent_store.collection_name
+    client = _create_collection(collection_name, parent_client.get_collection(parent_collection).config.params.vectors.size)
+    stored = _copy_points(parent_store, client, collection_name, list(diff.reused.values()))
+    vectors: List[List[float]] = [None] * len(chunks)
+    for i, point_id in diff.reused.items():
+        vectors[i] = stored[point_id]
+    for i, vector in zip(diff.added, added_vectors):
+        vectors[i] = vector
+    upserts = sorted(diff.added + diff.moved)
+    _upsert_points(client, collection_name, [point_ids[i] for i in upserts], [chunks[i] for i in upserts], [vectors[i] for i in upserts])
+    if rename_to is not None:
+        # Identity is content-only, so a renamed upload still reuses every point: only the copies' `source` changes
+        moved = set(diff.moved)
+        unmoved = [point_id for i, point_id in diff.reused.items() if i not in moved]
+        if unmoved:
+            client.set_payload(collection_name=collection_name, payload={"source": rename_to}, points=unmoved, key="metadata")
+    return Qdrant(client=client, collection_name=collection_name, embeddings=embeddings), vectors
+
+def _index_size_bytes(chunks: List[Document], vectorstore: Any, lexical_index: BM25Index) -> int:
+    """Registry size estimate: chunk texts and payloads, vectors at the store's actual width, BM25 postings."""
+    vector_bytes = getattr(vectorstore, "bytes_per_vector", DEFAULT_VECTOR_BYTES)
+    return estimate_index_bytes([c.page_content for c in chunks], vector_bytes=vector_bytes) + lexical_index.size_bytes()
+
+# --- Persistent index (INDEX_DIR) ---
+def _persist_document(document_id: str, source_name: str, content_hash: str, vectorstore: QuantizedVectorStore,
+                      docs: List[Document], extra: Dict[str, Any], clause_state: Dict[str, Any],
+                      replaces: Optional[str] = None) -> QuantizedVectorStore:
+    """Commits a document's snapshot to INDEX_DIR and returns its memory-mapped store to serve from (blocking)."""
+    meta = {"version": extra.get("version", 1), "parent_id": extra.get("parent_id"), "chunk_points": extra["chunk_points"]}
+    clauses = clause_state.get("identified_clauses") if clause_state.get("status") == "done" else None
+    persistent_index.commit(document_id, source_name, content_hash, vectorstore, _docs_to_records(docs), meta,
+                            clauses=clauses, replaces=replaces)
+    return persistent_index.open_vectors(document_id)
+
+def _persist_clauses_when_done(document_id: str, clause_state: Dict[str, Any], clause_task: Optional[asyncio.Future]) -> None:
+    """Writes the document's clauses into its snapshot once identification has finished (if it was still running at commit)."""
+    if persistent_index is None or clause_task is None or clause_task.done(): # Finished ones were part of the commit
+        return
+    def write(task: asyncio.Future) -> None:
+        if clause_state.get("status") != "done":
+            return
+        try:
+            persistent_index.put_clauses(document_id, clause_state.get("identified_clauses", []))
+        except OSError as e:
+            logger.warning(f"Could not persist clauses of {document_id}: {e}")
+    clause_task.add_done_callback(write)
+
+def _restore_document(document_id: str) -> Optional[DocumentIndex]:
+    """Rebuilds a committed document's index from its snapshot and registers it; vectors stay memory-mapped (blocking)."""
+    stored = persistent_index.open(document_id)
+    if stored is None:
+        return None
+    entry, meta, vectorstore = stored["entry"], stored["meta"], stored["vectorstore"]
+    chunks = sorted(vectorstore.documents(), key=lambda c: c.metadata.get("chunk_id", 0))
+    page_index = _build_page_index(_records_to_docs(stored["pages"], entry["source_name"]), chunks)
+    lexical_index = BM25Index(chunks)
+    extra: Dict[str, Any] = {
+        "version": meta.get("version", 1),
+        "chunk_points": [(key, point_id, tuple(signature)) for key, point_id, signature in meta["chunk_points"]],
+    }
+    if meta.get("parent_id"):
+        extra["parent_id"] = meta["parent_id"]
+    if stored["clauses"] is not None:
+        extra["clauses"] = {"status": "done", "identified_clauses": stored["clauses"]}
+    doc_index = DocumentIndex(
+        document_id=document_id,
+        source_name=entry["source_name"],
+        vectorstore=vectorstore,
+        chunk_count=len(chunks),
+        size_bytes=_index_size_bytes(chunks, vectorstore, lexical_index),
+        content_hash=entry.get("content_hash"),
+        page_index=page_index,
+        lexical_index=lexical_index,
+        extra=extra,
+    )
+    registry.put(doc_index)
+    logger.info(f"Restored document {document_id} ({entry['source_name']}, {len(chunks)} chunks) from {INDEX_DIR}.")
+    return doc_index
 
-    except Exception as e:
-        logger.exception("Error during clause identification LLM call.")
-        return [] # Return empty on error, don't fail the upload
+# Restores in flight, so concurrent requests for the same document open its snapshot once
+_restoring: Dict[str, asyncio.Future] = {}
 
-    return identified_clauses_details
-# --- END Clause Identification Function ---
+async def _restore(document_id: str) -> Optional[DocumentIndex]:
+    with span("index.restore"):
+        return await stages["split"].run(_restore_document, document_id)
+
+async def _lookup_document(document_id: str) -> Optional[DocumentIndex]:
+    """
+    A document's live index: from the registry or, with INDEX_DIR, restored from its snapshot on first use.
+    An in-memory entry that another worker has since deleted or superseded is dropped.
+    """
+    doc_index = registry.get(document_id)
+    if persistent_index is None:
+        return doc_index
+    if not persistent_index.contains(document_id):
+        if doc_index is not None:
+            registry.remove(document_id)
+        return None
+    if doc_index is not None:
+        return doc_index
+    task = _restoring.get(document_id)
+    if task is None:
+        task = asyncio.ensure_future(_restore(document_id))
+        _restoring[document_id] = task
+        task.add_done_callback(lambda _: _restoring.pop(document_id, None))
+    # shield: one caller giving up must not cancel the restore the others are waiting on
+    return await asyncio.shield(task)
+
+# --- QA helpers (shared by /ask/ and /ask/stream) ---
+# Refined prompt template for Hindi QA
+QA_PROMPT_TEMPLATE = """
+    दिए गए संदर्भ का उपयोग करके निम्नलिखित प्रश्न का उत्तर सरल हिंदी में दें।
+    यदि उत्तर ज्ञात न हो, तो स्पष्ट रूप से कहें कि पर्याप्त जानकारी उपलब्ध नहीं है, उत्तर बनाने का प्रयास न करें।
+    उत्तर बिंदुवार (bullet points) और संक्षेप में दें।
+    **यदि प्रश्न किसी सूची या विशिष्ट संख्या में आइटम के लिए पूछता है (उदाहरण के लिए, "दो कारण बताएं"), तो सुनिश्चित करें कि आप उन सभी आइटम को निकालने और सूचीबद्ध करने का प्रयास करें जो संदर्भ में दिए गए हैं।**
+
+    संदर्भ:
+    {context}
+
+    प्रश्न:
+    {question}
+
+    उत्तर (सरल हिंदी में):
+    """
+QA_PROMPT = PromptTemplate(template=QA_PROMPT_TEMPLATE, input_variables=["context", "question"])
+qa_chain = gateway.compile("qa", QA_PROMPT, temperature=0.2) # Keep temperature low for factuality
+NO_ANSWER_TEXT = "क्षमा करें, मुझे उत्तर नहीं मिल सका।"
+
+# Several questions over one shared context, answered in a single call (POST /ask/batch)
+class BatchAnswer(LangchainBaseModel):
+    id: int = Field(description="The number of the question being answered.")
+    answer: str = Field(description="The answer to that question in simple Hindi, as bullet points.")
+
+class BatchAnswerList(LangchainBaseModel):
+    answers: List[BatchAnswer] = Field(description="One answer per numbered question.")
+
+batch_answer_parser = PydanticOutputParser(pydantic_object=BatchAnswerList)
+BATCH_QA_PROMPT_TEMPLATE = """
+    दिए गए संदर्भ का उपयोग करके नीचे दिए गए प्रत्येक क्रमांकित प्रश्न का उत्तर सरल हिंदी में दें।
+    यदि किसी प्रश्न का उत्तर ज्ञात न हो, तो उस प्रश्न के लिए स्पष्ट रूप से कहें कि पर्याप्त जानकारी उपलब्ध नहीं है, उत्तर बनाने का प्रयास न करें।
+    हर उत्तर बिंदुवार (bullet points) और संक्षेप में दें, और हर प्रश्न का उत्तर उसके क्रमांक के साथ दें।
+
+    संदर्भ:
+    {context}
+
+    प्रश्न सूची:
+    {questions}
+
+    {format_instructions}
+    """
+batch_qa_chain = gateway.compile(
+    "qa_batch",
+    PromptTemplate(
+        template=BATCH_QA_PROMPT_TEMPLATE,
+        input_variables=["context", "questions"],
+        partial_variables={"format_instructions": batch_answer_parser.get_format_instructions()},
+    ),
+    temperature=0.2,
+    parser=batch_answer_parser,
+)
+
+def _retriever_for(doc_index: DocumentIndex, question_vector: Optional[List[float]] = None) -> HybridRetriever:
+    return HybridRetriever(
+        vectorstore=doc_index.vectorstore,
+        lexical_index=doc_index.lexical_index,
+        query_vector=question_vector,
+        dense_k=RETRIEVAL_DENSE_K,
+        sparse_k=RETRIEVAL_SPARSE_K,
+        rrf_k=RETRIEVAL_RRF_K,
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        max_chunks=CONTEXT_MAX_CHUNKS,
+        estimate_tokens=estimate_tokens,
+    )
+
+async def _get_document_or_404(document_id: str) -> DocumentIndex:
+    doc_index = await _lookup_document(document_id)
+    if doc_index is None:
+        logger.warning(f"Attempted /ask for unknown or evicted document {document_id}.")
+        raise HTTPException(status_code=404, detail="Document not found or expired. Please upload and process it again via the /upload endpoint.")
+    return doc_index
+
+def _format_sources(doc_index: DocumentIndex, source_documents: List[Document]) -> List[Dict[str, Any]]:
+    """Cleaned source passages with page and character span (from the span metadata or the document's page index)."""
+    sources = []
+    for doc in source_documents:
+        content = _clean_text(getattr(doc, "page_content", "") or "")
+        if content:
+            metadata = getattr(doc, "metadata", None) or {}
+            located = None
+            if "chunk_ids" in metadata and "end_index" in metadata:
+                # Assembled context span (possibly several merged chunks)
+                located = {"page": metadata.get("page_number", 1), "start": metadata["start_index"], "end": metadata["end_index"]}
+            elif doc_index.page_index is not None:
+                located = doc_index.page_index.chunk_span(metadata.get("chunk_id")) or doc_index.page_index.locate(content)
+            source = {"content": content, "page": located["page"] if located else metadata.get("page_number", 1)}
+            if located:
+                source.update({"start": located["start"], "end": located["end"]})
+            if "chunk_id" in metadata:
+                source["chunk_id"] = metadata["chunk_id"]
+            if len(metadata.get("chunk_ids", [])) > 1:
+                source["chunk_ids"] = metadata["chunk_ids"]
+            sources.append(source)
+    return sources
+
+def _dense_search_batch(vectorstore: Any, vectors: List[List[float]], k: int) -> List[List[Document]]:
+    """Dense hits for several query vectors at once: one vectorized pass (quantized) or one batched Qdrant search."""
+    if isinstance(vectorstore, QuantizedVectorStore):
+        return vectorstore.similarity_search_by_vectors(vectors, k)
+    from qdrant_client.http import models as qdrant_models
+    results = vectorstore.client.search_batch(
+        collection_name=vectorstore.collection_name,
+        requests=[qdrant_models.SearchRequest(vector=vector, limit=k, with_payload=True) for vector in vectors],
+    )
+    return [
+        [Document(page_content=(p.payload or {}).get("page_content", ""), metadata=(p.payload or {}).get("metadata") or {}) for p in points]
+        for points in results
+    ]
+
+def _retrieve_batch(doc_index: DocumentIndex, questions: List[str], vectors: List[List[float]]) -> List[Tuple[List[Document], Dict[str, Any]]]:
+    """Hybrid retrieval for several questions: one batched dense search, then BM25, fusion and packing per question."""
+    retriever = _retriever_for(doc_index)
+    dense = _dense_search_batch(doc_index.vectorstore, vectors, RETRIEVAL_DENSE_K)
+    return [retriever.retrieve(q, v, dense=d) for q, v, d in zip(questions, vectors, dense)]
+
+def _passage_chunks(doc: Document) -> frozenset:
+    """Chunks an assembled context passage covers (merged spans list several)."""
+    metadata = doc.metadata or {}
+    return frozenset(metadata.get("chunk_ids") or [document_key(doc)])
+
+def _pack_questions(contexts: List[List[Document]]) -> List[Dict[str, Any]]:
+    """
+    Groups questions (by position) to share one multi-answer prompt. Each question joins the group whose
+    passages overlap its own the most (then: adds the fewest tokens), provided the group's combined context
+    stays within ASK_BATCH_PACK_TOKENS; otherwise it starts a new group. Returns
+    [{"members": [positions], "passages": [Document]}] with passages deduplicated across members.
+    """
+    groups: List[Dict[str, Any]] = []
+    for position, passages in enumerate(contexts):
+        best, best_rank = None, None
+        if ASK_BATCH_PACK_TOKENS > 0:
+            for group in groups:
+                if len(group["members"]) >= ASK_BATCH_PACK_MAX_QUESTIONS:
+                    continue
+                new = [p for p in passages if not _passage_chunks(p) <= group["covered"]]
+                extra = sum(estimate_tokens(p.page_content) for p in new)
+                if group["tokens"] + extra > ASK_BATCH_PACK_TOKENS:
+                    continue
+                rank = (len(passages) - len(new), -extra)
+                if best_rank is None or rank > best_rank:
+                    best, best_rank = group, rank
+        if best is None:
+            best = {"members": [], "passages": [], "covered": set(), "tokens": 0}
+            groups.append(best)
+        best["members"].append(position)
+        for p in passages:
+            chunks = _passage_chunks(p)
+            if not chunks <= best["covered"]:
+                best["passages"].append(p)
+                best["covered"] |= chunks
+                best["tokens"] += estimate_tokens(p.page_content)
+    for group in groups:
+        # Shared context reads in document order
+        group["passages"].sort(key=lambda p: (p.metadata.get("page_number", 1), p.metadata.get("start_index", 0)))
+    return [{"members": g["members"], "passages": g["passages"]} for g in groups]
+
+async def _answer_packed(questions: List[str], contexts: List[List[Document]], passages: List[Document]) -> Tuple[List[Optional[str]], int]:
+    """
+    Answers a group of questions: one packed multi-answer prompt over the shared passages, falling back
+    to per-question prompts for anything the packed reply did not answer. Returns (answers, LLM calls).
+    """
+    answers: List[Optional[str]] = [None] * len(questions)
+    calls = 0
+    if len(questions) > 1:
+        numbered = "\n".join(f"[{n}] {q}" for n, q in enumerate(questions, start=1))
+        calls += 1
+        ask_batch_prompts.inc(kind="packed")
+        try:
+            with span("ask_batch.generate"):
+                parsed = await batch_qa_chain.ainvoke({"context": "\n\n".join(p.page_content for p in passages), "questions": numbered})
+            for item in parsed.answers:
+                if 1 <= item.id <= len(questions) and item.answer.strip():
+                    answers[item.id - 1] = item.answer.strip()
+        except OutputParserException as e:
+            logger.warning(f"Packed answer for {len(questions)} questions was not parseable; answering them one by one: {e}")
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    if missing:
+        kind = "single" if len(questions) == 1 else "fallback"
+
+        async def single(i: int) -> str:
+            ask_batch_prompts.inc(kind=kind)
+            with span("ask_batch.generate"):
+                context = "\n\n".join(doc.page_content for doc in contexts[i])
+                return (await qa_chain.ainvoke({"context": context, "question": questions[i]})).strip()
+
+        calls += len(missing)
+        for i, answer in zip(missing, await asyncio.gather(*(single(i) for i in missing))):
+            answers[i] = answer
+    return answers, calls
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    """One Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+# Recent time-to-first-token samples for /ask/stream, reported by /stats
+_stream_ttft_ms: Deque[float] = deque(maxlen=1024)
+_stream_counts = {"started": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+def _stream_stats() -> Dict[str, Any]:
+    samples = sorted(_stream_ttft_ms)
+    pct = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 2) if samples else None
+    return {**_stream_counts, "ttft_ms_p50": pct(0.50), "ttft_ms_p95": pct(0.95), "ttft_samples": len(samples)}
+
+def _collect_component_stats():
+    """Scrape-time gauges mirroring /stats: index registry, caches, LLM gateway, upload jobs and stage pools."""
+    yield from flatten_stats("index", registry.stats())
+    yield from flatten_stats("doc_cache", doc_cache.stats())
+    yield from flatten_stats("embedding_cache", embeddings.stats())
+    yield from flatten_stats("answer_cache", answer_cache.stats())
+    yield from flatten_stats("ask_stream", _stream_stats())
+    yield from flatten_stats("llm", gateway.stats())
+    yield from flatten_stats("upload_jobs", upload_jobs.stats())
+    yield from flatten_stats("upload_spool", spool_budget.stats())
+    if persistent_index is not None:
+        yield from flatten_stats("persistent_index", persistent_index.stats())
+    for name, stage in stages.items():
+        for key, value in stage.stats().items():
+            yield f"stage_{key}", f"Stage pool {key} (see /stats)", {"stage": name}, float(value)
+
+metrics.add_collector(_collect_component_stats)
 
 
 # -------------- API Routes --------------
 @app.get("/health")
-def health():
-    """Health check endpoint."""
+async def health():
+    """Health check endpoint. Runs on the event loop, never behind the worker pools."""
     return {
         "status": "ok",
         "tmp_dir": TMP_DIR,
         "tmp_writable": os.access(TMP_DIR, os.W_OK),
         "nltk_dir": NLTK_DATA_DIR,
-        "index_stats": INDEX_STATS,
+        "index_stats": registry.stats(),
+        "doc_cache": doc_cache.stats(),
+        "embedding_cache": embeddings.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm": gateway.stats(),
+        "upload_jobs": upload_jobs.stats(),
+        "stages": {name: stage.stats() for name, stage in stages.items()},
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the background warm-up has loaded the required models."""
+    snapshot = readiness.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
 @app.get("/stats")
 def stats():
     """Returns basic indexing stats."""
-    return INDEX_STATS
+    registry.sweep()
+    return {
+        **registry.stats(),
+        "doc_cache": doc_cache.stats(),
+        "embedding_cache": embeddings.stats(),
+        "answer_cache": answer_cache.stats(),
+        "ask_stream": _stream_stats(),
+        "llm": gateway.stats(),
+        "upload_jobs": upload_jobs.stats(),
+        "upload_spool": spool_budget.stats(),
+        "persistent_index": persistent_index.stats() if persistent_index is not None else None,
+        "stages": {name: stage.stats() for name, stage in stages.items()},
+    }
 
-# --- MODIFIED /upload/ Endpoint ---
-@app.post("/upload/", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+@app.get("/metrics")
+def prometheus_metrics():
     """
-    Uploads, extracts, identifies clauses, splits, and indexes a document.
-    Returns identified clauses along with success message.
-    Resets the vector store for each new upload (single-document context).
+    Prometheus text-format metrics: per-stage latency histograms, extraction strategy and OCR
+    throughput, LLM latency and tokens, cache hits, HTTP latency and in-flight requests.
     """
-    global vectorstore, splitter # Ensure splitter is accessible
-    original_filename = safe_filename(file.filename)
-    tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}_{original_filename}")
-    logger.info(f"Processing upload: {original_filename}")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-    # --- Save file ---
+# --- MODIFIED /upload/ Endpoint ---
+def _discard_upload(upload: SpooledUpload) -> None:
+    """Releases a spooled upload (its buffer or temporary file) once it is processed or abandoned."""
+    upload.discard()
+
+# Detached clause-identification tasks (deferred uploads); held here so they are not garbage collected
+_background_tasks: set = set()
+
+def _clause_status(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {"status": state["status"], "identified_clauses": state.get("identified_clauses", []), "error": state.get("error")}
+
+def _carry_clauses(clauses: List[Dict[str, Any]], page_index: PageIndex) -> List[Dict[str, Any]]:
+    """A parent version's clauses whose text still occurs verbatim in the new version, re-anchored to it."""
+    carried = []
+    for clause in clauses:
+        span_ = page_index.locate(clause["text"])
+        if span_ is not None and span_.get("exact"):
+            carried.append(_clause_detail(clause["type"], clause["text"], span_["page"], span_))
+    return carried
+
+def _merge_clauses(*groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Concatenates clause lists, dropping repeats of a type whose text contains (or is contained in) an earlier one."""
+    merged: List[Dict[str, Any]] = []
+    seen: Dict[str, List[str]] = {}
+    for clause in (c for group in groups for c in group):
+        norm = normalize_text_for_match(clause["text"])
+        existing = seen.setdefault(clause["type"], [])
+        if any(norm in prior or prior in norm for prior in existing):
+            continue
+        existing.append(norm)
+        merged.append(clause)
+    return merged
+
+async def _identify_clauses_for(job: UploadJob, state: Dict[str, Any], content_hash: str, docs: List[Document],
+                                chunks: List[Document], page_index: PageIndex,
+                                carried: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Clause identification for an upload, run alongside indexing. Outcome is recorded in `state`.
+    For a new version, `docs`/`chunks` are only its changed chunks and `carried` the parent's clauses
+    that are still present; the two are merged.
+    """
+    job.update("clauses", status="running")
     try:
-        async with aiofiles.open(tmp_path, "wb") as out_file:
-            while True:
-                chunk = await file.read(CHUNK_SIZE)
-                if not chunk: break
-                await out_file.write(chunk)
-        await file.close()
-        logger.info(f"File saved temporarily to: {tmp_path}")
+        logger.info("Starting clause identification...")
+        with span("clauses"):
+            identified_clauses = await identify_clauses_llm(docs, page_index=page_index, passages=chunks) if docs else []
+        if carried is not None:
+            logger.info(f"Carried over {len(carried)} clauses from the parent version; {len(identified_clauses)} found in changed chunks.")
+            identified_clauses = _merge_clauses(carried, identified_clauses)
+        logger.info(f"Finished clause identification. Found {len(identified_clauses)} clauses.")
+        # Empty results may be an LLM failure, so only cache positive findings
+        if identified_clauses: doc_cache.put_clauses(content_hash, identified_clauses)
+    except asyncio.CancelledError:
+        state["status"] = "cancelled"
+        job.update("clauses", status="cancelled")
+        raise
     except Exception as e:
-        logger.exception(f"Failed to save uploaded file '{original_filename}'")
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
-
-    extracted_docs = []
-    chunks = []
-    identified_clauses = []
+        logger.exception("Clause identification failed")
+        state.update(status="failed", error=str(e))
+        job.update("clauses", status="failed", error=str(e))
+        raise
+    state.update(status="done", identified_clauses=identified_clauses)
+    job.update("clauses", status="done", found=len(identified_clauses))
+    job.result["identified_clauses"] = identified_clauses
+    return identified_clauses
+
+async def _find_live_index(content_hash: str) -> Optional[DocumentIndex]:
+    """A live index built from identical upload bytes: registered here, else a committed snapshot (restored)."""
+    live_index = registry.find_by_content_hash(content_hash)
+    if persistent_index is None:
+        return live_index
+    if live_index is not None:
+        live_index = await _lookup_document(live_index.document_id)
+    if live_index is None:
+        stored_id = persistent_index.find_by_content_hash(content_hash)
+        live_index = await _lookup_document(stored_id) if stored_id is not None else None
+    return live_index
+
+async def _process_upload(job: UploadJob, upload: SpooledUpload, original_filename: str, content_hash: str,
+                          clauses: str = "inline") -> UploadResponse:
+    """
+    Extracts, splits, embeds and indexes a saved upload as a pipeline: pages are split and
+    embedded while later pages are still being extracted, and clause identification runs
+    alongside embedding. The document is registered (and /ask/-able) as soon as its index is
+    built; with clauses="deferred" the response does not wait for clauses, which are then
+    served by GET /documents/{id}/clauses. Progress and partial results are reported on `job`.
+    Always discards the spooled upload.
+    """
+    # --- Warm path: identical bytes already indexed (in this process, or with INDEX_DIR by any worker) ---
     try:
-        # --- Extract text ---
-        extracted_docs = await _extract_docs(tmp_path, original_filename)
-
-        # --- Identify Clauses ---
-        if extracted_docs:
-            logger.info("Starting clause identification...")
-            identified_clauses = await identify_clauses_llm(extracted_docs)
-            logger.info(f"Finished clause identification. Found {len(identified_clauses)} clauses.")
-        else:
-             logger.warning("No documents extracted, skipping clause identification.")
+        live_index = await _find_live_index(content_hash)
+    except BaseException:
+        _discard_upload(upload)
+        raise
+    cache_lookups.inc(cache="live_index", result="hit" if live_index is not None else "miss")
+    if live_index is not None:
+        _discard_upload(upload)
+        logger.info(f"Upload {original_filename} matches live document {live_index.document_id}; reusing index.")
+        job.update("index", status="done", reused=True, document_id=live_index.document_id)
+        state = live_index.extra.get("clauses") or {"status": "done", "identified_clauses": doc_cache.get_clauses(content_hash) or []}
+        return UploadResponse(
+            message="File already indexed; reusing existing index",
+            document_id=live_index.document_id,
+            chunks_added=live_index.chunk_count,
+            identified_clauses=state.get("identified_clauses", []),
+            clauses_status=state["status"],
+            clauses_url=f"/documents/{live_index.document_id}/clauses",
+        )
 
-        # --- Split documents into chunks ---
-        if extracted_docs:
-            chunks = splitter.split_documents(extracted_docs)
-            logger.info(f"Split '{original_filename}' into {len(chunks)} chunks using size={splitter._chunk_size}, overlap={splitter._chunk_overlap}.")
-        else:
-            chunks = []
+    cached_index = doc_cache.get_index(content_hash, INDEX_VARIANT)
+    cached_clauses = doc_cache.get_clauses(content_hash)
+    cache_lookups.inc(cache="index", result="hit" if cached_index is not None else "miss")
+    cache_lookups.inc(cache="clauses", result="hit" if cached_clauses is not None else "miss")
+    chunks: List[Document] = []
+    vectors: Optional[List[List[float]]] = None
+    if cached_index is not None:
+        chunk_records, vectors = cached_index
+        chunks = _records_to_docs(chunk_records, original_filename)
+        logger.info(f"Loaded {len(chunks)} cached chunks and embeddings for {original_filename}.")
+    pipeline = _IndexPipeline(job) if cached_index is None else None
+    clause_state: Dict[str, Any] = {"status": "pending"}
+    clause_task: Optional[asyncio.Future] = None
 
-    except HTTPException as http_exc:
-         if os.path.exists(tmp_path): os.remove(tmp_path)
-         raise http_exc
-    except Exception as e:
-        logger.exception(f"Failed to extract, identify clauses, or split document '{original_filename}'")
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {e}")
-    finally:
-        # --- Clean up temporary file ---
+    try:
         try:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-                logger.info(f"Removed temporary file: {tmp_path}")
+            # --- Extract text (served from the cache when these bytes were seen before); pages stream into the pipeline ---
+            job.update("extract", status="running")
+            extracted_docs = await _extract_docs_cached(upload, original_filename, content_hash, job,
+                                                        on_page=pipeline.add_page if pipeline is not None else None)
+            job.update("extract", status="done", pages=len(extracted_docs))
+
+            # --- Split documents into chunks (most batches were split during extraction) ---
+            job.update("split", status="running")
+            if pipeline is not None:
+                job.update("embed", status="running")
+                with span("upload.split"):
+                    chunks = await pipeline.chunks(extracted_docs)
+                logger.info(f"Split '{original_filename}' into {len(chunks)} chunks using size={splitter._chunk_size}, overlap={splitter._chunk_overlap}.")
+
+            with span("upload.page_and_lexical_index"):
+                # --- Offset-to-page index (clause attribution and /ask/ source spans) ---
+                page_index = await stages["split"].run(_build_page_index, extracted_docs, chunks)
+                # --- Lexical (BM25) index used alongside the vector store by /ask/ ---
+                lexical_index = await stages["split"].run(BM25Index, chunks)
+            job.update("split", status="done", chunks=len(chunks), cached=cached_index is not None)
+
+            # --- Identify Clauses, concurrently with the rest of indexing ---
+            if cached_clauses is not None:
+                clause_state.update(status="done", identified_clauses=cached_clauses)
+                job.update("clauses", status="done", found=len(cached_clauses), cached=True)
+                job.result["identified_clauses"] = cached_clauses
+            else:
+                clause_task = asyncio.ensure_future(
+                    _identify_clauses_for(job, clause_state, content_hash, extracted_docs, chunks, page_index)
+                )
+                clause_state["task"] = clause_task
+
+        except (HTTPException, StageOverloaded):
+             raise
         except Exception as e:
-            logger.warning(f"Could not remove temp file {tmp_path}: {e}")
-
-    if not chunks:
-         logger.warning(f"No chunks generated for {original_filename} after processing.")
-         return UploadResponse(
-             message=f"File processed. No indexable content found, but clauses identified.",
-             chunks_added=0,
-             identified_clauses=identified_clauses
+            logger.exception(f"Failed to extract, identify clauses, or split document '{original_filename}'")
+            raise HTTPException(status_code=500, detail=f"Failed to process document: {e}")
+        finally:
+            # --- Clean up temporary file (extraction is finished either way) ---
+            _discard_upload(upload)
+
+        if not chunks:
+            logger.warning(f"No chunks generated for {original_filename} after processing.")
+            identified_clauses = await clause_task if clause_task is not None else clause_state.get("identified_clauses", [])
+            return UploadResponse(
+                message="File processed. No indexable content found, but clauses identified.",
+                chunks_added=0,
+                identified_clauses=identified_clauses or []
             )
 
-    # --- Index chunks ---
-    try:
-        # --- QDRANT RESET LOGIC ---
-        # Clear existing store to ensure context is only from the latest upload
-        logger.warning("Clearing existing in-memory vector store before indexing new document.")
-        vectorstore = None # Reset the global variable
-        INDEX_STATS["files"] = 0 # Reset stats
-        INDEX_STATS["chunks"] = 0
-        # --- END RESET LOGIC ---
-
-        logger.info("Initializing in-memory Qdrant vector store with new document...")
-        vectorstore = Qdrant.from_documents(chunks, embeddings, location=":memory:", collection_name="legal_docs")
+        # --- Index chunks ---
+        document_id = uuid.uuid4().hex
+        try:
+            if vectors is None:
+                # Most batches were embedded during extraction; this waits for the rest
+                with span("upload.embed"):
+                    vectors = await pipeline.vectors()
+                await stages["embed"].run(doc_cache.put_index, content_hash, INDEX_VARIANT, _docs_to_records(chunks), vectors)
+            job.update("embed", status="done", texts_total=len(chunks), texts_done=len(chunks), cached=cached_index is not None)
+
+            # Each upload gets its own collection so concurrent users never share or clobber context
+            logger.info(f"Initializing {VECTOR_BACKEND} vector store for document {document_id}...")
+            job.update("index", status="running")
+            point_ids = [str(uuid.uuid4()) for _ in chunks]
+            with span("upload.vectorstore"):
+                doc_vectorstore = await stages["embed"].run(_build_vectorstore, f"doc_{document_id}", chunks, vectors, point_ids)
+            extra = {
+                "clauses": clause_state,
+                "version": 1,
+                # Lets a later version reuse these points (see _process_version)
+                "chunk_points": chunk_diff.chunk_points([chunk_diff.chunk_key(c.page_content) for c in chunks], point_ids, [c.metadata for c in chunks]),
+            }
+            if persistent_index is not None:
+                with span("upload.persist"):
+                    doc_vectorstore = await stages["embed"].run(_persist_document, document_id, original_filename, content_hash,
+                                                                doc_vectorstore, extracted_docs, extra, clause_state)
+                _persist_clauses_when_done(document_id, clause_state, clause_task)
+
+            registry.put(DocumentIndex(
+                document_id=document_id,
+                source_name=original_filename,
+                vectorstore=doc_vectorstore,
+                chunk_count=len(chunks),
+                size_bytes=_index_size_bytes(chunks, doc_vectorstore, lexical_index),
+                content_hash=content_hash,
+                page_index=page_index,
+                lexical_index=lexical_index,
+                extra=extra,
+            ))
+            job.update("index", status="done", document_id=document_id)
+            job.result["document_id"] = document_id
+            upload_chunks.observe(len(chunks))
+            logger.info(f"Successfully indexed {len(chunks)} chunks for document {document_id}. Registry: {registry.stats()}")
+
+        except StageOverloaded:
+            raise
+        except Exception as e:
+            logger.exception("Failed to index chunks into the vector store")
+            raise HTTPException(status_code=500, detail=f"Failed to index document chunks: {e}")
 
-        INDEX_STATS["files"] = 1 # Set to 1 for the new document
-        INDEX_STATS["chunks"] = len(chunks)
-        logger.info(f"Successfully indexed {len(chunks)} chunks. Total chunks: {INDEX_STATS['chunks']}")
+    except BaseException:
+        # Failed or cancelled before the document was registered: stop the work still in flight
+        if pipeline is not None:
+            pipeline.cancel()
+        if clause_task is not None:
+            clause_task.cancel()
+        raise
 
-    except Exception as e:
-        logger.exception("Failed to index chunks into Qdrant")
-        raise HTTPException(status_code=500, detail=f"Failed to index document chunks: {e}")
+    # --- Clauses: wait for them (default) or hand them off to GET /documents/{id}/clauses ---
+    await _settle_clauses(clause_task, clauses)
 
     # --- Return success response including clauses ---
     return UploadResponse(
         message="File uploaded, processed, and indexed successfully",
+        document_id=document_id,
         chunks_added=len(chunks),
-        identified_clauses=identified_clauses
+        identified_clauses=clause_state.get("identified_clauses", []),
+        clauses_status=clause_state["status"],
+        clauses_url=f"/documents/{document_id}/clauses",
     )
-# --- END MODIFIED /upload/ Endpoint ---
 
-@app.post("/ask/")
-async def ask_question(query: Query):
+async def _settle_clauses(clause_task: Optional[asyncio.Future], clauses: str) -> None:
+    """Waits for clause identification (inline) or detaches it (deferred); the outcome is in the clause state."""
+    if clause_task is not None and clauses == "deferred":
+        _background_tasks.add(clause_task)
+        clause_task.add_done_callback(_background_tasks.discard)
+        clause_task.add_done_callback(lambda t: t.cancelled() or t.exception()) # Outcome is in clause_state
+    elif clause_task is not None:
+        try:
+            await clause_task
+        except Exception:
+            pass # Recorded in clause_state; the document itself is indexed and usable
+
+async def _get_parent_or_error(parent_id: str) -> DocumentIndex:
+    """The live document a new version is based on: 404 if unknown/evicted, 409 if another version is being built on it."""
+    parent = await _lookup_document(parent_id)
+    if parent is None:
+        raise HTTPException(status_code=404, detail="Parent document not found or expired; upload the new version without parent_id.")
+    if parent.extra.get("versioning"):
+        raise HTTPException(status_code=409, detail="A new version of this document is already being indexed.")
+    if "chunk_points" not in parent.extra:
+        raise HTTPException(status_code=409, detail="Parent document cannot be versioned; upload the new version without parent_id.")
+    return parent
+
+async def _process_version(job: UploadJob, upload: SpooledUpload, original_filename: str, content_hash: str,
+                           parent_id: str, clauses: str = "inline") -> UploadResponse:
     """
-    Performs Retrieval-Augmented Generation (RAG) QA in Hindi
-    using the indexed documents and a Google Generative AI model.
-    Applies accuracy improvements (retriever k=6, refined prompt).
+    Indexes a new version of a live document incrementally. Its chunks are matched against the
+    parent's by content hash: only new chunks are embedded, the rest are copied over by id with
+    their stored vectors (see _version_vectorstore). The parent's collection is never modified, so
+    it keeps answering unchanged until the registry switches over and drops it.
+    Clauses still present in the parent carry over; identification reruns on changed chunks only.
+    Always discards the spooled upload.
     """
-    global vectorstore
-    if vectorstore is None:
-        logger.warning("Attempted /ask before uploading documents.")
-        raise HTTPException(status_code=400, detail="Please upload and process a document first via the /upload endpoint.")
+    try:
+        parent = await _get_parent_or_error(parent_id)
+    except HTTPException:
+        _discard_upload(upload)
+        raise
+    if parent.content_hash == content_hash:
+        _discard_upload(upload)
+        state = parent.extra.get("clauses") or {"status": "done", "identified_clauses": []}
+        job.update("index", status="done", reused=True, document_id=parent.document_id)
+        return UploadResponse(
+            message="New version is identical to its parent; reusing existing index",
+            document_id=parent.document_id,
+            chunks_added=0,
+            identified_clauses=state.get("identified_clauses", []),
+            clauses_status=state["status"],
+            clauses_url=f"/documents/{parent.document_id}/clauses",
+            parent_id=parent.extra.get("parent_id"),
+            version=parent.extra.get("version", 1),
+        )
 
-    # Define the refined prompt template for Hindi QA
-    prompt_template = """
-    दिए गए संदर्भ का उपयोग करके निम्नलिखित प्रश्न का उत्तर सरल हिंदी में दें।
-    यदि उत्तर ज्ञात न हो, तो स्पष्ट रूप से कहें कि पर्याप्त जानकारी उपलब्ध नहीं है, उत्तर बनाने का प्रयास न करें।
-    उत्तर बिंदुवार (bullet points) और संक्षेप में दें।
-    **यदि प्रश्न किसी सूची या विशिष्ट संख्या में आइटम के लिए पूछता है (उदाहरण के लिए, "दो कारण बताएं"), तो सुनिश्चित करें कि आप उन सभी आइटम को निकालने और सूचीबद्ध करने का प्रयास करें जो संदर्भ में दिए गए हैं।**
+    parent.extra["versioning"] = True # Claimed: a concurrent version of the same parent gets 409
+    document_id = uuid.uuid4().hex
+    clause_state: Dict[str, Any] = {"status": "pending"}
+    clause_task: Optional[asyncio.Future] = None
+    try:
+        try:
+            # --- Extract and split the whole new version (cheap next to embedding and the LLM) ---
+            job.update("extract", status="running")
+            extracted_docs = await _extract_docs_cached(upload, original_filename, content_hash, job)
+            job.update("extract", status="done", pages=len(extracted_docs))
+            job.update("split", status="running")
+            chunks = await stages["split"].run(_split_chunks, extracted_docs)
+            if not chunks:
+                raise HTTPException(status_code=400, detail="New version has no indexable content.")
+            page_index = await stages["split"].run(_build_page_index, extracted_docs, chunks)
+            lexical_index = await stages["split"].run(BM25Index, chunks)
+            keys = [chunk_diff.chunk_key(c.page_content) for c in chunks]
+            diff = chunk_diff.diff_chunks(parent.extra["chunk_points"], keys, [c.metadata for c in chunks])
+            job.update("split", status="done", chunks=len(chunks), **diff.stats())
+            logger.info(f"Version of {parent_id} ({original_filename}): {diff.stats()}")
+
+            # --- Clauses: parent's still-present clauses plus identification over the changed chunks ---
+            cached_clauses = doc_cache.get_clauses(content_hash)
+            parent_clauses = parent.extra.get("clauses") or {"status": "done", "identified_clauses": doc_cache.get_clauses(parent.content_hash) or []}
+            if cached_clauses is not None:
+                clause_state.update(status="done", identified_clauses=cached_clauses)
+                job.update("clauses", status="done", found=len(cached_clauses), cached=True)
+                job.result["identified_clauses"] = cached_clauses
+            else:
+                if parent_clauses["status"] == "done":
+                    changed = [chunks[i] for i in diff.added]
+                    carried = _carry_clauses(parent_clauses.get("identified_clauses", []), page_index)
+                    coro = _identify_clauses_for(job, clause_state, content_hash, changed, changed, page_index, carried=carried)
+                else: # Parent's clauses are unknown (still pending or failed): analyse the whole version
+                    coro = _identify_clauses_for(job, clause_state, content_hash, extracted_docs, chunks, page_index)
+                clause_task = asyncio.ensure_future(coro)
+                clause_state["task"] = clause_task
+
+            # --- Embed only the added chunks; the parent's stored vectors are reused for the rest ---
+            job.update("embed", status="running", texts_total=len(diff.added), texts_done=0)
+            with span("version.embed"):
+                added_vectors = await stages["embed"].run(embeddings.embed_documents, [chunks[i].page_content for i in diff.added]) if diff.added else []
+            job.update("embed", status="done", texts_done=len(diff.added), reused=len(diff.reused))
+            point_ids = [diff.reused.get(i) or str(uuid.uuid4()) for i in range(len(chunks))]
+
+            # --- Build the version's own store from the parent's points, then switch the registry over ---
+            job.update("index", status="running")
+            rename_to = original_filename if original_filename != parent.source_name else None
+            with span("version.upsert"):
+                store, vectors = await stages["embed"].run(_version_vectorstore, parent.vectorstore, f"doc_{document_id}",
+                                                           chunks, point_ids, diff, added_vectors, rename_to)
+            extra = {
+                "clauses": clause_state,
+                "version": parent.extra.get("version", 1) + 1,
+                "parent_id": parent_id,
+                "chunk_points": chunk_diff.chunk_points(keys, point_ids, [c.metadata for c in chunks]),
+            }
+            if persistent_index is not None:
+                # The version's store is complete, so it replaces the parent in one catalog swap
+                with span("version.persist"):
+                    store = await stages["embed"].run(_persist_document, document_id, original_filename, content_hash,
+                                                      store, extracted_docs, extra, clause_state, parent_id)
+                _persist_clauses_when_done(document_id, clause_state, clause_task)
+            registry.supersede(parent_id, DocumentIndex(
+                document_id=document_id,
+                source_name=original_filename,
+                vectorstore=store,
+                chunk_count=len(chunks),
+                size_bytes=_index_size_bytes(chunks, store, lexical_index),
+                content_hash=content_hash,
+                page_index=page_index,
+                lexical_index=lexical_index,
+                extra=extra,
+            ))
+            await stages["embed"].run(doc_cache.put_index, content_hash, INDEX_VARIANT, _docs_to_records(chunks), vectors)
+            for outcome, n in (("reused", len(diff.reused)), ("embedded", len(diff.added)), ("deleted", len(diff.removed))):
+                reindexed_chunks.inc(n, outcome=outcome)
+            job.update("index", status="done", document_id=document_id, **diff.stats())
+            job.result["document_id"] = document_id
+            logger.info(f"Indexed version {document_id} of {parent_id} incrementally. Registry: {registry.stats()}")
+
+        except (HTTPException, StageOverloaded):
+            raise
+        except IndexConflict as e:
+            raise HTTPException(status_code=409, detail=f"Parent document was deleted or replaced meanwhile: {e}")
+        except Exception as e:
+            logger.exception(f"Failed to index new version of document {parent_id}")
+            raise HTTPException(status_code=500, detail=f"Failed to index new document version: {e}")
+        finally:
+            _discard_upload(upload)
+
+    except BaseException:
+        # Nothing to roll back: the parent's store was only read
+        if clause_task is not None:
+            clause_task.cancel()
+        raise
+    finally:
+        parent.extra.pop("versioning", None)
 
-    संदर्भ:
-    {context}
+    await _settle_clauses(clause_task, clauses)
+    return UploadResponse(
+        message=f"New version indexed incrementally ({len(diff.added)} of {len(chunks)} chunks embedded)",
+        document_id=document_id,
+        chunks_added=len(diff.added),
+        identified_clauses=clause_state.get("identified_clauses", []),
+        clauses_status=clause_state["status"],
+        clauses_url=f"/documents/{document_id}/clauses",
+        parent_id=parent_id,
+        version=parent.extra.get("version", 1) + 1,
+        reindex=diff.stats(),
+    )
 
-    प्रश्न:
-    {question}
+def _multipart_body(*fields: str) -> Dict[str, Any]:
+    """OpenAPI request body for endpoints that parse their multipart upload from the raw stream."""
+    properties = {name: {"type": "string", "format": "binary"} for name in fields}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {
+        "schema": {"type": "object", "properties": properties, "required": list(fields)},
+    }}}}
 
-    उत्तर (सरल हिंदी में):
+@app.post("/upload/", response_model=UploadResponse, openapi_extra=_multipart_body("file"))
+async def upload_file(request: Request, wait: bool = True, clauses: str = "inline", parent_id: Optional[str] = None):
+    """
+    Uploads, extracts, identifies clauses, splits, and indexes a document (multipart field `file`).
+    Returns identified clauses along with success message and the document_id
+    that must be passed to /ask/ to query this document.
+    Repeat uploads of identical bytes are served from the content-addressed cache.
+    With `?clauses=deferred` the response returns as soon as the document is indexed and
+    clauses are fetched from GET /documents/{document_id}/clauses.
+    With `?wait=false` the file is saved and queued instead: the response is 202 with a
+    job id to poll at GET /jobs/{job_id} (and cancel with DELETE).
+    With `?parent_id=` the file is a new version of that live document and is re-indexed
+    incrementally (only changed chunks are embedded and re-analysed); it replaces the parent.
     """
+    if clauses not in ("inline", "deferred"):
+        raise HTTPException(status_code=422, detail="clauses must be 'inline' or 'deferred'.")
+    if parent_id is not None:
+        await _get_parent_or_error(parent_id) # Fail fast, before the upload is spooled
+    process = functools.partial(_process_version, parent_id=parent_id) if parent_id is not None else _process_upload
+
+    # --- Receive file (parsed from the request body, hashed and type-sniffed as it streams; kept in memory when small) ---
+    try:
+        with span("upload.save"):
+            upload = (await _receive_uploads(request, ["file"]))["file"]
+    except (HTTPException, UploadTooLarge):
+        raise
+    except Exception as e:
+        logger.exception("Failed to save uploaded file")
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
+    original_filename = safe_filename(upload.filename)
+    logger.info(f"Processing upload: {original_filename}")
+    content_hash = upload.sha256
+    saved = {"bytes": upload.size, "kind": upload.kind, "in_memory": upload.in_memory}
+
+    if wait:
+        job = UploadJob(original_filename)
+        job.update("save", status="done", **saved)
+        with span("upload"):
+            return await process(job, upload, original_filename, content_hash, clauses=clauses)
 
-    PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    chain_kwargs = {"prompt": PROMPT}
+    async def run(job: UploadJob) -> Dict[str, Any]:
+        with span("upload"):
+            return jsonable_encoder(await process(job, upload, original_filename, content_hash, clauses=clauses))
 
-    # Initialize the QA chain
+    job = UploadJob(original_filename, run=run, discard=lambda: _discard_upload(upload))
+    job.update("save", status="done", **saved)
     try:
-        # --- ACCURACY IMPROVEMENT: Increased retriever results ---
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 10}) # Fetch top 6 chunks
-        # --- END ACCURACY IMPROVEMENT ---
-
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=ChatGoogleGenerativeAI(
-                model="gemini-flash-latest",
-                temperature=0.2, # Keep temperature low for factuality
-                google_api_key=os.getenv("GOOGLE_API_KEY"),
-            ),
-            chain_type="stuff", # Assumes combined chunks fit context window
-            retriever=retriever, # Use the modified retriever
-            return_source_documents=True,
-            chain_type_kwargs=chain_kwargs,
+        await upload_jobs.submit(job)
+    except StageOverloaded:
+        _discard_upload(upload)
+        raise
+    logger.info(f"Queued upload job {job.job_id} for {original_filename} (queue depth {upload_jobs.stats()['queue_depth']})")
+    return JSONResponse(
+        status_code=202,
+        content=_job_snapshot(job),
+        headers={"Location": f"/jobs/{job.job_id}"},
+    )
+# --- END MODIFIED /upload/ Endpoint ---
+
+def _job_snapshot(job: UploadJob) -> Dict[str, Any]:
+    return {**job.snapshot(upload_jobs.position(job)), "status_url": f"/jobs/{job.job_id}"}
+
+def _get_job_or_404(job_id: str) -> UploadJob:
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired).")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, per-stage progress and (partial) results of a background upload."""
+    return _job_snapshot(_get_job_or_404(job_id))
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels a queued or running background upload; 409 if it has already finished."""
+    job = _get_job_or_404(job_id)
+    if not upload_jobs.cancel(job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}.")
+    # A running job unwinds at its next await; give it a moment so the reply usually shows the final state
+    for _ in range(20):
+        if job.finished:
+            break
+        await asyncio.sleep(0.01)
+    return _job_snapshot(job)
+
+@app.post("/ask/")
+async def ask_question(query: Query):
+    """
+    Performs Retrieval-Augmented Generation (RAG) QA in Hindi
+    using the indexed documents and a Google Generative AI model.
+    Retrieval is hybrid (dense + BM25, rank-fused) and packed to CONTEXT_TOKEN_BUDGET.
+    """
+    doc_index = await _get_document_or_404(query.document_id)
+
+    # --- Semantic answer cache: near-identical questions about this document skip retrieval + LLM ---
+    started = time.perf_counter()
+    with span("ask.embed_query"):
+        question_vector = await stages["query"].run(embeddings.embed_query, query.question)
+    cached = answer_cache.lookup(doc_index.document_id, question_vector)
+    cache_lookups.inc(cache="answer", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        logger.info(f"Answer cache hit for document {doc_index.document_id} (similarity {cached['similarity']}, {(time.perf_counter() - started) * 1000:.1f} ms)")
+        return {"answer": cached["answer"], "sources": cached["sources"], "context": cached.get("context", {}), "cached": True}
+
+    # Hybrid dense + BM25 retrieval, packed to CONTEXT_TOKEN_BUDGET (reuses the question embedding)
+    with span("ask.retrieve"):
+        source_documents, context_stats = await stages["query"].run(
+            _retriever_for(doc_index).retrieve, query.question, question_vector
         )
-    except Exception as e:
-         logger.exception("Failed to initialize QA chain")
-         raise HTTPException(status_code=500, detail=f"Could not initialize QA system: {e}")
+    context = "\n\n".join(doc.page_content for doc in source_documents)
 
-    # Invoke the QA chain
+    # Invoke the QA chain (pooled client, rate limited, retried and hedged by the gateway)
     try:
         logger.info(f"Invoking QA chain with question: {query.question}")
-        result: Dict[str, Any] = await qa_chain.ainvoke({"query": query.question})
+        with span("ask.generate"):
+            final_answer = (await qa_chain.ainvoke({"context": context, "question": query.question})).strip()
     except Exception as e:
         logger.exception("Error during QA chain invocation")
         raise HTTPException(status_code=500, detail=f"Error processing question: {e}")
 
-    # Process source documents
-    sources = []
-    if "source_documents" in result:
-        for doc in result["source_documents"]:
-            content = _clean_text(getattr(doc, "page_content", "") or "")
-            if content:
-                page = 1
-                if hasattr(doc, 'metadata') and doc.metadata:
-                    page = doc.metadata.get("page_number", 1)
-                sources.append({"content": content, "page": page})
+    sources = _format_sources(doc_index, source_documents)
+    if final_answer:
+        answer_cache.store(doc_index.document_id, question_vector, {"answer": final_answer, "sources": sources, "context": context_stats})
+    else:
+        final_answer = NO_ANSWER_TEXT
+    logger.info(f"QA chain result: Answer length={len(final_answer)}, Sources found={len(sources)}, context tokens={context_stats.get('context_tokens')} (saved {context_stats.get('tokens_saved')})")
+
+    return {"answer": final_answer, "sources": sources, "context": context_stats, "cached": False}
+
+@app.post("/ask/stream")
+async def ask_question_stream(query: Query, request: Request):
+    """
+    Streaming variant of /ask/ over Server-Sent Events. Emits, in order:
+    `sources` (retrieved passages), `token` (answer text as the LLM produces it), `done` (timing).
+    A client disconnect stops generation upstream.
+    """
+    doc_index = await _get_document_or_404(query.document_id)
+    started = time.perf_counter()
+    with span("ask.embed_query"):
+        question_vector = await stages["query"].run(embeddings.embed_query, query.question)
+    cached = answer_cache.lookup(doc_index.document_id, question_vector)
+    cache_lookups.inc(cache="answer", result="hit" if cached is not None else "miss")
+    source_documents: List[Document] = []
+    retrieval: Dict[str, Any] = {}
+    if cached is None:
+        with span("ask.retrieve"):
+            source_documents, retrieval = await stages["query"].run(
+                _retriever_for(doc_index).retrieve, query.question, question_vector
+            )
+        sources = _format_sources(doc_index, source_documents)
+    else:
+        sources, retrieval = cached["sources"], cached.get("context", {})
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    async def events():
+        _stream_counts["started"] += 1
+        yield _sse("sources", {"sources": sources, "cached": cached is not None})
+        ttft_ms: Optional[float] = None
+        parts: List[str] = []
+        if cached is not None:
+            ttft_ms = (time.perf_counter() - started) * 1000
+            parts.append(cached["answer"])
+            yield _sse("token", {"text": cached["answer"]})
+        else:
+            context = "\n\n".join(doc.page_content for doc in source_documents)
+            stream = qa_chain.astream({"context": context, "question": query.question})
+            try:
+                async for text in stream:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        _stream_ttft_ms.append(ttft_ms)
+                        logger.info(f"/ask/stream first token after {ttft_ms:.1f} ms (retrieval {retrieval_ms:.1f} ms) for document {doc_index.document_id}")
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+                    if await request.is_disconnected():
+                        _stream_counts["cancelled"] += 1
+                        logger.info(f"/ask/stream client disconnected after {len(parts)} tokens; cancelling generation.")
+                        return
+            except asyncio.CancelledError:
+                _stream_counts["cancelled"] += 1
+                logger.info(f"/ask/stream cancelled after {len(parts)} tokens.")
+                raise
+            except Exception as e:
+                _stream_counts["failed"] += 1
+                logger.exception("Error during streamed QA generation")
+                yield _sse("error", {"detail": f"Error processing question: {e}"})
+                return
+            finally:
+                await stream.aclose() # Stops the upstream LLM call if we left the loop early
+
+        answer = "".join(parts).strip()
+        if answer and cached is None:
+            answer_cache.store(doc_index.document_id, question_vector, {"answer": answer, "sources": sources, "context": retrieval})
+        _stream_counts["completed"] += 1
+        total_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"/ask/stream done: {len(parts)} tokens, ttft={ttft_ms or 0:.1f} ms, total={total_ms:.1f} ms")
+        yield _sse("done", {
+            "answer": answer or NO_ANSWER_TEXT,
+            "cached": cached is not None,
+            "tokens": len(parts),
+            "context": retrieval,
+            "retrieval_ms": round(retrieval_ms, 2),
+            "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+            "total_ms": round(total_ms, 2),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/ask/batch")
+async def ask_question_batch(query: BatchQuery, request: Request):
+    """
+    Answers several questions about one document in one request, over Server-Sent Events.
+    All questions are embedded in one batch and retrieved with one vectorized dense search; questions
+    whose contexts overlap (and fit ASK_BATCH_PACK_TOKENS) share a single multi-answer prompt, and the
+    prompts run with bounded concurrency. Emits `answer` (or `error`) per question as it finishes,
+    carrying the question's index in the request, then `done`.
+    """
+    doc_index = await _get_document_or_404(query.document_id)
+    positions: Dict[str, List[int]] = {} # Identical questions are answered once
+    for index, question in enumerate(query.questions):
+        if question.strip():
+            positions.setdefault(question.strip(), []).append(index)
+    questions = list(positions)
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given.")
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch.")
+
+    started = time.perf_counter()
+    with span("ask_batch.embed_query"):
+        vectors = await stages["query"].run(embeddings.embed_queries, questions)
+    cached = [answer_cache.lookup(doc_index.document_id, vector) for vector in vectors]
+    for hit in cached:
+        cache_lookups.inc(cache="answer", result="hit" if hit is not None else "miss")
+    pending = [i for i, hit in enumerate(cached) if hit is None]
+    retrieved: List[Tuple[List[Document], Dict[str, Any]]] = []
+    if pending:
+        with span("ask_batch.retrieve"):
+            retrieved = await stages["query"].run(_retrieve_batch, doc_index, [questions[i] for i in pending], [vectors[i] for i in pending])
+    contexts = {i: result for i, result in zip(pending, retrieved)}
+    groups = [{"members": [pending[m] for m in g["members"]], "passages": g["passages"]} for g in _pack_questions([docs for docs, _ in retrieved])]
+    retrieval_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"/ask/batch: {len(questions)} questions for document {doc_index.document_id}, {len(questions) - len(pending)} cached, "
+                f"{len(groups)} prompts after packing (retrieval {retrieval_ms:.1f} ms)")
+
+    def answered(i: int, payload: Dict[str, Any]) -> List[bytes]:
+        return [_sse("answer", {"index": index, "question": questions[i], **payload}) for index in positions[questions[i]]]
+
+    async def generate(group: Dict[str, Any], slots: asyncio.Semaphore) -> Tuple[List[int], List[Optional[str]], int, Optional[str]]:
+        members = group["members"]
+        async with slots:
+            try:
+                answers, calls = await _answer_packed([questions[i] for i in members], [contexts[i][0] for i in members], group["passages"])
+                return members, answers, calls, None
+            except Exception as e:
+                logger.exception(f"Error answering {len(members)} batched questions")
+                return members, [None] * len(members), 0, str(e)
+
+    async def events():
+        slots = asyncio.Semaphore(max(1, ASK_BATCH_CONCURRENCY))
+        tasks = [asyncio.ensure_future(generate(group, slots)) for group in groups]
+        llm_calls, failed = 0, 0
+        try:
+            for i, hit in enumerate(cached):
+                if hit is not None:
+                    for frame in answered(i, {"answer": hit["answer"], "sources": hit["sources"], "cached": True}):
+                        yield frame
+            for finished in asyncio.as_completed(tasks):
+                members, answers, calls, error = await finished
+                llm_calls += calls
+                for i, answer in zip(members, answers):
+                    if error is not None:
+                        failed += 1
+                        for index in positions[questions[i]]:
+                            yield _sse("error", {"index": index, "question": questions[i], "detail": f"Error processing question: {error}"})
+                        continue
+                    source_documents, context_stats = contexts[i]
+                    sources = _format_sources(doc_index, source_documents)
+                    if answer:
+                        answer_cache.store(doc_index.document_id, vectors[i], {"answer": answer, "sources": sources})
+                    for frame in answered(i, {"answer": answer or NO_ANSWER_TEXT, "sources": sources, "cached": False,
+                                              "packed_with": len(members) - 1, "context": context_stats}):
+                        yield frame
+                if await request.is_disconnected():
+                    logger.info("/ask/batch client disconnected; cancelling remaining generation.")
+                    return
+            total_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"/ask/batch done: {len(questions)} questions, {llm_calls} LLM calls, {failed} failed, total={total_ms:.1f} ms")
+            yield _sse("done", {
+                "questions": len(questions),
+                "cached": len(questions) - len(pending),
+                "failed": failed,
+                "prompts": len(groups),
+                "llm_calls": llm_calls,
+                "retrieval_ms": round(retrieval_ms, 2),
+                "total_ms": round(total_ms, 2),
+            })
+        finally:
+            for task in tasks:
+                task.cancel() # Stops upstream calls still running if the client went away
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    final_answer = result.get("result", "क्षमा करें, मुझे उत्तर नहीं मिल सका।")
-    logger.info(f"QA chain result: Answer length={len(final_answer)}, Sources found={len(sources)}")
 
-    return {"answer": final_answer, "sources": sources}
+@app.get("/documents/{document_id}/clauses")
+async def get_document_clauses(document_id: str, wait: float = 0):
+    """
+    Clause identification status and results for an indexed document. Clauses are found
+    alongside indexing, so they may still be "pending" after /upload/ returns; `?wait=`
+    blocks up to that many seconds (capped at CLAUSE_WAIT_MAX_SECONDS) for them to finish.
+    """
+    doc_index = await _lookup_document(document_id)
+    if doc_index is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    state = doc_index.extra.get("clauses") or {"status": "done", "identified_clauses": doc_cache.get_clauses(doc_index.content_hash) or []}
+    task = state.get("task")
+    if task is not None and not task.done() and wait > 0:
+        # shield: a client giving up on the wait must not cancel the shared identification task
+        await asyncio.wait([asyncio.shield(task)], timeout=min(wait, CLAUSE_WAIT_MAX_SECONDS))
+    return {"document_id": document_id, **_clause_status(state)}
+
+@app.delete("/documents/{document_id}")
+def delete_document(document_id: str):
+    """Releases a document's index before its idle TTL expires (and, with INDEX_DIR, deletes its snapshot)."""
+    removed = registry.remove(document_id)
+    if persistent_index is not None:
+        removed = persistent_index.remove(document_id) or removed
+    if not removed:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return {"deleted": document_id}
 
 
 # --- COMPARE ENDPOINT ---
-@app.post("/compare/")
-async def compare_documents(file1: UploadFile = File(...), file2: UploadFile = File(...)):
-    """Compares the text content of two uploaded documents using robust extraction."""
-    original1 = safe_filename(file1.filename)
-    tmp_path1 = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}_cmp1_{original1}")
-    original2 = safe_filename(file2.filename)
-    tmp_path2 = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}_cmp2_{original2}")
-    text1, text2 = "", ""
-    diff_lines = []
+async def _prepare_comparison(request: Request) -> Dict[str, Any]:
+    """
+    Receives both uploads from the request body and extracts them, starting on file1 as soon as it has
+    arrived while file2 is still being received; then segments and aligns them on the diff stage.
+    """
+    uploads: List[SpooledUpload] = []
+    extractions: Dict[str, asyncio.Future] = {}
+
+    def extract(name: str, upload: SpooledUpload) -> None:
+        # Text extraction is cached by content hash, so known versions skip it
+        uploads.append(upload)
+        extractions[name] = asyncio.ensure_future(_extract_docs_cached(upload, safe_filename(upload.filename), upload.sha256))
+
     try:
-        # Save files
-        logger.info(f"Saving file1 ('{original1}') to {tmp_path1}")
-        async with aiofiles.open(tmp_path1, "wb") as out:
-            while True:
-                chunk = await file1.read(CHUNK_SIZE)
-                if not chunk: break
-                await out.write(chunk)
-        await file1.close()
-        logger.info(f"Saving file2 ('{original2}') to {tmp_path2}")
-        async with aiofiles.open(tmp_path2, "wb") as out:
-            while True:
-                chunk = await file2.read(CHUNK_SIZE)
-                if not chunk: break
-                await out.write(chunk)
-        await file2.close()
-
-        # Extract text
-        logger.info(f"Extracting text from {original1}...")
-        docs1 = await _extract_docs(tmp_path1, original1)
-        logger.info(f"Extracting text from {original2}...")
-        docs2 = await _extract_docs(tmp_path2, original2)
+        with span("compare.save"):
+            received = await _receive_uploads(request, ["file1", "file2"], on_file=extract)
+        original1 = safe_filename(received["file1"].filename)
+        original2 = safe_filename(received["file2"].filename)
+        logger.info(f"Extracting text from {original1} and {original2}...")
+        docs1, docs2 = await asyncio.gather(extractions["file1"], extractions["file2"])
 
         text1 = "\n".join([doc.page_content for doc in docs1])
         text2 = "\n".join([doc.page_content for doc in docs2])
         logger.info(f"Text lengths - File1: {len(text1)}, File2: {len(text2)}")
 
-        # Perform comparison
-        logger.info("Performing comparison using difflib...")
-        diff_lines = list(difflib.unified_diff(
-            text1.splitlines(keepends=True),
-            text2.splitlines(keepends=True),
-            fromfile=original1,
-            tofile=original2,
-            n=3
-        ))
-        logger.info(f"Comparison complete. Found {len(diff_lines)} difference lines.")
+        # Segment into sentences/clauses and align with the anchor diff (linear in practice)
+        def align() -> Dict[str, Any]:
+            segments1, segments2 = compare_engine.segment(text1), compare_engine.segment(text2)
+            return {"a": segments1, "b": segments2, "opcodes": compare_engine.diff_opcodes(segments1, segments2)}
+        with span("compare.align"):
+            aligned = await stages["diff"].run(align)
+        logger.info(f"Aligned {len(aligned['a'])} vs {len(aligned['b'])} segments into {len(aligned['opcodes'])} blocks.")
+        return {**aligned, "from": original1, "to": original2}
 
     except HTTPException as http_exc:
         logger.error(f"HTTPException during extraction: {http_exc.detail}")
         raise http_exc
+    except (StageOverloaded, UploadTooLarge):
+        raise
     except Exception as e:
         logger.exception("Error during file saving, text extraction, or comparison in /compare")
         raise HTTPException(status_code=500, detail=f"Server error during comparison processing: {type(e).__name__}")
     finally:
-        # Clean up temporary files
-        for p in [tmp_path1, tmp_path2]:
-             try:
-                 if p and os.path.exists(p):
-                      os.remove(p)
-                      logger.info(f"Removed temporary comparison file: {p}")
-             except Exception as e:
-                 logger.warning(f"Could not remove temp file {p}: {e}")
-
+        # Don't keep extracting a file for a request that has failed; wait for cancellation before discarding
+        for task in extractions.values():
+            task.cancel() # No-op for finished ones
+        if extractions:
+            await asyncio.gather(*extractions.values(), return_exceptions=True)
+        for upload in uploads:
+            _discard_upload(upload)
+
+@app.post("/compare/", openapi_extra=_multipart_body("file1", "file2"))
+async def compare_documents(request: Request):
+    """Compares two uploaded documents (multipart fields `file1`, `file2`), returning unified-diff lines (one segment per line)."""
+    cmp = await _prepare_comparison(request)
+    with span("compare.render"):
+        diff_lines = await stages["diff"].run(
+            lambda: list(compare_engine.unified_lines(cmp["a"], cmp["b"], cmp["opcodes"], fromfile=cmp["from"], tofile=cmp["to"], n=3))
+        )
+    logger.info(f"Comparison complete. Found {len(diff_lines)} difference lines.")
     return {"comparison_lines": diff_lines}
 
+@app.post("/compare/stream", openapi_extra=_multipart_body("file1", "file2"))
+async def compare_documents_stream(request: Request):
+    """
+    Streams a structured comparison as NDJSON: a header, one record per aligned block
+    (equal blocks as index ranges only, word-level diffs inside replacements), then a summary.
+    """
+    cmp = await _prepare_comparison(request)
+    records = compare_engine.iter_compare(cmp["a"], cmp["b"], cmp["opcodes"], fromfile=cmp["from"], tofile=cmp["to"])
+    return StreamingResponse(compare_engine.iter_ndjson(records), media_type="application/x-ndjson")
+
 
 # --- Dummy /verify Endpoint ---
 @app.get("/verify/")
@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterable, Iterator, Sequence
+
+logger = logging.getLogger("uvicorn.error")
+
+# ---------------- CONFIG ----------------
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "nyay_")
+# Requests slower than this (seconds) dump their span timeline as JSON; 0 disables
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 0))
+SLOW_REQUEST_DUMP_DIR = os.getenv("SLOW_REQUEST_DUMP_DIR", os.path.join("/tmp", "slow_requests"))
+SLOW_REQUEST_MAX_DUMPS = int(os.getenv("SLOW_REQUEST_MAX_DUMPS", 100)) # Oldest dumps are deleted beyond this
+
+# Seconds; covers sub-millisecond cache hits up to multi-minute OCR of large scans
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Sample = Tuple[str, Dict[str, str], float] # (name suffix, labels, value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """A named metric family with a fixed label set; children are keyed by label values. Thread-safe."""
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Sample]:
+        return []
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (requests, pages, tokens)."""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("_total", self._labels(k), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down (in-flight requests)."""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("", self._labels(k), v) for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with _sum and _count, as Prometheus expects."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {} # per child: bucket counts..., sum, count
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                child = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                child[index] += 1
+            child[-2] += value
+            child[-1] += 1
+
+    def count(self, **labels) -> float:
+        with self._lock:
+            child = self._values.get(self._key(labels))
+            return child[-1] if child else 0.0
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out: List[Sample] = []
+        for key, child in items:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, child):
+                cumulative += n
+                out.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            out.append(("_bucket", {**labels, "le": "+Inf"}, child[-1]))
+            out.append(("_sum", labels, child[-2]))
+            out.append(("_count", labels, child[-1]))
+        return out
+
+
+class MetricsRegistry:
+    """
+    Process-wide metric families plus scrape-time collectors (callbacks that report the existing
+    component stats, e.g. cache sizes and stage queue depths), rendered in Prometheus text format.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs) -> Any:
+        full_name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {full_name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, collect: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]) -> None:
+        """Registers a callback yielding (name, help, labels, value) gauge samples at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            samples = list(metric.samples())
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}" for suffix, labels, value in samples)
+
+        collected: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collect in self._collectors:
+            try:
+                for name, help, labels, value in collect():
+                    collected.setdefault(self.prefix + name, (help, []))[1].append((labels, value))
+            except Exception as e: # A broken collector must not take the whole scrape down
+                logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        for name in sorted(collected):
+            help, samples = collected[name]
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module in the process
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("stage_duration_seconds", "Wall time of a pipeline stage", ["stage"])
+http_requests = metrics.counter("http_requests", "HTTP requests by route, method and status", ["route", "method", "status"])
+http_seconds = metrics.histogram("http_request_duration_seconds", "HTTP request latency until the response body is complete", ["route", "method"])
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests currently being served")
+cache_lookups = metrics.counter("cache_lookups", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+
+
+# -------------- Request traces and spans --------------
+class RequestTrace:
+    """Spans recorded while serving one request (shared by the tasks it spawns), for slow-request dumps."""
+
+    def __init__(self, method: str, path: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def record(self, stage: str, started: float, seconds: float, error: Optional[str]) -> None:
+        span = {"stage": stage, "start_ms": round((started - self.started) * 1000, 2), "duration_ms": round(seconds * 1000, 2)}
+        if error:
+            span["error"] = error
+        self.spans.append(span)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times a block into stage_duration_seconds{stage} and the current request's trace (if any)."""
+    started = time.perf_counter()
+    error: Optional[str] = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(stage, started, seconds, error)
+
+
+_dumped: deque = deque()
+_dump_lock = threading.Lock()
+
+
+def _dump_slow_request(trace: RequestTrace, route: str, status: int, seconds: float) -> None:
+    """Writes a slow request's span timeline to SLOW_REQUEST_DUMP_DIR, keeping at most SLOW_REQUEST_MAX_DUMPS files."""
+    payload = {
+        "trace_id": trace.trace_id,
+        "method": trace.method,
+        "path": trace.path,
+        "route": route,
+        "status": status,
+        "duration_ms": round(seconds * 1000, 2),
+        "timestamp": time.time(),
+        "spans": sorted(trace.spans, key=lambda s: s["start_ms"]),
+    }
+    try:
+        os.makedirs(SLOW_REQUEST_DUMP_DIR, exist_ok=True)
+        path = os.path.join(SLOW_REQUEST_DUMP_DIR, f"{int(payload['timestamp'])}_{trace.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        with _dump_lock:
+            _dumped.append(path)
+            while len(_dumped) > max(1, SLOW_REQUEST_MAX_DUMPS):
+                old = _dumped.popleft()
+                if os.path.exists(old):
+                    os.remove(old)
+        logger.warning(f"Slow request {trace.method} {route} took {seconds:.2f}s (status {status}); spans dumped to {path}")
+    except OSError as e:
+        logger.warning(f"Could not write slow-request dump: {e}")
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting requests, timing them until the last body chunk is sent (so streamed
+    responses are measured in full) and tracking in-flight requests. Each request gets a
+    RequestTrace; with SLOW_REQUEST_SECONDS set, requests slower than that dump their spans.
+    Routes are labelled by their path template, never the raw path, to keep cardinality bounded.
+    """
+
+    def __init__(self, app: Any, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope.get("path") in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace(scope.get("method", ""), scope.get("path", ""))
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            _current_trace.reset(token)
+            seconds = time.perf_counter() - trace.started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(route=route, method=trace.method, status=str(status))
+            http_seconds.observe(seconds, route=route, method=trace.method)
+            if SLOW_REQUEST_SECONDS > 0 and seconds >= SLOW_REQUEST_SECONDS:
+                _dump_slow_request(trace, route, status, seconds)
+
+
+def flatten_stats(component: str, stats: Dict[str, Any], help: str = "") -> Iterator[Tuple[str, str, Dict[str, str], float]]:
+    """Turns a component's numeric /stats entries into collector samples named <component>_<key>."""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = float(value)
+        if isinstance(value, (int, float)):
+            yield f"{component}_{key}", help or f"{component} {key} (see /stats)", {}, float(value)
@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+from pdf2image import convert_from_path, pdfinfo_from_path # requires pdf2image (poppler)
+import pytesseract # requires pytesseract
+
+from metrics import metrics
+
+logger = logging.getLogger("uvicorn.error")
+
+# ---------------- CONFIG ----------------
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", _available_cores()))
+OCR_WINDOW_PAGES = int(os.getenv("OCR_WINDOW_PAGES", 2)) # Pages rasterized together by one worker
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", 300)) # Per-document cap; later pages are skipped
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", 60))
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_LANG = os.getenv("OCR_LANG", "hin+eng")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_window_slots: Optional[asyncio.Semaphore] = None
+
+ocr_pages_total = metrics.counter("ocr_pages", "Pages sent to OCR by outcome (ok/empty/error)", ["outcome"])
+ocr_pages_per_second = metrics.histogram("ocr_pages_per_second", "OCR throughput per document run", buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Lazily creates the shared OCR process pool."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, OCR_WORKERS))
+        logger.info(f"Started OCR process pool with {max(1, OCR_WORKERS)} workers")
+    return _pool
+
+
+def _get_window_slots() -> asyncio.Semaphore:
+    """
+    Windows submitted to the pool and not finished yet, across all documents: a couple per worker,
+    so rasterized pages never pile up.
+    """
+    global _window_slots
+    if _window_slots is None:
+        _window_slots = asyncio.Semaphore(max(1, OCR_WORKERS) * 2)
+    return _window_slots
+
+
+def shutdown_pool() -> None:
+    global _pool, _window_slots
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _window_slots = None
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    """Returns the number of pages reported by poppler's pdfinfo."""
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def _ocr_window(pdf_path: str, first_page: int, last_page: int, dpi: int, lang: str, page_timeout: float) -> List[Tuple[int, str, Optional[str]]]:
+    """
+    Worker: rasterizes pages first_page..last_page (1-based, inclusive) and OCRs each one.
+    Only this window's images are ever held in memory. Returns (page_number, text, error) tuples.
+    """
+    results: List[Tuple[int, str, Optional[str]]] = []
+    try:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page)
+    except Exception as e:
+        return [(p, "", f"rasterize: {e}") for p in range(first_page, last_page + 1)]
+    for offset, img in enumerate(images):
+        page_number = first_page + offset
+        try:
+            text = pytesseract.image_to_string(img, lang=lang, timeout=page_timeout)
+            results.append((page_number, text, None))
+        except (pytesseract.TesseractError, RuntimeError) as e: # RuntimeError is raised on timeout
+            results.append((page_number, "", str(e)))
+        finally:
+            img.close()
+    return results
+
+
+def _windows(page_numbers: List[int], window: int) -> List[Tuple[int, int]]:
+    """Groups sorted page numbers into contiguous (first, last) runs of at most `window` pages."""
+    runs: List[Tuple[int, int]] = []
+    for p in sorted(set(page_numbers)):
+        if runs and p == runs[-1][1] + 1 and p - runs[-1][0] < window:
+            runs[-1] = (runs[-1][0], p)
+        else:
+            runs.append((p, p))
+    return runs
+
+
+async def ocr_pages(pdf_path: str, page_numbers: List[int], source_name: str = "",
+                    on_window: Optional[Callable[[List[Tuple[int, str, Optional[str]]]], None]] = None) -> Dict[str, Any]:
+    """
+    OCRs the given 1-based pages of a PDF in parallel across the process pool, rasterizing
+    in small windows so peak memory is independent of page count. At most OCR_MAX_PAGES pages
+    are processed. Returns {"pages": [(page_number, text), ...] in page order, "errors": [...], "skipped": n}.
+    `on_window(results)` is called with each window's (page_number, text, error) tuples as soon as
+    it finishes, so callers can report progress and start on early pages.
+    """
+    wanted = sorted(set(page_numbers))
+    skipped = max(0, len(wanted) - OCR_MAX_PAGES)
+    if skipped:
+        logger.warning(f"OCR page cap reached for {source_name}: processing {OCR_MAX_PAGES} of {len(wanted)} pages")
+        wanted = wanted[:OCR_MAX_PAGES]
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    slots = _get_window_slots()
+
+    def release(fut: asyncio.Future) -> None:
+        slots.release()
+        if not fut.cancelled():
+            fut.exception() # Retrieved here so a window abandoned on timeout does not log a stray error
+
+    async def run_window(first: int, last: int) -> List[Tuple[int, str, Optional[str]]]:
+        await slots.acquire()
+        fut = loop.run_in_executor(pool, _ocr_window, pdf_path, first, last, OCR_DPI, OCR_LANG, OCR_PAGE_TIMEOUT)
+        # The slot is freed only when the worker is really done: a window given up on below keeps
+        # its pages in that process's memory until then, so it still counts against the bound
+        fut.add_done_callback(release)
+        # Backstop in case rasterization itself hangs; tesseract has its own per-page timeout
+        budget = OCR_PAGE_TIMEOUT * (last - first + 1) + 30
+        done, _ = await asyncio.wait({fut}, timeout=budget)
+        if done:
+            result = fut.result()
+        else:
+            result = [(p, "", f"timed out after {budget:.0f}s") for p in range(first, last + 1)]
+        if on_window is not None:
+            on_window(result)
+        return result
+
+    started = time.perf_counter()
+    window_results = await asyncio.gather(*(run_window(f, l) for f, l in _windows(wanted, OCR_WINDOW_PAGES)))
+    if wanted:
+        ocr_pages_per_second.observe(len(wanted) / max(time.perf_counter() - started, 1e-6))
+
+    pages: List[Tuple[int, str]] = []
+    errors: List[str] = []
+    for window in window_results:
+        for page_number, text, error in window:
+            if error:
+                logger.warning(f"OCR error on page {page_number} of {source_name}: {error}")
+                errors.append(f"OCR Page {page_number}: {error}")
+                ocr_pages_total.inc(outcome="error")
+            elif text.strip():
+                pages.append((page_number, text))
+                ocr_pages_total.inc(outcome="ok")
+            else:
+                ocr_pages_total.inc(outcome="empty")
+    pages.sort(key=lambda item: item[0])
+    return {"pages": pages, "errors": errors, "skipped": skipped}
+
+
+async def ocr_pdf(pdf_path: str, source_name: str = "",
+                  on_window: Optional[Callable[[List[Tuple[int, str, Optional[str]]]], None]] = None) -> Dict[str, Any]:
+    """OCRs every page of a PDF (up to OCR_MAX_PAGES). See ocr_pages."""
+    total = await asyncio.get_running_loop().run_in_executor(None, pdf_page_count, pdf_path)
+    return await ocr_pages(pdf_path, list(range(1, total + 1)), source_name, on_window)
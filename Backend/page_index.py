@@ -0,0 +1,124 @@
+import bisect
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple
+
+PROBE_CHARS = 12 # Length of the normalized probes used for fuzzy location
+MAX_PROBES = 16
+MAX_HITS_PER_PROBE = 8
+
+
+def _keep(ch: str) -> bool:
+    # Letters/digits plus combining marks, so Devanagari matras and viramas survive normalization
+    return ch.isalnum() or unicodedata.category(ch).startswith("M")
+
+
+def _fold(ch: str) -> str:
+    # Length-preserving lowercase so normalized offsets stay 1:1 with kept characters
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+def normalize(text: str) -> str:
+    """Lowercased text with all whitespace and punctuation removed (Devanagari-safe)."""
+    return "".join(_fold(ch) for ch in unicodedata.normalize("NFC", text) if _keep(ch))
+
+
+class PageIndex:
+    """
+    Per-document index from normalized character offsets to (page, original offset) and chunk ids.
+    Built once per document; locating a passage is a C-speed substring search over the
+    normalized text, falling back to n-gram probe voting when the LLM has altered the text.
+    """
+
+    def __init__(self, pages: List[Tuple[int, str]]):
+        self._page_numbers: List[int] = []
+        self._page_starts: List[int] = [] # normalized offset where each page begins
+        self._page_lengths: List[int] = [] # original length of each page
+        self._orig_offsets = array("I") # normalized offset -> original offset within its page
+        parts: List[str] = []
+        norm_len = 0
+        for page_number, text in pages:
+            self._page_numbers.append(page_number)
+            self._page_starts.append(norm_len)
+            self._page_lengths.append(len(text))
+            text = unicodedata.normalize("NFC", text)
+            for offset, ch in enumerate(text):
+                if _keep(ch):
+                    parts.append(_fold(ch))
+                    self._orig_offsets.append(offset)
+                    norm_len += 1
+        self._text = "".join(parts)
+        self._chunks: Dict[Any, Dict[str, int]] = {}
+        self._chunks_by_page: Dict[int, List[Tuple[int, int, Any]]] = {}
+
+    # --- chunk registration ---
+    def add_chunk(self, chunk_id: Any, page_number: int, start: int, end: int) -> None:
+        """Records a chunk's original character span on its page."""
+        self._chunks[chunk_id] = {"page": page_number, "start": start, "end": end}
+        bisect.insort(self._chunks_by_page.setdefault(page_number, []), (start, end, chunk_id))
+
+    def chunk_span(self, chunk_id: Any) -> Optional[Dict[str, int]]:
+        return self._chunks.get(chunk_id)
+
+    def chunks_overlapping(self, page_number: int, start: int, end: int) -> List[Any]:
+        return [cid for s, e, cid in self._chunks_by_page.get(page_number, []) if s < end and e > start]
+
+    # --- location ---
+    def _span_from_norm(self, norm_start: int, norm_end: int, exact: bool) -> Dict[str, Any]:
+        page_idx = bisect.bisect_right(self._page_starts, norm_start) - 1
+        page_number = self._page_numbers[page_idx]
+        page_norm_end = self._page_starts[page_idx + 1] if page_idx + 1 < len(self._page_starts) else len(self._text)
+        start = self._orig_offsets[norm_start]
+        last = min(norm_end, page_norm_end) - 1
+        end = self._orig_offsets[last] + 1 if last >= norm_start else start
+        return {
+            "page": page_number,
+            "start": start,
+            "end": min(end, self._page_lengths[page_idx]),
+            "chunk_ids": self.chunks_overlapping(page_number, start, end),
+            "exact": exact,
+        }
+
+    def _fuzzy_start(self, query: str) -> Optional[int]:
+        """Votes on the query's start offset using fixed-length probes sampled across it."""
+        if len(query) < PROBE_CHARS:
+            return None
+        n_probes = min(MAX_PROBES, max(1, len(query) // PROBE_CHARS))
+        stride = (len(query) - PROBE_CHARS) / max(1, n_probes - 1)
+        votes: Counter = Counter()
+        starts: Dict[int, List[int]] = {}
+        for i in range(n_probes):
+            q_off = int(i * stride)
+            probe = query[q_off:q_off + PROBE_CHARS]
+            pos, hits = self._text.find(probe), 0
+            while pos != -1 and hits < MAX_HITS_PER_PROBE:
+                implied = pos - q_off
+                votes[implied // 16] += 1 # bucket so small insertions/deletions still agree
+                starts.setdefault(implied // 16, []).append(implied)
+                pos, hits = self._text.find(probe, pos + 1), hits + 1
+        if not votes:
+            return None
+        bucket, count = votes.most_common(1)[0]
+        if count < min(2, n_probes):
+            return None
+        implied_starts = sorted(starts[bucket])
+        return max(0, implied_starts[len(implied_starts) // 2])
+
+    def locate(self, text: str) -> Optional[Dict[str, Any]]:
+        """Finds a passage, tolerating whitespace/punctuation differences. Returns its page, span and chunk ids."""
+        query = normalize(text)
+        if not query or not self._text:
+            return None
+        pos = self._text.find(query)
+        if pos != -1:
+            return self._span_from_norm(pos, pos + len(query), exact=True)
+        start = self._fuzzy_start(query)
+        if start is None:
+            return None
+        return self._span_from_norm(start, min(len(self._text), start + len(query)), exact=False)
+
+    def page_of(self, text: str, default: int = 1) -> int:
+        span = self.locate(text)
+        return span["page"] if span else default
@@ -0,0 +1,352 @@
+import os
+import json
+import uuid
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Type
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+DTYPES = {"int8": np.int8, "float16": np.float16, "float32": np.float32}
+SCORE_BLOCK_ROWS = 8192 # Rows upcast to float32 per matmul, bounding the scratch memory of a query
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Row-normalized vectors as (codes, per-row scales). int8 is symmetric per row (x ~= code * scale);
+    float16/float32 are stored as-is with no scales.
+    """
+    if dtype != "int8":
+        return np.ascontiguousarray(matrix, dtype=DTYPES[dtype]), None
+    scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _gather(array: np.ndarray, rows: np.ndarray, extra: np.ndarray) -> np.ndarray:
+    """`array[rows]` followed by `extra`, written into a single new allocation."""
+    out = np.empty((len(rows) + len(extra),) + array.shape[1:], dtype=array.dtype)
+    np.take(array, rows, axis=0, out=out[:len(rows)])
+    out[len(rows):] = extra
+    return out
+
+
+@dataclass(frozen=True)
+class _Arrays:
+    """One immutable generation of the store; searches read it without locking, writers swap it."""
+    ids: Tuple[str, ...]
+    documents: Tuple[Document, ...]
+    codes: np.ndarray # (n, dim) int8 / float16 / float32
+    scales: Optional[np.ndarray] # (n,) float32, int8 only
+    full: Optional[np.ndarray] # (n, dim) float32 kept for re-scoring, else None
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    In-process cosine vector store over contiguous NumPy arrays with scalar-quantized storage
+    (int8 with a per-row scale, or float16): vectorized brute-force top-k, optionally re-scoring an
+    oversampled candidate set against retained float32 vectors. Stand-in for the per-document in-memory
+    Qdrant collection (`as_retriever`, `similarity_search*`); snapshots load zero-copy via memory maps.
+    """
+
+    def __init__(self, embeddings: Embeddings, dtype: str = "int8", rescore_oversample: int = 0):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {sorted(DTYPES)}")
+        self._embeddings = embeddings
+        self.dtype = dtype
+        self.rescore_oversample = rescore_oversample
+        self._lock = threading.Lock() # Serializes writers only
+        self._state: Optional[_Arrays] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def __len__(self) -> int:
+        return len(self._state.ids) if self._state is not None else 0
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._state.codes.shape[1] if self._state is not None else None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Resident vector storage per chunk (codes, scale and any float32 re-scoring copy)."""
+        if self._state is None:
+            return 0
+        state = self._state
+        return state.codes.itemsize * state.codes.shape[1] + (4 if state.scales is not None else 0) + \
+            (state.full.itemsize * state.full.shape[1] if state.full is not None else 0)
+
+    def nbytes(self) -> int:
+        """Bytes held by the vector arrays (memory-mapped arrays count, though the OS may not keep them resident)."""
+        state = self._state
+        if state is None:
+            return 0
+        return sum(a.nbytes for a in (state.codes, state.scales, state.full) if a is not None)
+
+    # --- Writes ---
+
+    @classmethod
+    def from_vectors(cls, ids: List[str], documents: List[Document], vectors: List[List[float]], embeddings: Embeddings,
+                     dtype: str = "int8", rescore_oversample: int = 0) -> "QuantizedVectorStore":
+        store = cls(embeddings, dtype=dtype, rescore_oversample=rescore_oversample)
+        store.upsert(ids, documents, vectors)
+        return store
+
+    @classmethod
+    def from_texts(cls: Type["QuantizedVectorStore"], texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> "QuantizedVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        documents = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        return cls.from_vectors(ids, documents, embedding.embed_documents(list(texts)), embedding, **kwargs)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        documents = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        self.upsert(ids, documents, self._embeddings.embed_documents(texts))
+        return ids
+
+    def upsert(self, ids: List[str], documents: List[Document], vectors: List[List[float]]) -> None:
+        """Inserts points, replacing any with the same id (vector and payload)."""
+        if not ids:
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        codes, scales = quantize(matrix, self.dtype)
+        full = matrix if self.rescore_oversample > 0 and self.dtype != "float32" else None
+        with self._lock:
+            state = self._state
+            if state is None:
+                self._state = _Arrays(tuple(ids), tuple(documents), codes, scales, full)
+                return
+            if matrix.shape[1] != state.codes.shape[1]:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match the store's {state.codes.shape[1]}")
+            position = {point_id: i for i, point_id in enumerate(state.ids)}
+            replace = [(position[point_id], j) for j, point_id in enumerate(ids) if point_id in position]
+            append = [j for j, point_id in enumerate(ids) if point_id not in position]
+            # Copies, so searches still running against the old generation (or a read-only memory map) are untouched
+            new_codes = np.concatenate([state.codes, codes[append]])
+            new_scales = np.concatenate([state.scales, scales[append]]) if scales is not None else None
+            new_full = np.concatenate([state.full, full[append]]) if full is not None and state.full is not None else None
+            new_docs = list(state.documents) + [documents[j] for j in append]
+            for row, j in replace:
+                new_codes[row] = codes[j]
+                if new_scales is not None:
+                    new_scales[row] = scales[j]
+                if new_full is not None:
+                    new_full[row] = full[j]
+                new_docs[row] = documents[j]
+            self._state = _Arrays(state.ids + tuple(ids[j] for j in append), tuple(new_docs), new_codes, new_scales, new_full)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = set(ids)
+        with self._lock:
+            state = self._state
+            if state is None:
+                return False
+            keep = np.asarray([i for i, point_id in enumerate(state.ids) if point_id not in drop], dtype=np.int64)
+            if len(keep) == len(state.ids):
+                return False
+            self._state = _Arrays(
+                tuple(state.ids[i] for i in keep),
+                tuple(state.documents[i] for i in keep),
+                state.codes[keep],
+                state.scales[keep] if state.scales is not None else None,
+                state.full[keep] if state.full is not None else None,
+            )
+        return True
+
+    def derive(self, keep_ids: List[str], keep_documents: List[Document],
+               ids: List[str], documents: List[Document], vectors: List[List[float]]) -> "QuantizedVectorStore":
+        """
+        A new store with this one's `keep_ids` points (stored codes gathered by id, not re-quantized, under
+        `keep_documents`) followed by new points. This store is not modified; no array is copied twice.
+        """
+        derived = type(self)(self._embeddings, dtype=self.dtype, rescore_oversample=self.rescore_oversample)
+        state = self._state
+        if state is None or not keep_ids:
+            derived.upsert(ids, documents, vectors)
+            return derived
+        position = {point_id: i for i, point_id in enumerate(state.ids)}
+        rows = np.asarray([position[point_id] for point_id in keep_ids], dtype=np.int64)
+        dim = state.codes.shape[1]
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32)) if ids else np.empty((0, dim), dtype=np.float32)
+        if matrix.shape[1] != dim:
+            raise ValueError(f"Vector dimension {matrix.shape[1]} does not match the store's {dim}")
+        codes, scales = quantize(matrix, self.dtype)
+        derived._state = _Arrays(
+            tuple(keep_ids) + tuple(ids),
+            tuple(keep_documents) + tuple(documents),
+            _gather(state.codes, rows, codes),
+            _gather(state.scales, rows, scales) if state.scales is not None else None,
+            _gather(state.full, rows, matrix) if state.full is not None else None,
+        )
+        return derived
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors by point id: exact if float32 copies are kept, else dequantized."""
+        state = self._state
+        if state is None:
+            return {}
+        position = {point_id: i for i, point_id in enumerate(state.ids)}
+        rows = [(point_id, position[point_id]) for point_id in ids if point_id in position]
+        out: Dict[str, List[float]] = {}
+        for point_id, row in rows:
+            if state.full is not None:
+                out[point_id] = state.full[row].tolist()
+            elif state.scales is not None:
+                out[point_id] = (state.codes[row].astype(np.float32) * state.scales[row]).tolist()
+            else:
+                out[point_id] = state.codes[row].astype(np.float32).tolist()
+        return out
+
+    # --- Search ---
+
+    def _scores(self, state: _Arrays, queries: np.ndarray) -> np.ndarray:
+        """(n, m) cosine scores of every stored row against m unit query columns (dim, m)."""
+        n = len(state.ids)
+        if state.codes.dtype == np.float32:
+            return state.codes @ queries
+        scores = np.empty((n, queries.shape[1]), dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            block = state.codes[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ queries
+        if state.scales is not None:
+            scores *= state.scales[:, None]
+        return scores
+
+    def _search(self, state: _Arrays, embeddings: List[List[float]], k: int) -> List[List[Tuple[int, float]]]:
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries = (queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)).T
+        all_scores = self._scores(state, queries)
+        n = all_scores.shape[0]
+        rescore = state.full is not None and self.rescore_oversample > 0
+        candidates = min(n, k * self.rescore_oversample) if rescore else min(n, k)
+        if candidates == 0:
+            return [[] for _ in embeddings]
+        if candidates < n:
+            tops = np.argpartition(-all_scores, candidates - 1, axis=0)[:candidates].T
+        else:
+            tops = np.broadcast_to(np.arange(n), (queries.shape[1], n))
+        results = []
+        for column, top in enumerate(tops):
+            scores = state.full[top] @ queries[:, column] if rescore else all_scores[top, column]
+            order = np.argsort(-scores, kind="stable")[:k]
+            results.append([(int(top[i]), float(scores[i])) for i in order])
+        return results
+
+    def search_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, cosine score) pairs per query, highest first; all queries scored in one pass over the codes."""
+        state = self._state
+        if state is None or k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        return self._search(state, embeddings, k)
+
+    def search_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine score) pairs, highest first."""
+        return self.search_vectors([embedding], k)[0]
+
+    @staticmethod
+    def _document(state: _Arrays, row: int) -> Document:
+        # Fresh objects, as a Qdrant query would return: context assembly writes into metadata
+        doc = state.documents[row]
+        return Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+
+    def documents(self) -> List[Document]:
+        """Every stored document, in row order."""
+        state = self._state
+        return [self._document(state, row) for row in range(len(state.ids))] if state is not None else []
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Document]]:
+        """Batched `similarity_search_by_vector`: one vectorized search for several query embeddings."""
+        state = self._state
+        if state is None or k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        return [[self._document(state, row) for row, _ in hits] for hits in self._search(state, embeddings, k)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        state = self._state
+        if state is None or k <= 0:
+            return []
+        return [(self._document(state, row), score) for row, score in self._search(state, [embedding], k)[0]]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0 # Cosine in [-1, 1] to [0, 1]
+
+    # --- Snapshots ---
+
+    def save(self, path: str) -> None:
+        """
+        Writes a snapshot directory (codes/scales/full .npy plus payload.json), replacing any previous
+        one by renaming a fully written staging directory over it, so a half-written snapshot is never visible.
+        """
+        state = self._state
+        if state is None:
+            raise ValueError("Cannot snapshot an empty store")
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent, prefix=".snapshot-")
+        try:
+            np.save(os.path.join(staging, "codes.npy"), state.codes)
+            if state.scales is not None:
+                np.save(os.path.join(staging, "scales.npy"), state.scales)
+            if state.full is not None:
+                np.save(os.path.join(staging, "full.npy"), state.full)
+            with open(os.path.join(staging, "payload.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "dtype": self.dtype,
+                    "rescore_oversample": self.rescore_oversample,
+                    "ids": list(state.ids),
+                    "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in state.documents],
+                }, f, ensure_ascii=False)
+            if os.path.isdir(path):
+                retired = f"{staging}.old"
+                os.replace(path, retired)
+                os.replace(staging, path)
+                shutil.rmtree(retired, ignore_errors=True)
+            else:
+                os.replace(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str, embeddings: Embeddings, mmap: bool = True) -> "QuantizedVectorStore":
+        """Opens a snapshot; with `mmap` the arrays are read-only memory maps (zero-copy, paged in on demand)."""
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "payload.json"), encoding="utf-8") as f:
+            payload = json.load(f)
+        optional = lambda name: np.load(os.path.join(path, name), mmap_mode=mode) if os.path.exists(os.path.join(path, name)) else None
+        store = cls(embeddings, dtype=payload["dtype"], rescore_oversample=payload["rescore_oversample"])
+        store._state = _Arrays(
+            tuple(payload["ids"]),
+            tuple(Document(page_content=d["page_content"], metadata=d["metadata"]) for d in payload["documents"]),
+            np.load(os.path.join(path, "codes.npy"), mmap_mode=mode),
+            optional("scales.npy"),
+            optional("full.npy"),
+        )
+        return store
@@ -0,0 +1,102 @@
+import time
+import logging
+import importlib
+import threading
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+logger = logging.getLogger("uvicorn.error")
+
+# (nltk.data resource path, downloader package id) needed by the Unstructured loader
+NLTK_RESOURCES: List[Tuple[str, str]] = [
+    ("tokenizers/punkt", "punkt"),
+    ("tokenizers/punkt_tab", "punkt_tab"),
+    ("taggers/averaged_perceptron_tagger", "averaged_perceptron_tagger"),
+]
+
+
+def ensure_nltk_data(download_dir: str, allow_download: bool = True) -> Dict[str, Any]:
+    """
+    Looks for each NLTK resource locally (NLTK_DATA, the default paths and download_dir) and only
+    attempts a download for the ones that are missing. Returns which were found, fetched or missing.
+    """
+    import nltk
+    if download_dir not in nltk.data.path:
+        nltk.data.path.append(download_dir)
+    status: Dict[str, Any] = {"found": [], "downloaded": [], "missing": []}
+    for resource, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource)
+            status["found"].append(package)
+            continue
+        except LookupError:
+            pass
+        if allow_download:
+            try:
+                if nltk.download(package, download_dir=download_dir, quiet=True):
+                    status["downloaded"].append(package)
+                    continue
+            except Exception as e:
+                logger.warning(f"NLTK download of {package} failed: {e}")
+        status["missing"].append(package)
+    if status["missing"]:
+        logger.warning(f"NLTK data not available: {status['missing']} (Unstructured loader may degrade)")
+    return status
+
+
+def preload_modules(names: List[str]) -> Dict[str, Any]:
+    """Imports optional heavy modules ahead of first use; a missing one is reported, not raised."""
+    timings: Dict[str, Any] = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            timings[name] = f"unavailable: {e}"
+    return timings
+
+
+class Readiness:
+    """Tracks background warm-up of the app's components. Ready once every required one has loaded."""
+
+    def __init__(self, required: List[str]):
+        self.required = list(required)
+        self._started = time.monotonic()
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._ready_after_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def run(self, name: str, fn: Callable[[], Any]) -> None:
+        """Runs one warm-up step and records its outcome and duration."""
+        started = time.perf_counter()
+        try:
+            detail = fn()
+            ok = True
+        except Exception as e:
+            logger.exception(f"Warm-up step '{name}' failed")
+            detail, ok = str(e), False
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            self._components[name] = {"ok": ok, "ms": elapsed_ms, "detail": detail}
+            if self._ready_after_ms is None and self._is_ready():
+                self._ready_after_ms = round((time.monotonic() - self._started) * 1000, 1)
+        logger.info(f"Warm-up step '{name}' {'done' if ok else 'FAILED'} in {elapsed_ms} ms")
+
+    def _is_ready(self) -> bool:
+        return all(self._components.get(name, {}).get("ok") for name in self.required)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._is_ready()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._is_ready(),
+                "required": self.required,
+                "ready_after_ms": self._ready_after_ms,
+                "uptime_s": round(time.monotonic() - self._started, 1),
+                "components": dict(self._components),
+            }
+
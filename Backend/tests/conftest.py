@@ -0,0 +1,86 @@
+"""
+Shared setup: the app runs offline against the stub LLM (LLM_BACKEND=stub) and the benchmarks'
+hashing embeddings, with caches in a throwaway directory. The environment must be set before `import main`.
+"""
+import os
+import sys
+import tempfile
+import textwrap
+from typing import List
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "benchmarks")]
+
+_WORKDIR = tempfile.mkdtemp(prefix="nyay_tests_")
+os.environ.update({
+    "LLM_BACKEND": "stub",
+    "WARMUP_ON_STARTUP": "0",
+    "NLTK_AUTO_DOWNLOAD": "0",
+    "DOC_CACHE_DIR": os.path.join(_WORKDIR, "doc_cache"),
+    "EMBED_CACHE_DIR": os.path.join(_WORKDIR, "embedding_cache"),
+})
+
+CONTRACT_PAGES = [
+    "This Rental Agreement is made between the Owner and the Tenant. The Tenant shall pay a monthly rent of "
+    "Rs. 20,000 on the fifth day of every month. Termination of this Agreement requires thirty days written notice.",
+    "The governing law of this Agreement is the law of India. The liability of either party shall not exceed "
+    "one month of rent. The premises shall be used for residential purposes only.",
+]
+
+
+def pdf_bytes(pages: List[str]) -> bytes:
+    """A minimal PDF whose pages carry a real (Helvetica, ASCII) text layer."""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for text in pages:
+        body = "BT /F1 10 Tf 13 TL 50 750 Td " + " ".join(f"({escape(line)}) Tj T*" for line in textwrap.wrap(text, 90)) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    import main
+    from fixtures import HashingEmbeddings
+    main.embeddings._base = HashingEmbeddings() # No model download
+    yield main
+    main._shutdown_workers()
+
+
+@pytest.fixture
+async def client(app_main):
+    import httpx
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://test", timeout=30) as c:
+        yield c
+
+
+@pytest.fixture
+async def document_id(client):
+    response = await client.post("/upload/", files={"file": ("contract.pdf", pdf_bytes(CONTRACT_PAGES), "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()["document_id"]
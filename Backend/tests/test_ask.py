@@ -0,0 +1,20 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_answer_has_the_same_shape_as_a_fresh_one(client, document_id):
+    question = {"document_id": document_id, "question": "What is the monthly rent?"}
+    first = await client.post("/ask/", json=question)
+    second = await client.post("/ask/", json=question)
+    assert first.status_code == second.status_code == 200
+    assert (first.json()["cached"], second.json()["cached"]) == (False, True)
+    assert sorted(first.json()) == sorted(second.json()) # Clients read the same keys on both paths
+    assert second.json()["answer"] == first.json()["answer"] and second.json()["sources"] == first.json()["sources"]
+    assert first.json()["sources"]
+    assert second.json()["context"] == first.json()["context"] and first.json()["context"]["context_tokens"] > 0
+
+
+async def test_unknown_document_is_404(client, app_main):
+    response = await client.post("/ask/", json={"document_id": "missing", "question": "What is the rent?"})
+    assert response.status_code == 404
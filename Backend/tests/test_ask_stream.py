@@ -0,0 +1,118 @@
+import json
+from typing import List, Tuple, Dict, Any
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def _events(body: str) -> List[Tuple[str, Dict[str, Any]]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class _RecordingChain:
+    """Wraps the compiled QA chain so a test sees whether the endpoint closes the upstream stream itself (not via GC)."""
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.streams: List["_RecordingStream"] = []
+
+    def astream(self, inputs):
+        stream = _RecordingStream(self.chain.astream(inputs))
+        self.streams.append(stream)
+        return stream
+
+
+class _RecordingStream:
+    def __init__(self, inner):
+        self.inner = inner
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.inner.__anext__()
+
+    async def aclose(self):
+        self.closed = True
+        await self.inner.aclose()
+
+
+class _FailingChain:
+    """Streams one token, then fails the way an upstream API error would."""
+
+    def astream(self, inputs):
+        async def stream():
+            yield "- आंशिक"
+            raise RuntimeError("upstream connection reset")
+        return stream()
+
+
+async def test_stream_emits_sources_then_tokens_then_done(client, document_id):
+    response = await client.post("/ask/stream", json={"document_id": document_id, "question": "How can the contract be terminated?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    names = [name for name, _ in events]
+
+    assert names[0] == "sources" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3 # Several streamed tokens from the stub model
+    assert events[0][1]["sources"] and events[0][1]["cached"] is False
+
+    done = events[-1][1]
+    assert done["answer"] == "".join(data["text"] for name, data in events if name == "token").strip()
+    assert done["tokens"] == len(names) - 2
+    assert done["context"]["context_tokens"] > 0 and done["context"]["chunks"] >= 1 # Retrieval/context assembly summary
+    for timing in ("retrieval_ms", "ttft_ms", "total_ms"):
+        assert done[timing] is not None and done[timing] >= 0
+    assert done["ttft_ms"] <= done["total_ms"]
+
+
+async def test_client_disconnect_closes_upstream_stream(app_main, document_id, monkeypatch):
+    """The client goes away after the first token: generation stops and the upstream LLM stream is closed."""
+    chain = _RecordingChain(app_main.qa_chain)
+    monkeypatch.setattr(app_main, "qa_chain", chain)
+    gone = False
+
+    async def disconnecting_app(scope, receive, send):
+        async def send_wrapper(message):
+            nonlocal gone
+            await send(message)
+            if message["type"] == "http.response.body" and b"event: token" in message.get("body", b""):
+                gone = True
+
+        async def receive_wrapper():
+            if gone:
+                return {"type": "http.disconnect"}
+            return await receive()
+
+        await app_main.app(scope, receive_wrapper, send_wrapper)
+
+    cancelled_before = app_main._stream_counts["cancelled"]
+    transport = httpx.ASGITransport(app=disconnecting_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as c:
+        response = await c.post("/ask/stream", json={"document_id": document_id, "question": "कौन सा कानून लागू होगा?"})
+    names = [name for name, _ in _events(response.text)]
+
+    assert names == ["sources", "token"] # Nothing after the disconnect, in particular no "done"
+    assert len(chain.streams) == 1 and chain.streams[0].closed
+    assert app_main.gateway.stats()["in_flight"] == 0 # The gateway slot was given back
+    assert app_main._stream_counts["cancelled"] > cancelled_before
+
+
+async def test_error_mid_stream_ends_with_an_error_event(app_main, client, document_id, monkeypatch):
+    monkeypatch.setattr(app_main, "qa_chain", _FailingChain())
+    failed_before = app_main._stream_counts["failed"]
+    response = await client.post("/ask/stream", json={"document_id": document_id, "question": "Who pays the security deposit?"})
+    assert response.status_code == 200 # Headers were already sent when generation failed
+    events = _events(response.text)
+
+    assert [name for name, _ in events] == ["sources", "token", "error"] # Not a silently truncated stream
+    assert "upstream connection reset" in events[-1][1]["detail"]
+    assert app_main._stream_counts["failed"] == failed_before + 1
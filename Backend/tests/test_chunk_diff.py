@@ -0,0 +1,42 @@
+from chunk_diff import chunk_key, chunk_points, diff_chunks
+
+TEXTS = ["Rent is due on the fifth.", "Deposit is two months.", "Notice is thirty days.", "Law of India applies."]
+
+
+def _metadatas(texts, page=1):
+    metadatas, start = [], 0
+    for i, text in enumerate(texts):
+        metadatas.append({"chunk_id": i, "page_number": page, "start_index": start})
+        start += len(text) + 1
+    return metadatas
+
+
+def _parent(texts):
+    keys = [chunk_key(t) for t in texts]
+    return chunk_points(keys, [f"p{i}" for i in range(len(texts))], _metadatas(texts))
+
+
+def test_key_ignores_whitespace_only():
+    assert chunk_key("Rent is  due\non the fifth.") == chunk_key(" Rent is due on the fifth. ")
+    assert chunk_key("Rent is due on the fifth.") != chunk_key("Rent is due on the sixth.")
+
+
+def test_mid_document_insertion_embeds_only_the_new_chunk():
+    texts = TEXTS[:2] + ["Pets are not allowed."] + TEXTS[2:]
+    diff = diff_chunks(_parent(TEXTS), [chunk_key(t) for t in texts], _metadatas(texts))
+
+    assert diff.added == [2]
+    assert diff.reused == {0: "p0", 1: "p1", 3: "p2", 4: "p3"}
+    assert diff.moved == [3, 4] # Shifted chunk ids and offsets after the insertion
+    assert diff.removed == []
+    assert diff.stats() == {"reused": 4, "moved": 2, "embedded": 1, "deleted": 0}
+
+
+def test_replaced_chunk_is_deleted_and_repeats_pair_up_in_order():
+    parent = _parent(["Same clause.", "Old clause.", "Same clause."])
+    texts = ["Same clause.", "New clause.", "Same clause.", "Same clause."]
+    diff = diff_chunks(parent, [chunk_key(t) for t in texts], _metadatas(texts))
+
+    assert diff.reused == {0: "p0", 2: "p2"} # Each stored duplicate is reused once
+    assert diff.added == [1, 3]
+    assert diff.removed == ["p1"]
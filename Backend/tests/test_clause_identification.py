@@ -0,0 +1,45 @@
+import pytest
+from langchain_core.documents import Document
+
+pytestmark = pytest.mark.anyio
+
+FILLER = "The parties record this ordinary sentence for padding purposes. "
+TERMINATION = "Termination of this Agreement requires thirty days written notice."
+GOVERNING_LAW = "The governing law of this Agreement is the law of India."
+LIABILITY = "The liability of either party shall not exceed the fees paid."
+
+
+def _page(number: int, text: str) -> Document:
+    return Document(page_content=text, metadata={"page_number": number, "source": "contract.pdf"})
+
+
+async def test_clauses_map_reduce_over_windows_and_split_pages(app_main, monkeypatch):
+    """Several windows, an oversized page cut into overlapping pieces, and merge/dedupe of repeated clauses."""
+    monkeypatch.setattr(app_main, "CLAUSE_WINDOW_TOKENS", 200) # ~800 characters of Latin text
+    monkeypatch.setattr(app_main, "CLAUSE_WINDOW_OVERLAP_CHARS", 800)
+    oversized = FILLER * 15 + LIABILITY + " " + FILLER * 21 # ~2400 chars; the clause sits inside two pieces' overlap
+    assert 800 < oversized.index(LIABILITY) and oversized.index(LIABILITY) + len(LIABILITY) < 1600
+    documents = [
+        _page(1, FILLER * 6 + TERMINATION),
+        _page(2, FILLER * 6 + GOVERNING_LAW),
+        _page(3, oversized),
+        _page(4, FILLER * 3 + TERMINATION), # Same clause again on a later page
+    ]
+
+    windows = app_main._clause_windows(documents)
+    assert len(windows) >= 4
+    assert [w["docs"][0].metadata["page_number"] for w in windows][:2] == [1, 2]
+    assert sum(LIABILITY in w["text"] for w in windows) == 2
+    assert sum(d.metadata["page_number"] == 3 for w in windows for d in w["docs"]) == 3 # Page 3 cut into three pieces
+
+    clauses = await app_main.identify_clauses_llm(documents, mode="full") # Every window, no pre-classifier
+
+    by_type = {}
+    for clause in clauses:
+        by_type.setdefault(clause["type"], []).append(clause)
+    assert sorted(by_type) == ["Governing Law", "Liability", "Termination"]
+    assert all(len(found) == 1 for found in by_type.values()) # Overlap and repeated pages are merged
+    assert (by_type["Termination"][0]["text"], by_type["Termination"][0]["page"]) == (TERMINATION, 1)
+    assert (by_type["Governing Law"][0]["text"], by_type["Governing Law"][0]["page"]) == (GOVERNING_LAW, 2)
+    assert (by_type["Liability"][0]["text"], by_type["Liability"][0]["page"]) == (LIABILITY, 3)
+    assert all(clause["explanation_en"] for clause in clauses)
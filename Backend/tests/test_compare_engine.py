@@ -0,0 +1,68 @@
+import compare_engine
+
+A = ["Alpha one.", "Bravo two.", "Charlie three.", "Delta four.", "Echo five."]
+
+
+def _covers_both_sides(a, b, opcodes) -> bool:
+    """Opcodes tile both sequences in order, and 'equal' blocks really are equal."""
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if (i1, j1) != (i, j):
+            return False
+        if tag == "equal" and [s.lower() for s in a[i1:i2]] != [s.lower() for s in b[j1:j2]]:
+            return False
+        i, j = i2, j2
+    return (i, j) == (len(a), len(b))
+
+
+def test_segments_split_on_latin_and_hindi_terminators():
+    text = "पहला वाक्य। दूसरा वाक्य॥ Third; fourth.\n\nFifth"
+    assert compare_engine.segment(text) == ["पहला वाक्य।", "दूसरा वाक्य॥", "Third;", "fourth.", "Fifth"]
+
+
+def test_moved_segment_is_a_delete_and_an_insert_around_anchors():
+    b = ["Alpha one.", "Charlie three.", "Delta four.", "Bravo two.", "Echo five."]
+    assert compare_engine.diff_opcodes(A, b) == [
+        ("equal", 0, 1, 0, 1),
+        ("delete", 1, 2, 1, 1),
+        ("equal", 2, 4, 1, 3),
+        ("insert", 4, 4, 3, 4),
+        ("equal", 4, 5, 4, 5),
+    ]
+
+
+def test_edited_segment_is_a_replace_with_word_diff():
+    a = ["Rent is due monthly.", "The tenant pays Rs. 20,000 per month.", "Notice is thirty days."]
+    b = ["rent  is due MONTHLY.", "The tenant pays Rs. 25,000 per month.", "Notice is thirty days."]
+    opcodes = compare_engine.diff_opcodes(a, b)
+    assert opcodes == [("equal", 0, 1, 0, 1), ("replace", 1, 2, 1, 2), ("equal", 2, 3, 2, 3)] # Case/spacing ignored
+
+    records = list(compare_engine.iter_compare(a, b, opcodes, "v1.pdf", "v2.pdf"))
+    assert records[0] == {"type": "header", "from": "v1.pdf", "to": "v2.pdf", "segments_a": 3, "segments_b": 3}
+    assert records[2]["words"] == [
+        {"op": "equal", "text": "The tenant pays Rs."},
+        {"op": "delete", "text": "20,000"},
+        {"op": "insert", "text": "25,000"},
+        {"op": "equal", "text": "per month."},
+    ]
+    summary = records[-1]
+    assert (summary["type"], summary["equal"], summary["replace"], summary["delete"], summary["insert"]) == ("summary", 2, 1, 0, 0)
+
+    assert "".join(compare_engine.unified_lines(a, b, opcodes, "v1.pdf", "v2.pdf", n=1)) == (
+        "--- v1.pdf\n+++ v2.pdf\n@@ -1,3 +1,3 @@\n"
+        " Rent is due monthly.\n-The tenant pays Rs. 20,000 per month.\n+The tenant pays Rs. 25,000 per month.\n Notice is thirty days.\n"
+    )
+
+
+def test_repeated_boilerplate_falls_back_to_histogram_anchors():
+    a = ["Signed.", "Clause one.", "Signed.", "Clause two.", "Signed."]
+    b = ["Signed.", "Clause one changed.", "Signed.", "Signed.", "Clause two.", "Signed."]
+    opcodes = compare_engine.diff_opcodes(a, b)
+    assert _covers_both_sides(a, b, opcodes)
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == 4
+
+
+def test_identical_inputs_produce_no_unified_diff():
+    opcodes = compare_engine.diff_opcodes(A, list(A))
+    assert opcodes == [("equal", 0, 5, 0, 5)]
+    assert list(compare_engine.unified_lines(A, A, opcodes)) == []
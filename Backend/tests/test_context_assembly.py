@@ -0,0 +1,72 @@
+from langchain_core.documents import Document
+
+from context_assembly import assemble_context, NEAR_DUPLICATE_JACCARD
+
+PAGE = ("The Tenant shall pay the monthly rent on the fifth day. Late payment attracts interest at twelve percent. "
+        "The deposit is refundable on vacating the premises.")
+
+
+def _words(text: str) -> int:
+    return len(text.split())
+
+
+def _chunk(text: str, page: int = 1, start: int = None, chunk_id: int = 0) -> Document:
+    metadata = {"page_number": page, "chunk_id": chunk_id}
+    if start is not None:
+        metadata.update({"start_index": start, "end_index": start + len(text)})
+    return Document(page_content=text, metadata=metadata)
+
+
+def _sentence(n_words: int, replaced_tail: int = 0) -> str:
+    words = [f"w{i}" for i in range(n_words - replaced_tail)] + [f"x{i}" for i in range(replaced_tail)]
+    return " ".join(words)
+
+
+def test_overlapping_chunks_of_a_page_merge_into_one_span():
+    first, second = _chunk(PAGE[0:60], start=0, chunk_id=0), _chunk(PAGE[40:100], start=40, chunk_id=1)
+    docs, stats = assemble_context([second, first], token_budget=1000, max_chunks=10, estimate=_words)
+    assert len(docs) == 1
+    assert docs[0].page_content == PAGE[0:100] # The shared 20 characters are sent once
+    assert (docs[0].metadata["start_index"], docs[0].metadata["end_index"]) == (0, 100)
+    assert docs[0].metadata["chunk_ids"] == [0, 1]
+    assert (stats["chunks"], stats["spans"], stats["merged_chunks"]) == (2, 1, 1)
+    assert stats["tokens_saved"] == _words(PAGE[0:60]) + _words(PAGE[40:100]) - _words(PAGE[0:100])
+
+
+def test_adjacent_chunks_join_and_a_chunk_can_bridge_two_spans():
+    first_end, second_end = PAGE.index("day.") + 4, PAGE.index("percent.") + 8 # Sentence ends; a space follows each
+    head, tail = _chunk(PAGE[:first_end], start=0, chunk_id=0), _chunk(PAGE[second_end + 1:], start=second_end + 1, chunk_id=2)
+    bridge = _chunk(PAGE[first_end + 1:second_end], start=first_end + 1, chunk_id=1) # One stripped space from each neighbour
+    docs, stats = assemble_context([head, tail, bridge], token_budget=1000, max_chunks=10, estimate=_words)
+    assert [d.page_content for d in docs] == [PAGE]
+    assert docs[0].metadata["chunk_ids"] == [0, 1, 2]
+    assert stats["spans"] == 1
+
+
+def test_chunks_on_different_pages_stay_apart_in_document_order():
+    docs, stats = assemble_context(
+        [_chunk(PAGE[0:60], page=2, start=0, chunk_id=5), _chunk(PAGE[40:100], page=1, start=40, chunk_id=1)],
+        token_budget=1000, max_chunks=10, estimate=_words)
+    assert [d.metadata["page_number"] for d in docs] == [1, 2]
+    assert stats["merged_chunks"] == 0
+
+
+def test_near_duplicate_cutoff_is_inclusive_at_the_jaccard_threshold():
+    assert NEAR_DUPLICATE_JACCARD == 0.85
+    original = _chunk(_sentence(39), page=1, chunk_id=0)
+    at_threshold = _chunk(_sentence(39, replaced_tail=3), page=4, chunk_id=1) # Jaccard 34/40 = 0.85
+    below = _chunk(_sentence(39, replaced_tail=4), page=6, chunk_id=2) # Jaccard 33/41 ~ 0.80
+    docs, stats = assemble_context([original, at_threshold, below], token_budget=1000, max_chunks=10, estimate=_words)
+    assert [d.metadata["chunk_id"] for d in docs] == [0, 2]
+    assert stats["near_duplicates"] == 1
+
+
+def test_packing_skips_what_does_not_fit_but_keeps_smaller_lower_ranked_chunks():
+    big = _chunk(" ".join(["long"] * 50), page=1, chunk_id=0)
+    too_big = _chunk(" ".join(["huge"] * 40), page=2, chunk_id=1)
+    small = _chunk("short passage here", page=3, chunk_id=2)
+    docs, stats = assemble_context([big, too_big, small], token_budget=60, max_chunks=10, estimate=_words)
+    assert [d.metadata["chunk_id"] for d in docs] == [0, 2]
+    assert stats["context_tokens"] == 53
+    docs, _ = assemble_context([big, too_big, small], token_budget=60, max_chunks=1, estimate=_words)
+    assert [d.metadata["chunk_id"] for d in docs] == [0]
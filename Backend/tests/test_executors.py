@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from executors import StageExecutor, StageOverloaded
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cancelled_caller_keeps_the_slot_until_the_thread_finishes():
+    stage = StageExecutor("test", max_workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking() -> str:
+        started.set()
+        release.wait(5)
+        return "first"
+
+    try:
+        first = asyncio.ensure_future(stage.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert stage.stats()["active"] == 1 # The thread is still running
+
+        second = asyncio.ensure_future(stage.run(lambda: "second"))
+        await asyncio.sleep(0.05)
+        assert not second.done() and stage.stats()["waiting"] == 1
+        release.set()
+        assert await asyncio.wait_for(second, 5) == "second"
+        assert stage.stats()["active"] == 0 and stage.stats()["completed"] == 2
+    finally:
+        release.set()
+        stage.shutdown()
+
+
+async def test_full_queue_is_rejected():
+    stage = StageExecutor("test", max_workers=1, max_queue=1, retry_after=7)
+    release = threading.Event()
+    try:
+        running = asyncio.ensure_future(stage.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(stage.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(StageOverloaded) as excinfo:
+            await stage.run(lambda: "rejected")
+        assert excinfo.value.retry_after == 7 and stage.stats()["rejected"] == 1
+        release.set()
+        assert await running is True and await queued == "queued"
+    finally:
+        release.set()
+        stage.shutdown()
@@ -0,0 +1,60 @@
+from page_index import PageIndex, normalize
+
+PAGES = [
+    (1, "Alpha beta."),
+    (2, "Gamma delta epsilon."),
+    (3, "किरायेदार किराया देगा। The Tenant shall pay the monthly rent on the fifth day of every month."),
+]
+
+
+def _index() -> PageIndex:
+    index = PageIndex(PAGES)
+    index.add_chunk(0, 1, 0, 11)
+    index.add_chunk(1, 2, 0, 11)
+    index.add_chunk(2, 2, 6, 20)
+    index.add_chunk(3, 3, 0, 95)
+    return index
+
+
+def test_normalize_drops_spacing_and_punctuation_but_keeps_matras():
+    assert normalize("  Alpha,\nBETA. ") == "alphabeta"
+    assert normalize("किराया देगा।") == "किरायादेगा"
+
+
+def test_offsets_map_to_pages_at_boundaries():
+    index = _index()
+    first = index.locate("Alpha")
+    assert (first["page"], first["start"], first["end"], first["exact"]) == (1, 0, 5, True)
+    last_of_page = index.locate("beta.")
+    assert (last_of_page["page"], last_of_page["start"], last_of_page["end"]) == (1, 6, 10)
+    first_of_next = index.locate("Gamma")
+    assert (first_of_next["page"], first_of_next["start"], first_of_next["end"]) == (2, 0, 5)
+    # A passage running over a page break belongs to the page it starts on and is clipped to it
+    straddling = index.locate("beta. Gamma")
+    assert (straddling["page"], straddling["start"], straddling["end"]) == (1, 6, 10)
+
+
+def test_span_reports_overlapping_chunks():
+    index = _index()
+    assert index.locate("Gamma")["chunk_ids"] == [1]
+    assert index.locate("delta epsilon")["chunk_ids"] == [1, 2]
+    assert index.chunk_span(2) == {"page": 2, "start": 6, "end": 20}
+
+
+def test_whitespace_and_punctuation_differences_still_match_exactly():
+    span = _index().locate("the  tenant shall pay, the monthly rent")
+    assert span["page"] == 3 and span["exact"]
+    assert PAGES[2][1][span["start"]:span["end"]] == "The Tenant shall pay the monthly rent"
+
+
+def test_altered_text_is_located_by_probe_voting():
+    span = _index().locate("The Tenant shall pay the monthly rent on the tenth day of every month.")
+    assert span["page"] == 3 and not span["exact"]
+    assert span["start"] == PAGES[2][1].index("The Tenant")
+
+
+def test_unknown_text_falls_back_to_default_page():
+    index = _index()
+    assert index.locate("Nothing like this appears anywhere in the document") is None
+    assert index.page_of("Nothing like this appears anywhere in the document", default=7) == 7
+    assert PageIndex([]).locate("Alpha") is None
@@ -0,0 +1,31 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from fixtures import HashingEmbeddings
+from quantized_store import QuantizedVectorStore
+
+TEXTS = ["rent is due monthly", "deposit equals two months", "notice of thirty days", "governed by Indian law"]
+
+
+def _store(dtype, rescore_oversample=0):
+    embeddings = HashingEmbeddings()
+    documents = [Document(page_content=t, metadata={"n": i}) for i, t in enumerate(TEXTS)]
+    return QuantizedVectorStore.from_vectors([f"p{i}" for i in range(4)], documents, embeddings.embed_documents(TEXTS),
+                                             embeddings, dtype=dtype, rescore_oversample=rescore_oversample)
+
+
+def test_derive_gathers_kept_codes_and_leaves_the_parent_alone():
+    for dtype, oversample in (("int8", 0), ("int8", 4), ("float16", 0)):
+        parent = _store(dtype, oversample)
+        before = parent.similarity_search_with_score("notice of thirty days", k=4)
+        kept = [Document(page_content=TEXTS[2], metadata={"n": 0, "source": "v2.pdf"}), Document(page_content=TEXTS[0], metadata={"n": 1})]
+        new = Document(page_content="pets are not allowed", metadata={"n": 2})
+        derived = parent.derive(["p2", "p0"], kept, ["q0"], [new], HashingEmbeddings().embed_documents([new.page_content]))
+
+        assert len(parent) == 4 and parent.similarity_search_with_score("notice of thirty days", k=4) == before
+        assert len(derived) == 3
+        stored, copied = parent.get_vectors(["p2", "p0"]), derived.get_vectors(["p2", "p0"])
+        assert all(np.array_equal(stored[p], copied[p]) for p in ("p2", "p0")) # Same codes, not re-quantized
+        top = derived.similarity_search("notice of thirty days", k=1)[0]
+        assert top.metadata == {"n": 0, "source": "v2.pdf"} # The version's payload, not the parent's
+        assert derived.similarity_search("pets are not allowed", k=1)[0].page_content == new.page_content
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+HEAVY_MODULES = ["pypdf", "ocr", "pdf2image", "pytesseract", "sentence_transformers", "langchain_google_genai"]
+
+
+def test_importing_main_defers_heavy_modules():
+    """PDF/OCR libraries, the embedding model and the Gemini client load on first use or in the warm-up, not at import."""
+    code = f"import sys, main; print('loaded=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "loaded=\n" in result.stdout + "\n"
+
+
+@pytest.mark.anyio
+async def test_lifespan_runs_warm_up_and_stops_workers(app_main, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_main, "_start_warm_up", lambda: calls.append("warm-up"))
+    monkeypatch.setattr(app_main, "_shutdown_workers", lambda: calls.append("shutdown"))
+    async with app_main.app.router.lifespan_context(app_main.app):
+        assert calls == ["warm-up"]
+    assert calls == ["warm-up", "shutdown"]
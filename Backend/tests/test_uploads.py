@@ -0,0 +1,98 @@
+import hashlib
+from typing import List, Tuple, AsyncIterator
+
+import pytest
+
+from conftest import CONTRACT_PAGES, pdf_bytes
+from upload_spool import receive_files, UploadTooLarge, MalformedUpload
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "nyay-test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _multipart(parts: List[Tuple[str, str, bytes]]) -> bytes:
+    """A multipart/form-data body; parts are (field, filename or "" for a plain field, content)."""
+    out = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        out += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return out + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body: bytes, size: int, log: List[str]) -> AsyncIterator[bytes]:
+    """Yields the body in small pieces, logging how far the receiver has read."""
+    for offset in range(0, len(body), size):
+        log.append(f"read:{offset}")
+        yield body[offset:offset + size]
+    log.append("read:end")
+
+
+async def test_files_are_hashed_and_sniffed_as_the_body_streams(tmp_path):
+    pdf, text = pdf_bytes(CONTRACT_PAGES), "किराया अनुबंध\n".encode() * 20
+    body = _multipart([("note", "", b"ignored"), ("file1", "a.pdf", pdf), ("file2", "../b.txt", text)])
+    log: List[str] = []
+    file2_offset = body.index(b'name="file2"')
+
+    uploads = await receive_files(CONTENT_TYPE, _chunks(body, 7, log), ["file1", "file2"], str(tmp_path),
+                                  memory_limit=1024, max_bytes=0, on_file=lambda name, upload: log.append(f"file:{name}"))
+
+    assert set(uploads) == {"file1", "file2"} # Plain form fields are skipped
+    for name, content, kind in (("file1", pdf, "pdf"), ("file2", text, "text")):
+        upload = uploads[name]
+        assert upload.size == len(content) and upload.sha256 == hashlib.sha256(content).hexdigest()
+        assert upload.kind == kind
+        with upload.open() as f:
+            assert f.read() == content
+    assert uploads["file2"].filename == "b.txt"
+    assert not uploads["file1"].in_memory and uploads["file2"].in_memory # Past memory_limit it spilled to tmp_path
+
+    # file1 was handed over before the body reached file2's part
+    reads_before = [int(entry.split(":")[1]) for entry in log[:log.index("file:file1")] if entry.startswith("read:")]
+    assert max(reads_before) < file2_offset
+    for upload in uploads.values():
+        upload.discard()
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_oversized_file_stops_reading_the_body(tmp_path):
+    body = _multipart([("file", "big.pdf", b"%PDF-1.4\n" + b"x" * 4096)])
+    log: List[str] = []
+    with pytest.raises(UploadTooLarge):
+        await receive_files(CONTENT_TYPE, _chunks(body, 256, log), ["file"], str(tmp_path), memory_limit=512, max_bytes=1024)
+    assert "read:end" not in log and len(log) < 8
+    assert list(tmp_path.iterdir()) == [] # The partial spill file was removed
+
+
+async def test_non_multipart_body_is_rejected(tmp_path):
+    with pytest.raises(MalformedUpload):
+        await receive_files("application/json", _chunks(b"{}", 2, []), ["file"], str(tmp_path), 1024, 0)
+
+
+async def test_chunked_upload_without_length_is_413_while_streaming(app_main, client, monkeypatch):
+    monkeypatch.setattr(app_main, "MAX_UPLOAD_BYTES", 2048)
+    body = _multipart([("file", "big.pdf", b"%PDF-1.4\n" + b"x" * 64 * 1024)])
+    log: List[str] = []
+    # An async body has no Content-Length, so only the receiver's per-file limit can catch it
+    response = await client.post("/upload/", content=_chunks(body, 512, log), headers={"content-type": CONTENT_TYPE})
+    assert response.status_code == 413
+    assert "read:end" not in log
+
+
+async def test_upload_without_file_field_is_422(client):
+    response = await client.post("/upload/", files={"other": ("a.pdf", pdf_bytes(CONTRACT_PAGES), "application/pdf")})
+    assert response.status_code == 422
+    assert "file" in response.json()["detail"]
+
+
+async def test_compare_receives_both_files_from_the_stream(client):
+    edited = [CONTRACT_PAGES[0].replace("thirty days", "sixty days"), CONTRACT_PAGES[1]]
+    response = await client.post("/compare/", files={
+        "file1": ("v1.pdf", pdf_bytes(CONTRACT_PAGES), "application/pdf"),
+        "file2": ("v2.pdf", pdf_bytes(edited), "application/pdf"),
+    })
+    assert response.status_code == 200, response.text
+    lines = response.json()["comparison_lines"]
+    assert lines[0].startswith("--- v1.pdf") and lines[1].startswith("+++ v2.pdf")
+    assert any(line.startswith("+") and "sixty days" in line for line in lines[2:])
@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import pdf_bytes
+from quantized_store import QuantizedVectorStore
+
+pytestmark = pytest.mark.anyio
+
+PAGES = [
+    " ".join(f"Clause {page}.{n}: the Tenant shall observe obligation {n} of schedule {page} at all times." for n in range(1, 19))
+    for page in range(1, 5)
+]
+EDITED = "Clause 3.9: the Tenant shall respect obligation 9 of schedule 3 at all times."
+
+
+def _count(vectorstore):
+    if isinstance(vectorstore, QuantizedVectorStore):
+        return len(vectorstore)
+    return vectorstore.client.count(vectorstore.collection_name).count
+
+
+def _hits(vectorstore, query):
+    # Rounded: the second search reads the query vector back from the (float32) embedding cache
+    return [(doc.page_content, doc.metadata, round(score, 5)) for doc, score in vectorstore.similarity_search_with_score(query, k=6)]
+
+
+@pytest.mark.parametrize("backend", ["qdrant", "quantized"])
+async def test_one_page_edit_embeds_only_changed_chunks_and_leaves_the_parent_alone(app_main, client, monkeypatch, backend):
+    monkeypatch.setattr(app_main, "VECTOR_BACKEND", backend)
+    response = await client.post("/upload/", files={"file": ("lease.pdf", pdf_bytes(PAGES), "application/pdf")})
+    assert response.status_code == 200, response.text
+    parent_id, parent_chunks = response.json()["document_id"], response.json()["chunks_added"]
+    parent = app_main.registry.get(parent_id)
+    assert isinstance(parent.vectorstore, QuantizedVectorStore) == (backend == "quantized")
+    parent_points = _count(parent.vectorstore)
+    before = _hits(parent.vectorstore, "obligation 9 of schedule 3")
+
+    embedded = set() # The clause pre-classifier embeds the changed chunks as well, through the same cache
+    embed_documents = app_main.embeddings.embed_documents
+    monkeypatch.setattr(app_main.embeddings, "embed_documents", lambda texts: embedded.update(texts) or embed_documents(texts))
+    edited = list(PAGES)
+    edited[2] = PAGES[2].replace(EDITED.replace("respect", "observe"), EDITED)
+    assert edited[2] != PAGES[2] and len(edited[2]) == len(PAGES[2])
+    response = await client.post(f"/upload/?parent_id={parent_id}",
+                                 files={"file": ("lease_v2.pdf", pdf_bytes(edited), "application/pdf")}) # Renamed as well
+    assert response.status_code == 200, response.text
+    body = response.json()
+
+    assert parent_chunks > 4 and 1 <= len(embedded) < parent_chunks // 2
+    assert all("respect" in text for text in embedded) # Only chunks holding the edit were embedded
+    assert body["reindex"] == {"reused": parent_chunks - len(embedded), "moved": 0, "embedded": len(embedded), "deleted": len(embedded)}
+    assert body["version"] == 2 and body["parent_id"] == parent_id
+
+    # The parent's store was only read: same points, same search results
+    assert _count(parent.vectorstore) == parent_points
+    assert _hits(parent.vectorstore, "obligation 9 of schedule 3") == before
+    assert app_main.registry.get(parent_id) is None # Superseded by the new version
+
+    version = app_main.registry.get(body["document_id"])
+    assert _count(version.vectorstore) == parent_chunks
+    assert {doc.metadata["source"] for doc in version.vectorstore.similarity_search("schedule", k=parent_chunks)} == {"lease_v2.pdf"}
+    assert EDITED in "".join(content for content, _, _ in _hits(version.vectorstore, "schedule 3 respect obligation 9"))
@@ -0,0 +1,222 @@
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+from executors import StageOverloaded
+
+logger = logging.getLogger("uvicorn.error")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class UploadJob:
+    """
+    One upload processed in the background. Pipeline code reports per-stage progress through
+    `update` and publishes partial results through `result`; `snapshot` is what GET /jobs/{id} returns.
+    Also used, unqueued, as a plain progress recorder for synchronous uploads.
+    """
+
+    def __init__(self, source_name: str, run: Optional[Callable[["UploadJob"], Awaitable[Any]]] = None,
+                 discard: Optional[Callable[[], None]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.source_name = source_name
+        self.status = QUEUED
+        self.stages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._run = run
+        self._discard = discard # Releases resources (the spooled upload) of a job that never ran
+        self._task: Optional[asyncio.Task] = None
+        self._stage_started: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, status: Optional[str] = None, **fields) -> None:
+        """Records progress for a pipeline stage; status 'running' / 'done' also track the stage's duration."""
+        entry = self.stages.setdefault(stage, {"status": "pending"})
+        if status is not None:
+            entry["status"] = status
+            if status == "running":
+                self._stage_started[stage] = time.perf_counter()
+            elif stage in self._stage_started:
+                entry["ms"] = round((time.perf_counter() - self._stage_started.pop(stage)) * 1000, 1)
+        entry.update(fields)
+
+    def advance(self, stage: str, field: str, n: int = 1) -> None:
+        """Increments a counter in a stage's progress (e.g. pages OCR'd); safe to call from worker threads."""
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"status": "running"})
+            entry[field] = entry.get(field, 0) + n
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def snapshot(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "job_id": self.job_id,
+            "source_name": self.source_name,
+            "status": self.status,
+            "queue_position": queue_position,
+            "queued_seconds": round((self.started_at or self.finished_at or now) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "stages": {name: dict(entry) for name, entry in self.stages.items()},
+            "result": dict(self.result),
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded FIFO of upload jobs drained by a fixed pool of asyncio workers. Submissions beyond
+    `max_queue` waiting jobs are rejected with StageOverloaded (HTTP 503). Finished jobs stay
+    queryable for `retention_seconds` (at most `max_finished` of them).
+    """
+
+    def __init__(self, workers: int, max_queue: int, retention_seconds: float, max_finished: int = 1000, retry_after: int = 10):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.retention_seconds = retention_seconds
+        self.max_finished = max(1, max_finished)
+        self.retry_after = retry_after
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._waiting: "deque[UploadJob]" = deque()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started = time.monotonic()
+        self._counts = {"submitted": 0, "rejected": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+        self._queue_wait: deque = deque(maxlen=256)
+
+    # --- workers ---
+    def _ensure_workers(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+            self._worker_tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+            logger.info(f"Started {self.workers} upload job workers (max queue {self.max_queue})")
+
+    async def _worker(self, worker_no: int) -> None:
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._waiting))
+                job = self._waiting.popleft()
+            await self._execute(job)
+
+    async def _execute(self, job: UploadJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._queue_wait.append(job.started_at - job.created_at)
+        self._busy += 1
+        started = time.perf_counter()
+        job._task = asyncio.ensure_future(job._run(job))
+        try:
+            await asyncio.wait([job._task])
+            if job._task.cancelled():
+                job.status = CANCELLED
+            elif job._task.exception() is not None:
+                exc = job._task.exception()
+                job.status = FAILED
+                job.error = {"status_code": getattr(exc, "status_code", 500), "detail": getattr(exc, "detail", str(exc))}
+                logger.warning(f"Upload job {job.job_id} ({job.source_name}) failed: {job.error['detail']}")
+            else:
+                result = job._task.result()
+                job.result.update(result if isinstance(result, dict) else {})
+                job.status = SUCCEEDED
+        finally:
+            job.finished_at = time.time()
+            for entry in job.stages.values():
+                if entry["status"] == "running":
+                    entry["status"] = job.status if job.status != RUNNING else CANCELLED
+            job._task = None
+            self._counts[job.status] = self._counts.get(job.status, 0) + 1
+            self._busy -= 1
+            self._busy_seconds += time.perf_counter() - started
+            logger.info(f"Upload job {job.job_id} ({job.source_name}) {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    # --- public API ---
+    async def submit(self, job: UploadJob) -> UploadJob:
+        """Queues a job for the worker pool, or raises StageOverloaded when too many are already waiting."""
+        self._ensure_workers()
+        self.sweep()
+        if len(self._waiting) >= self.max_queue:
+            self._counts["rejected"] += 1
+            logger.warning(f"Rejecting upload job for {job.source_name}: {len(self._waiting)} jobs waiting")
+            raise StageOverloaded("upload_jobs", self.retry_after)
+        self._jobs[job.job_id] = job
+        self._counts["submitted"] += 1
+        async with self._wakeup:
+            self._waiting.append(job)
+            self._wakeup.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def position(self, job: UploadJob) -> Optional[int]:
+        """1-based place in the waiting line, or None once the job has started."""
+        try:
+            return self._waiting.index(job) + 1
+        except ValueError:
+            return None
+
+    def cancel(self, job: UploadJob) -> bool:
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        if job.finished:
+            return False
+        if job.status == QUEUED:
+            self._waiting.remove(job)
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._counts[CANCELLED] += 1
+            if job._discard is not None:
+                job._discard()
+            logger.info(f"Upload job {job.job_id} ({job.source_name}) cancelled while queued")
+        elif job._task is not None:
+            job._task.cancel() # The worker records the outcome once the pipeline unwinds
+        return True
+
+    def sweep(self) -> None:
+        """Forgets finished jobs past the retention period (and the oldest beyond max_finished)."""
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.finished]
+        excess = len(finished) - self.max_finished
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.retention_seconds:
+                del self._jobs[job.job_id]
+                excess -= 1
+
+    def shutdown(self) -> None:
+        for job in list(self._waiting):
+            self.cancel(job)
+        for job in self._jobs.values():
+            if job._task is not None:
+                job._task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and worker utilisation (the autoscaling signals) plus outcome counters."""
+        waits = sorted(self._queue_wait)
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        return {
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "utilisation": round(self._busy / self.workers, 3),
+            "busy_fraction_since_start": round(min(1.0, self._busy_seconds / (uptime * self.workers)), 4),
+            "queue_depth": len(self._waiting),
+            "max_queue": self.max_queue,
+            "tracked_jobs": len(self._jobs),
+            "queue_wait_seconds_p50": round(waits[len(waits) // 2], 3) if waits else None,
+            "queue_wait_seconds_max": round(waits[-1], 3) if waits else None,
+            **self._counts,
+        }
@@ -0,0 +1,330 @@
+import io
+import os
+import json
+import uuid
+import codecs
+import hashlib
+import logging
+import threading
+from typing import Optional, List, Dict, Any, BinaryIO, Callable, Sequence, AsyncIterator, Tuple
+
+import aiofiles
+from multipart.multipart import MultipartParser, parse_options_header # python-multipart, FastAPI's form parser
+from multipart.exceptions import MultipartParseError
+
+logger = logging.getLogger("uvicorn.error")
+
+SNIFF_BYTES = 1024 # PDF readers accept "%PDF-" anywhere in the first 1 KiB
+_SIGNATURES = [
+    (b"PK\x03\x04", "zip"), # docx / xlsx / odt ...
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"), # Legacy .doc / .xls
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
+
+def sniff(head: bytes) -> str:
+    """File type from an upload's leading bytes: pdf, zip, ole, png, jpeg, tiff, text or unknown."""
+    if b"%PDF-" in head[:SNIFF_BYTES]:
+        return "pdf"
+    for signature, kind in _SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head and b"\x00" not in head:
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False) # A cut multi-byte tail is fine
+            return "text"
+        except UnicodeDecodeError:
+            pass
+    return "unknown"
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+class MemoryBudget:
+    """Process-wide cap on upload bytes held in memory; uploads that do not fit spill to disk instead."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, n: int) -> bool:
+        with self._lock:
+            if self._used + n > self.limit:
+                return False
+            self._used += n
+            return True
+
+    def release(self, n: int) -> None:
+        with self._lock:
+            self._used -= n
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def stats(self) -> Dict[str, int]:
+        return {"memory_bytes": self._used, "memory_limit_bytes": self.limit}
+
+
+class SpooledUpload:
+    """
+    One received upload: hashed (SHA-256) and type-sniffed as it streams in, kept in memory up to
+    `memory_limit` bytes (and while the shared budget allows) and spilled to a file in `spool_dir` beyond
+    that. Readers get a stream via `open()`; `path()` materializes an in-memory upload on disk only for
+    consumers that need a real file (OCR, path-only loaders).
+    """
+
+    def __init__(self, filename: str, spool_dir: str, memory_limit: int, max_bytes: int, budget: Optional[MemoryBudget] = None):
+        self.filename = filename
+        self.spool_dir = spool_dir
+        self.memory_limit = memory_limit
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.size = 0
+        self.kind = "unknown"
+        self.sha256: Optional[str] = None
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._parts: List[bytes] = []
+        self._data: Optional[bytes] = None
+        self._reserved = 0
+        self._path: Optional[str] = None
+        self._spill: Any = None
+        self._path_lock = threading.Lock()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._path is None or self._data is not None
+
+    async def write(self, chunk: bytes) -> None:
+        if self.max_bytes > 0 and self.size + len(chunk) > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.size += len(chunk)
+        self._digest.update(chunk)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+        if self._spill is None and self.size <= self.memory_limit and self._reserve(len(chunk)):
+            self._parts.append(chunk)
+            return
+        if self._spill is None:
+            await self._start_spill()
+        await self._spill.write(chunk)
+
+    def _reserve(self, n: int) -> bool:
+        if self.budget is not None and not self.budget.reserve(n):
+            return False
+        self._reserved += n
+        return True
+
+    def _release(self) -> None:
+        if self.budget is not None and self._reserved:
+            self.budget.release(self._reserved)
+        self._reserved = 0
+
+    async def _start_spill(self) -> None:
+        self._path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}_{self.filename}")
+        self._spill = await aiofiles.open(self._path, "wb")
+        for part in self._parts:
+            await self._spill.write(part)
+        self._parts = []
+        self._release()
+
+    async def finish(self) -> None:
+        """Completes the upload: closes any spill file and fixes the hash and type."""
+        if self._spill is not None:
+            await self._spill.close()
+            self._spill = None
+        else:
+            self._data = b"".join(self._parts) # The one copy an in-memory upload makes
+            self._parts = []
+        self.sha256 = self._digest.hexdigest()
+        self.kind = sniff(self._head)
+
+    async def abort(self) -> None:
+        """Stops receiving: closes any spill file and discards what arrived."""
+        if self._spill is not None:
+            await self._spill.close()
+            self._spill = None
+        self.discard()
+
+    def open(self) -> BinaryIO:
+        """A fresh binary stream over the upload (in-memory streams share the buffer; no copy)."""
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self._path, "rb")
+
+    def path(self) -> str:
+        """A file path holding the upload, writing an in-memory upload to `spool_dir` on first call (blocking)."""
+        with self._path_lock:
+            if self._path is None:
+                path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}_{self.filename}")
+                with open(path, "wb") as f:
+                    f.write(self._data or b"")
+                self._path = path
+            return self._path
+
+    def discard(self) -> None:
+        """Releases the buffer and removes any file on disk."""
+        self._data = None
+        self._parts = []
+        self._release()
+        path, self._path = self._path, None
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spooled upload {path}: {e}")
+
+
+class MalformedUpload(Exception):
+    """The request body is not a multipart/form-data upload we can parse."""
+
+
+class _MultipartReceiver:
+    """
+    python-multipart callbacks (the parser FastAPI's own forms use) that route each wanted file part
+    into a SpooledUpload. Callbacks are synchronous, so parsed data is queued and written after each
+    body chunk is fed, as Starlette's MultiPartParser does.
+    """
+
+    def __init__(self, fields: Sequence[str], spool_dir: str, memory_limit: int, max_bytes: int, budget: Optional[MemoryBudget]):
+        self.fields = set(fields)
+        self.spool_dir = spool_dir
+        self.memory_limit = memory_limit
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.received: Dict[str, SpooledUpload] = {}
+        self.current: Optional[SpooledUpload] = None
+        self._name = ""
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._pending: List[Tuple[str, SpooledUpload, Any]] = [] # ("data", upload, bytes) or ("end", upload, field name)
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._disposition = b""
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self.current = None
+        if filename is not None and self._name in self.fields and self._name not in self.received:
+            # Other fields and repeated file fields are skipped without being buffered
+            self.current = SpooledUpload(os.path.basename(filename.decode("utf-8", "replace")) or "upload",
+                                         self.spool_dir, self.memory_limit, self.max_bytes, self.budget)
+            self.received[self._name] = self.current
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.current is not None:
+            self._pending.append(("data", self.current, data[start:end]))
+
+    def on_part_end(self) -> None:
+        if self.current is not None:
+            self._pending.append(("end", self.current, self._name))
+            self.current = None
+
+    async def drain(self, on_file: Optional[Callable[[str, SpooledUpload], None]]) -> None:
+        """Writes queued part data; a completed part is finished and reported to `on_file`."""
+        pending, self._pending = self._pending, []
+        for event, upload, value in pending:
+            if event == "data":
+                await upload.write(value)
+                continue
+            await upload.finish()
+            if on_file is not None:
+                on_file(value, upload)
+
+
+async def receive_files(content_type: str, stream: AsyncIterator[bytes], fields: Sequence[str], spool_dir: str,
+                        memory_limit: int, max_bytes: int, budget: Optional[MemoryBudget] = None,
+                        on_file: Optional[Callable[[str, SpooledUpload], None]] = None) -> Dict[str, SpooledUpload]:
+    """
+    Parses a multipart/form-data request body as it arrives (e.g. Starlette's `request.stream()`), writing
+    each file part named in `fields` straight into a SpooledUpload: hashed, type-sniffed and size-checked
+    chunk by chunk, with no intermediate copy. `on_file(name, upload)` is called as soon as a part is
+    complete, while later parts are still arriving; from then on the caller owns that upload.
+    Raises UploadTooLarge past `max_bytes` for any one file (0 disables the limit) without reading the
+    rest of the body, and MalformedUpload for a body that is not multipart. On error, uploads the caller
+    does not own yet are discarded.
+    """
+    _, params = parse_options_header(content_type or "")
+    boundary = params.get(b"boundary")
+    if not (content_type or "").lower().startswith("multipart/form-data") or not boundary:
+        raise MalformedUpload("Expected a multipart/form-data body.")
+    receiver = _MultipartReceiver(fields, spool_dir, memory_limit, max_bytes, budget)
+    parser = MultipartParser(boundary, receiver.callbacks())
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            await receiver.drain(on_file)
+        parser.finalize()
+        await receiver.drain(on_file)
+    except BaseException as e:
+        for upload in receiver.received.values():
+            if on_file is None or upload.sha256 is None: # Not yet handed to the caller
+                await upload.abort()
+        if isinstance(e, MultipartParseError):
+            raise MalformedUpload(f"Malformed multipart body: {e}") from e
+        raise
+    return receiver.received
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting oversized uploads with 413 from their Content-Length header, before the
+    multipart body is received or parsed. `limits` maps path prefixes to maximum request bytes; chunked
+    requests without a length are caught per file by receive_files instead.
+    """
+
+    def __init__(self, app: Any, limits: Dict[str, int]):
+        self.app = app
+        self.limits = {prefix: limit for prefix, limit in limits.items() if limit > 0}
+
+    def _limit(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits.items():
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        limit = self._limit(scope.get("path", "")) if scope["type"] == "http" else None
+        if limit is not None:
+            length = dict(scope.get("headers") or []).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > limit:
+                body = json.dumps({"detail": f"Request body too large (limit {limit} bytes)."}).encode("utf-8")
+                await send({"type": "http.response.start", "status": 413, "headers": [
+                    (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii")), (b"connection", b"close"),
+                ]})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
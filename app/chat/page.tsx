@@ -27,6 +27,7 @@ import { createClient } from "@/utils/supabase/client"; // Import Supabase clien
 
 // --- Constants ---
 const LOCALSTORAGE_CONTEXT_KEY = 'nyaySaarthi_chatContextFile';
+const LOCALSTORAGE_DOCUMENT_ID_KEY = 'nyaySaarthi_documentId';
 
 interface Message {
   id: number | string; // Allow string IDs for potential future use
@@ -182,14 +183,16 @@ function ChatComponent() {
 
     try {
       // **IMPORTANT**: You might need to send contextFileName or a relevant ID to the backend
+      let documentId: string | null = null;
+      try { documentId = localStorage.getItem(LOCALSTORAGE_DOCUMENT_ID_KEY); }
+      catch (e) { console.warn("localStorage not available or failed to get item."); }
       const requestBody = {
         question: currentInput,
-        // contextId: backendFileId // Example if you stored an ID
-        // contextFileName: contextFileName // Send filename if backend expects it
+        document_id: documentId, // Backend index returned by /upload/
       };
       console.log("Sending to API:", requestBody); // Debug log
 
-      const response = await fetch("https://parrth020-nyay-saarthi-ai-agent.hf.space/ask/", {
+      const response = await fetch("https://parrth020-nyay-saarthi-ai-agent.hf.space/ask/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -199,28 +202,65 @@ function ChatComponent() {
 
       console.log("API Response Status:", response.status); // Debug log
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         const errorText = await response.text();
         console.error("API Error Response:", errorText); // Debug log
         throw new Error(`API Error: ${response.statusText} (${response.status}) - ${errorText}`);
       }
 
-      const data = await response.json();
-      console.log("API Response Data:", data); // Debug log
-
+      // Streamed answer: sources arrive first, then answer tokens, then a final "done" event
       const aiResponse: Message = {
         id: (Date.now() + 1).toString(), // Unique ID
-        content: data.answer || "मुझे उत्तर नहीं मिल सका।", // Fallback message
+        content: "",
         sender: "ai",
         timestamp: new Date(),
         type: "text",
-        sources: data.sources?.map((s: any) => ({ // Safely map sources
-            content: s.content || "N/A",
-            // Adapt based on actual backend response structure for page number
-            page: s.page ?? s.metadata?.page_number ?? "N/A"
-        })) || [],
+        sources: [],
       };
       setMessages((prev) => [...prev, aiResponse]);
+      const updateAiResponse = (patch: Partial<Message>) => {
+        Object.assign(aiResponse, patch);
+        setMessages((prev) => prev.map((m) => (m.id === aiResponse.id ? { ...aiResponse } : m)));
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamDone = false;
+      while (!streamDone) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary: number;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const dataLine = frame.match(/^data: (.*)$/m)?.[1];
+          if (!event || !dataLine) continue;
+          const data = JSON.parse(dataLine);
+          if (event === "sources") {
+            setIsTyping(false); // The answer bubble takes over from the typing indicator
+            updateAiResponse({
+              sources: data.sources?.map((s: any) => ({ // Safely map sources
+                  content: s.content || "N/A",
+                  page: s.page ?? s.metadata?.page_number ?? "N/A"
+              })) || [],
+            });
+          } else if (event === "token") {
+            updateAiResponse({ content: aiResponse.content + data.text });
+          } else if (event === "done") {
+            console.log("API Stream Timing:", data); // Debug log
+            updateAiResponse({ content: data.answer || aiResponse.content || "मुझे उत्तर नहीं मिल सका।" });
+            streamDone = true;
+          } else if (event === "error") {
+            throw new Error(data.detail || "Stream error");
+          }
+        }
+      }
+      if (!aiResponse.content) {
+        updateAiResponse({ content: "मुझे उत्तर नहीं मिल सका।" }); // Fallback message
+      }
 
       // --- ADD THIS CALL ---
       saveLastMessageToSupabase(aiResponse.content); // Save successful AI response
@@ -11,6 +11,8 @@ import { toast } from "sonner";
 import { createClient } from "@/utils/supabase/client"; // Import Supabase client
 import { cn } from "@/lib/utils"; // Import cn
 
+const LOCALSTORAGE_DOCUMENT_ID_KEY = 'nyaySaarthi_documentId';
+
 interface UploadedFile {
   file: File;
   id: string;
@@ -55,6 +57,13 @@ export default function UploadPage() {
         throw new Error(`Processing failed: ${response.statusText} (${response.status}) - ${errorText}`);
       }
       
+      // Remember which backend index this upload lives in so /ask/ can target it
+      const uploadResult = await response.json();
+      if (uploadResult.document_id) {
+        try { localStorage.setItem(LOCALSTORAGE_DOCUMENT_ID_KEY, uploadResult.document_id); }
+        catch (e) { console.warn("localStorage not available."); }
+      }
+
       // Backend processed successfully, now save to Supabase
       toast.dismiss(processingToastId); // Dismiss processing toast
       setUploadedFiles((prev) =>